@@ -0,0 +1,7 @@
+"""
+Klavgen benchmark suites. Run them from the repository root, e.g.:
+
+    python -m benchmarks.synthetic --output synthetic.json [--full]
+
+Each suite prints its progress to stderr and writes its results as JSON (see common.write_results()).
+"""
@@ -0,0 +1,259 @@
+import argparse
+import contextlib
+import json
+import platform
+import subprocess
+import sys
+import time
+import traceback
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import cadquery as cq
+
+from klavgen.profiling import RenderProfile, profiling
+from klavgen.shape_metrics import get_shape_metrics
+
+# The version of the JSON written by write_results(), bumped when its fields change
+RESULTS_VERSION = 3
+
+# The fields of render results whose face counts are recorded, e.g. RenderCaseResult.top or
+# RenderedSwitchHolder.switch_holder
+OUTPUT_FIELDS = ["top", "bottom", "palm_rests", "switch_holder", "socket"]
+
+
+@dataclass
+class Benchmark:
+    name: str
+    # What's timed, e.g. "render_case", "holder" or "export"
+    kind: str
+    # Called with the value returned by setup, if any
+    func: Callable[..., Any]
+    # The parameters the benchmark was generated from, recorded as-is so results can be filtered and compared
+    parameters: Dict[str, Any] = field(default_factory=dict)
+    # Run once before the timed runs, e.g. to render the case an export benchmark exports
+    setup: Optional[Callable[[], Any]] = None
+    # Called after the timed runs with the value returned by func, or None if it failed, returns what to record in
+    # BenchmarkResult.extra
+    measure: Optional[Callable[[Any], Dict[str, Any]]] = None
+
+
+@dataclass
+class StageResult:
+    wall_seconds: float
+    # Operation name to count, e.g. {"unions": 57, "cuts": 9}, and to total seconds
+    operations: Dict[str, int] = field(default_factory=dict)
+    operation_seconds: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    kind: str
+    parameters: Dict[str, Any]
+    success: bool
+    # The fastest of the repeats, 0 if the benchmark failed
+    wall_seconds: float = 0.0
+    # The time of every repeat, to tell how noisy the timings are
+    repeat_seconds: List[float] = field(default_factory=list)
+    # The last line of the exception if the benchmark failed
+    error: Optional[str] = None
+    # Stage path (see profile_stage()) to time and operation counts, of the fastest repeat
+    stages: Dict[str, StageResult] = field(default_factory=dict)
+    # Output name (see OUTPUT_FIELDS) to face count
+    faces: Dict[str, int] = field(default_factory=dict)
+    # Anything else a suite records, e.g. the shape metrics of each render stage
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+def get_environment() -> Dict[str, Any]:
+    """
+    Get the software and hardware the benchmarks ran on, to tell apart results that aren't comparable.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "python": platform.python_version(),
+        "cadquery": cq.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "host": platform.node(),
+        "commit": commit,
+    }
+
+
+def get_face_counts(value: Any) -> Dict[str, int]:
+    """
+    Get the face count of each output of a render result, or of the result itself if it's a Workplane or Shape.
+    """
+    outputs = {name: getattr(value, name) for name in OUTPUT_FIELDS if hasattr(value, name)} or {
+        "result": value
+    }
+
+    faces = {}
+    for name, output in outputs.items():
+        metrics = get_shape_metrics(output)
+        if metrics:
+            faces[name] = metrics.faces
+
+    return faces
+
+
+def get_stage_results(profile: RenderProfile) -> Dict[str, StageResult]:
+    return {
+        stage.path: StageResult(
+            wall_seconds=round(stage.wall_seconds, 4),
+            operations=dict(stage.operation_counts),
+            operation_seconds={
+                name: round(seconds, 4) for name, seconds in stage.operation_seconds.items()
+            },
+        )
+        for stage in profile.stages
+    }
+
+
+def _format_error() -> str:
+    return traceback.format_exc().strip().splitlines()[-1]
+
+
+def run_benchmark(benchmark: Benchmark, repeat: int = 1) -> BenchmarkResult:
+    """
+    Run a benchmark repeat times, profiled, and keep the fastest run. Exceptions are recorded in the result, so one
+    failing layout doesn't stop the suite.
+    """
+    result = BenchmarkResult(benchmark.name, benchmark.kind, benchmark.parameters, success=False)
+
+    try:
+        args = [benchmark.setup()] if benchmark.setup else []
+    except Exception:
+        result.error = _format_error()
+        return result
+
+    value = None
+    for _ in range(repeat):
+        try:
+            with profiling() as profile:
+                start = time.perf_counter()
+                value = benchmark.func(*args)
+                wall_seconds = time.perf_counter() - start
+        except Exception:
+            result.success = False
+            result.error = _format_error()
+            if benchmark.measure:
+                result.extra = benchmark.measure(None)
+            return result
+
+        result.repeat_seconds.append(round(wall_seconds, 4))
+        if not result.success or wall_seconds < result.wall_seconds:
+            result.success = True
+            result.wall_seconds = round(wall_seconds, 4)
+            result.stages = get_stage_results(profile)
+
+    # Counted outside the profile, so counting doesn't add to the time
+    result.faces = get_face_counts(value)
+    if benchmark.measure:
+        result.extra = benchmark.measure(value)
+
+    return result
+
+
+def run_benchmarks(
+    benchmarks: List[Benchmark], repeat: int = 1, name_filter: Optional[str] = None
+) -> List[BenchmarkResult]:
+    """
+    Run the benchmarks whose name contains name_filter (all if None) in order, printing progress to stderr.
+    """
+    results = []
+    for benchmark in benchmarks:
+        if name_filter and name_filter not in benchmark.name:
+            continue
+
+        result = run_benchmark(benchmark, repeat)
+        status = f"{result.wall_seconds:.2f} s" if result.success else f"failed: {result.error}"
+        print(f"{benchmark.kind} {benchmark.name}: {status}", file=sys.stderr, flush=True)
+        results.append(result)
+
+    return results
+
+
+def write_results(suite: str, mode: str, results: List[BenchmarkResult], output: str):
+    """
+    Write the results as JSON to the output file, or to stdout if output is "-".
+    """
+    write_json(
+        {
+            "version": RESULTS_VERSION,
+            "suite": suite,
+            "mode": mode,
+            "environment": get_environment(),
+            "results": [asdict(result) for result in results],
+        },
+        output,
+    )
+
+
+def write_json(data: Dict[str, Any], output: str):
+    if output == "-":
+        json.dump(data, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(output, "w") as f:
+            json.dump(data, f, indent=2)
+
+
+def load_results(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Load the results written by write_results(), or a baseline written by benchmarks.regression, as suite name to
+    list of results (BenchmarkResult dicts). Results written with another RESULTS_VERSION are rejected, since their
+    fields differ.
+    """
+    with open(path) as f:
+        data = json.load(f)
+
+    if data.get("version") != RESULTS_VERSION:
+        raise Exception(
+            f"{path} has results version {data.get('version')}, expected {RESULTS_VERSION}. Run the benchmarks "
+            f"again, or record a new baseline with python -m benchmarks.regression --update"
+        )
+
+    if "suites" in data:
+        return data["suites"]
+
+    return {data["suite"]: data["results"]}
+
+
+def get_argument_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--full", action="store_true", help="Run the full suite instead of the quick one"
+    )
+    parser.add_argument(
+        "--output", default="-", help="Where to write the JSON results, - for stdout (default)"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Run each benchmark this many times, keep the fastest"
+    )
+    parser.add_argument("--filter", help="Only run the benchmarks whose name contains this")
+
+    return parser
+
+
+def main_for_suite(suite: str, description: str, get_benchmarks: Callable[[bool], List[Benchmark]]):
+    """
+    The command-line entry point shared by the suites: parse the arguments, run the quick or full benchmarks and
+    write the results.
+    """
+    args = get_argument_parser(description).parse_args()
+
+    # Anything printed while rendering (e.g. complexity warnings) goes to stderr, so stdout only has the results
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run_benchmarks(get_benchmarks(args.full), args.repeat, args.filter)
+    write_results(suite, "full" if args.full else "quick", results, args.output)
+
+    failures = sum(1 for result in results if not result.success)
+    print(f"{len(results)} benchmarks, {failures} failed", file=sys.stderr)
@@ -0,0 +1,100 @@
+"""
+Benchmarks on real-world layouts, from the Keyboard Layout Editor JSON files in benchmarks/kle:
+
+    python -m benchmarks.kle_corpus --output kle_corpus.json [--full]
+
+Each layout is loaded with generate_keys_from_kle_json() and rendered with render_case(). Besides the timings, each
+result records whether the render succeeded and the shape metrics (see get_shape_metrics()) of every stage it
+completed, also when a later stage failed, so fillet and shell failures on rotated and staggered geometry show up
+with the complexity that led to them.
+"""
+
+import json
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from klavgen.kle import generate_keys_from_kle_json
+from klavgen.renderer_case import METRIC_FIELDS, RenderCaseResult, record_metrics, render_case
+
+from .common import Benchmark, main_for_suite
+
+CORPUS_DIR = Path(__file__).parent / "kle"
+
+# The layouts in CORPUS_DIR (file names without .json), smallest first
+QUICK_LAYOUTS = ["redox_left", "ergodox_left"]
+FULL_LAYOUTS = QUICK_LAYOUTS + ["ortho_40", "ansi_60", "alice"]
+
+
+def get_layout_name(path: Path) -> str:
+    """
+    Get the name in the KLE metadata, or the file name if there is none.
+    """
+    with open(path) as f:
+        rows = json.load(f)
+
+    for row in rows:
+        if isinstance(row, dict) and "name" in row:
+            return row["name"]
+
+    return path.stem
+
+
+class LayoutBenchmark:
+    """
+    Renders a layout, keeping the RenderCaseResult so the stages completed before a failure can be measured.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.key_count = 0
+        self.case_result: Optional[RenderCaseResult] = None
+
+    def render(self) -> RenderCaseResult:
+        # Loaded on every run, since loading is part of rendering a KLE layout
+        keys = generate_keys_from_kle_json(str(self.path))
+        self.key_count = len(keys)
+        self.case_result = RenderCaseResult()
+
+        return render_case(keys=keys, result=self.case_result)
+
+    def measure(self, _: Any) -> Dict[str, Any]:
+        # Measured after the timed runs, so measuring doesn't add to the stage times
+        if self.case_result is None:
+            return {"keys": self.key_count, "metrics": {}}
+
+        record_metrics(self.case_result, METRIC_FIELDS, self.key_count)
+
+        return {
+            "keys": self.key_count,
+            "metrics": {
+                name: asdict(metrics) for name, metrics in (self.case_result.metrics or {}).items()
+            },
+        }
+
+
+def get_benchmarks(full: bool = False) -> List[Benchmark]:
+    benchmarks = []
+    for layout in FULL_LAYOUTS if full else QUICK_LAYOUTS:
+        path = CORPUS_DIR / f"{layout}.json"
+        layout_benchmark = LayoutBenchmark(path)
+
+        benchmarks.append(
+            Benchmark(
+                name=layout,
+                kind="render_case",
+                func=layout_benchmark.render,
+                parameters={"file": path.name, "layout": get_layout_name(path)},
+                measure=layout_benchmark.measure,
+            )
+        )
+
+    return benchmarks
+
+
+def main():
+    main_for_suite("kle_corpus", "Klavgen benchmarks on real-world KLE layouts", get_benchmarks)
+
+
+if __name__ == "__main__":
+    main()
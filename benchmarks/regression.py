@@ -0,0 +1,420 @@
+"""
+Compare benchmark results against a committed baseline, and fail if anything regressed:
+
+    python -m benchmarks.regression
+
+Runs the quick benchmark suites (see SUITES) and compares the time, operation counts and face counts of every
+benchmark and profile stage against benchmarks/baseline.json. Prints the regressions and improvements, and exits
+with status 1 if there is any regression. Record a new baseline with --update, e.g. after an intended change.
+
+Each benchmark runs 3 times by default and the fastest run is compared, like in the baseline, since single runs are
+too noisy to compare stage times.
+"""
+
+import argparse
+import contextlib
+import statistics
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from klavgen.profiling import format_table
+
+from . import kle_corpus, synthetic
+from .common import (
+    RESULTS_VERSION,
+    Benchmark,
+    get_environment,
+    load_results,
+    run_benchmarks,
+    write_json,
+)
+
+# Suite name to the function listing its benchmarks (quick or full)
+SUITES: Dict[str, Callable[[bool], List[Benchmark]]] = {
+    "synthetic": synthetic.get_benchmarks,
+    "kle_corpus": kle_corpus.get_benchmarks,
+}
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+
+@dataclass
+class Tolerances:
+    # How much slower a benchmark or stage can get, relative to the baseline. Widened to noise_factor times the spread
+    # of the repeats (see BenchmarkResult.repeat_seconds) where the timings are noisier than that.
+    time_relative: float = 0.5
+    noise_factor: float = 3.0
+    # Seconds added to the allowed time, so short stages don't fail on timer noise
+    time_absolute: float = 0.1
+    # How many more unions, cuts, etc. a stage can run, and how many more faces an output can have, relative to the
+    # baseline. Counts are deterministic, so these only leave room for small geometry changes.
+    operations_relative: float = 0.05
+    faces_relative: float = 0.05
+
+
+@dataclass
+class Change:
+    # "<suite>/<benchmark name>"
+    benchmark: str
+    # What changed, e.g. "render_case/input_unions seconds", "render_case unions", "top faces", "success", or
+    # "presence" / "render_case/input_unions presence" / "top presence" for a benchmark, stage or output missing from
+    # the current run
+    metric: str
+    baseline: float
+    current: float
+    # The largest relative increase allowed
+    limit: float
+    regression: bool
+
+    def get_row(self) -> List[str]:
+        if self.metric == "success":
+            return [
+                self.benchmark,
+                self.metric,
+                _format_success(self.baseline),
+                _format_success(self.current),
+                "",
+                "",
+            ]
+
+        if self.metric.endswith("presence"):
+            return [
+                self.benchmark,
+                self.metric,
+                _format_presence(self.baseline),
+                _format_presence(self.current),
+                "",
+                "",
+            ]
+
+        change = (
+            f"{(self.current - self.baseline) / self.baseline:+.0%}" if self.baseline else "new"
+        )
+
+        return [
+            self.benchmark,
+            self.metric,
+            _format_value(self.baseline),
+            _format_value(self.current),
+            change,
+            f"limit {self.limit:+.0%}",
+        ]
+
+
+def _format_success(value: float) -> str:
+    return "ok" if value else "failed"
+
+
+def _format_presence(value: float) -> str:
+    return "present" if value else "missing"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:.3f}"
+
+
+def _get_spread(result: Dict[str, Any]) -> float:
+    # The relative spread of the repeat times, 0 if there was a single repeat
+    seconds = result.get("repeat_seconds") or []
+    if len(seconds) < 2 or not min(seconds):
+        return 0.0
+
+    return (max(seconds) - min(seconds)) / min(seconds)
+
+
+def get_speed_factor(
+    baseline: Dict[str, List[Dict[str, Any]]], current: Dict[str, List[Dict[str, Any]]]
+) -> float:
+    """
+    Get how much slower the current machine is than the baseline one: the median ratio of the benchmark times.
+    """
+    ratios = []
+    for suite, results in current.items():
+        baseline_results = {result["name"]: result for result in baseline.get(suite, [])}
+        for result in results:
+            baseline_result = baseline_results.get(result["name"])
+            if (
+                baseline_result
+                and baseline_result["success"]
+                and result["success"]
+                and baseline_result["wall_seconds"]
+            ):
+                ratios.append(result["wall_seconds"] / baseline_result["wall_seconds"])
+
+    return statistics.median(ratios) if ratios else 1.0
+
+
+def _compare_count(
+    changes: List[Change], benchmark: str, metric: str, baseline: int, current: int, limit: float
+):
+    if current > baseline * (1 + limit) and current > baseline:
+        changes.append(Change(benchmark, metric, baseline, current, limit, regression=True))
+    elif current < baseline * (1 - limit):
+        changes.append(Change(benchmark, metric, baseline, current, limit, regression=False))
+
+
+def _compare_time(
+    changes: List[Change],
+    benchmark: str,
+    metric: str,
+    baseline: float,
+    current: float,
+    limit: float,
+    tolerances: Tolerances,
+):
+    if current > baseline * (1 + limit) + tolerances.time_absolute:
+        changes.append(Change(benchmark, metric, baseline, current, limit, regression=True))
+    elif current * (1 + limit) + tolerances.time_absolute < baseline:
+        changes.append(Change(benchmark, metric, baseline, current, limit, regression=False))
+
+
+def compare_result(
+    benchmark: str,
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    tolerances: Tolerances,
+    speed_factor: float = 1.0,
+) -> List[Change]:
+    """
+    Compare the result of a benchmark to its baseline.
+
+    :param benchmark: The name to report changes under.
+    :param baseline: The baseline BenchmarkResult dict.
+    :param current: The current BenchmarkResult dict.
+    :param tolerances: The tolerances.
+    :param speed_factor: What to multiply the baseline times with before comparing, see get_speed_factor().
+    :return: The changes beyond the tolerances, both regressions and improvements. Stages and outputs of the baseline
+             that the current result doesn't have are regressions.
+    """
+    changes = []
+
+    if baseline["success"] != current["success"]:
+        changes.append(
+            Change(
+                benchmark,
+                "success",
+                float(baseline["success"]),
+                float(current["success"]),
+                0.0,
+                regression=baseline["success"],
+            )
+        )
+        return changes
+
+    if not current["success"]:
+        return changes
+
+    time_limit = max(
+        tolerances.time_relative,
+        tolerances.noise_factor * max(_get_spread(baseline), _get_spread(current)),
+    )
+
+    _compare_time(
+        changes,
+        benchmark,
+        "seconds",
+        baseline["wall_seconds"] * speed_factor,
+        current["wall_seconds"],
+        time_limit,
+        tolerances,
+    )
+
+    # E.g. a stage that was renamed, or skipped since it failed: its time and operations can't be compared
+    for path in baseline["stages"].keys() - current["stages"].keys():
+        changes.append(Change(benchmark, f"{path} presence", 1.0, 0.0, 0.0, regression=True))
+    for name in baseline["faces"].keys() - current["faces"].keys():
+        changes.append(Change(benchmark, f"{name} presence", 1.0, 0.0, 0.0, regression=True))
+
+    for path, stage in current["stages"].items():
+        baseline_stage = baseline["stages"].get(path)
+        if not baseline_stage:
+            continue
+
+        _compare_time(
+            changes,
+            benchmark,
+            f"{path} seconds",
+            baseline_stage["wall_seconds"] * speed_factor,
+            stage["wall_seconds"],
+            time_limit,
+            tolerances,
+        )
+
+        for operation in sorted(set(stage["operations"]) | set(baseline_stage["operations"])):
+            _compare_count(
+                changes,
+                benchmark,
+                f"{path} {operation}",
+                baseline_stage["operations"].get(operation, 0),
+                stage["operations"].get(operation, 0),
+                tolerances.operations_relative,
+            )
+
+    for name, faces in current["faces"].items():
+        if name in baseline["faces"]:
+            _compare_count(
+                changes,
+                benchmark,
+                f"{name} faces",
+                baseline["faces"][name],
+                faces,
+                tolerances.faces_relative,
+            )
+
+    return changes
+
+
+def compare_results(
+    baseline: Dict[str, List[Dict[str, Any]]],
+    current: Dict[str, List[Dict[str, Any]]],
+    tolerances: Optional[Tolerances] = None,
+    speed_factor: float = 1.0,
+    require_all: bool = True,
+) -> List[Change]:
+    """
+    Compare every current result (suite name to BenchmarkResult dicts, see load_results()) that has a baseline.
+
+    :param require_all: Whether the baseline benchmarks of the compared suites that weren't run are regressions.
+                        Otherwise they're skipped, e.g. when only some benchmarks were run on purpose.
+    """
+    tolerances = tolerances or Tolerances()
+
+    changes = []
+    for suite, results in current.items():
+        baseline_results = {result["name"]: result for result in baseline.get(suite, [])}
+        for result in results:
+            baseline_result = baseline_results.pop(result["name"], None)
+            if baseline_result:
+                changes += compare_result(
+                    f"{suite}/{result['name']}", baseline_result, result, tolerances, speed_factor
+                )
+
+        if require_all:
+            for name in sorted(baseline_results):
+                changes.append(
+                    Change(f"{suite}/{name}", "presence", 1.0, 0.0, 0.0, regression=True)
+                )
+
+    return changes
+
+
+def get_changes_table(changes: List[Change]) -> str:
+    """
+    Get a human-readable table with a row per change.
+    """
+    header = ["Benchmark", "Metric", "Baseline", "Current", "Change", ""]
+    rows = [change.get_row() for change in changes]
+
+    return format_table(header, rows, left_aligned=(0, 1))
+
+
+def run_suites(
+    suites: List[str], full: bool = False, repeat: int = 1, name_filter: Optional[str] = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    # Anything printed while rendering goes to stderr, like in the suites
+    with contextlib.redirect_stdout(sys.stderr):
+        return {
+            suite: [
+                asdict(result)
+                for result in run_benchmarks(SUITES[suite](full), repeat, name_filter)
+            ]
+            for suite in suites
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare klavgen benchmark results against a baseline, and fail on regressions"
+    )
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="The baseline JSON")
+    parser.add_argument(
+        "--results",
+        nargs="+",
+        help="Compare these result files (written by the suites) instead of running the suites",
+    )
+    parser.add_argument(
+        "--suites", nargs="+", choices=list(SUITES), default=list(SUITES), help="The suites to run"
+    )
+    parser.add_argument("--full", action="store_true", help="Run the full suites")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Run each benchmark this many times, keep the fastest"
+    )
+    parser.add_argument("--filter", help="Only run the benchmarks whose name contains this")
+    parser.add_argument("--update", action="store_true", help="Save the results as the baseline")
+    parser.add_argument(
+        "--normalize",
+        action="store_true",
+        help="Scale the baseline times by how much slower this machine is (the median time ratio), to compare "
+        "against a baseline recorded on another machine",
+    )
+    parser.add_argument("--time-tolerance", type=float, default=Tolerances.time_relative)
+    parser.add_argument("--count-tolerance", type=float, default=Tolerances.operations_relative)
+    args = parser.parse_args()
+
+    if args.results:
+        current = {}
+        for path in args.results:
+            current.update(load_results(path))
+    else:
+        current = run_suites(args.suites, args.full, args.repeat, args.filter)
+
+    if args.update:
+        write_json(
+            {
+                "version": RESULTS_VERSION,
+                "mode": "full" if args.full else "quick",
+                "environment": get_environment(),
+                "suites": current,
+            },
+            args.baseline,
+        )
+        print(f"Saved the baseline to {args.baseline}")
+        return
+
+    baseline = load_results(args.baseline)
+    speed_factor = get_speed_factor(baseline, current) if args.normalize else 1.0
+    if args.normalize:
+        print(f"This machine is {speed_factor:.2f}x as slow as the baseline one")
+
+    changes = compare_results(
+        baseline,
+        current,
+        Tolerances(
+            time_relative=args.time_tolerance,
+            operations_relative=args.count_tolerance,
+            faces_relative=args.count_tolerance,
+        ),
+        speed_factor,
+        # Benchmarks left out by --filter are expected to be missing
+        require_all=not args.filter,
+    )
+
+    current_names = {
+        f"{suite}/{result['name']}" for suite, results in current.items() for result in results
+    }
+    baseline_names = {
+        f"{suite}/{result['name']}" for suite, results in baseline.items() for result in results
+    }
+    if current_names - baseline_names:
+        print(f"Not in the baseline: {', '.join(sorted(current_names - baseline_names))}\n")
+
+    regressions = [change for change in changes if change.regression]
+    improvements = [change for change in changes if not change.regression]
+
+    if improvements:
+        print(f"Improvements and decreases ({len(improvements)}):")
+        print(get_changes_table(improvements))
+        print()
+
+    if regressions:
+        print(f"Regressions ({len(regressions)}):")
+        print(get_changes_table(regressions))
+        sys.exit(1)
+
+    print(f"No regressions in {len(current_names & baseline_names)} benchmarks")
+
+
+if __name__ == "__main__":
+    main()
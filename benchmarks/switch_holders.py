@@ -0,0 +1,155 @@
+"""
+Benchmarks of the switch holder renderer across its variants:
+
+    python -m benchmarks.switch_holders --output switch_holders.json [--full] [--repeat 3]
+
+Renders the MX and Choc switch holders with each combination of reverse_diode_and_col_wire and
+has_front_cutout_for_removal, oriented for printing (and also not oriented with --full). Besides the JSON results,
+prints a table with the time of each profiled step of the holder (see STEPS), so holder geometry changes can be
+measured step by step.
+"""
+
+import contextlib
+import functools
+import itertools
+import sys
+from typing import Dict, List
+
+from klavgen.config import (
+    CaseConfig,
+    ChocSwitchHolderConfig,
+    Config,
+    MXSwitchHolderConfig,
+    SwitchType,
+)
+from klavgen.profiling import format_table
+from klavgen.renderer_switch_holder import render_switch_holder
+
+from .common import Benchmark, BenchmarkResult, get_argument_parser, run_benchmarks, write_results
+
+# The stages of the holder steps, as profiled in renderer_switch_holder.py
+HOLDER_STAGE = "switch_holder"
+STEPS = [
+    "sweep_socket",
+    "draw_bottom_angled_cutouts",
+    "draw_top_lips",
+    "render_col_wire_back_wrapper",
+    "render_diode_holder_cutout",
+]
+
+SWITCH_TYPES = {"mx": SwitchType.MX, "choc": SwitchType.CHOC}
+
+
+def get_config(
+    switch_type: SwitchType, reverse_diode_and_col_wire: bool, has_front_cutout_for_removal: bool
+) -> Config:
+    # A new holder config every time, since the Config defaults are shared instances
+    holder_config_class = (
+        MXSwitchHolderConfig if switch_type == SwitchType.MX else ChocSwitchHolderConfig
+    )
+    holder_config = holder_config_class(
+        reverse_diode_and_col_wire=reverse_diode_and_col_wire,
+        has_front_cutout_for_removal=has_front_cutout_for_removal,
+    )
+
+    if switch_type == SwitchType.MX:
+        return Config(
+            case_config=CaseConfig(switch_type=switch_type), switch_holder_mx_config=holder_config
+        )
+
+    return Config(
+        case_config=CaseConfig(switch_type=switch_type), switch_holder_choc_config=holder_config
+    )
+
+
+def get_benchmarks(full: bool = False) -> List[Benchmark]:
+    benchmarks = []
+    for switch_name, reverse, front_cutout, orient in itertools.product(
+        SWITCH_TYPES, [False, True], [True, False], [True, False] if full else [True]
+    ):
+        name = "_".join(
+            [
+                switch_name,
+                "reversed" if reverse else "standard",
+                "cutout" if front_cutout else "no_cutout",
+                "oriented" if orient else "unoriented",
+            ]
+        )
+        config = get_config(SWITCH_TYPES[switch_name], reverse, front_cutout)
+
+        benchmarks.append(
+            Benchmark(
+                name=name,
+                kind="switch_holder",
+                func=functools.partial(render_switch_holder, config, orient),
+                parameters={
+                    "switch_type": switch_name,
+                    "reverse_diode_and_col_wire": reverse,
+                    "has_front_cutout_for_removal": front_cutout,
+                    "orient_for_printing": orient,
+                },
+            )
+        )
+
+    return benchmarks
+
+
+def get_step_seconds(result: BenchmarkResult) -> Dict[str, float]:
+    """
+    Get the seconds of each step: drawing the socket (before the holder stage), each of STEPS, the unions and cuts
+    run in the holder stage itself (e.g. cutting the shapes drawn by the steps from the holder block), and the rest.
+    """
+    holder = result.stages.get(HOLDER_STAGE)
+    holder_seconds = holder.wall_seconds if holder else 0.0
+
+    steps = {"socket": result.wall_seconds - holder_seconds}
+    step_operation_seconds = 0.0
+    for step in STEPS:
+        stage = result.stages.get(f"{HOLDER_STAGE}/{step}")
+        steps[step] = stage.wall_seconds if stage else 0.0
+        step_operation_seconds += sum(stage.operation_seconds.values()) if stage else 0.0
+
+    holder_operation_seconds = sum(holder.operation_seconds.values()) if holder else 0.0
+    steps["holder_ops"] = holder_operation_seconds - step_operation_seconds
+    steps["other"] = holder_seconds - sum(steps[step] for step in STEPS) - steps["holder_ops"]
+
+    return steps
+
+
+def get_steps_table(results: List[BenchmarkResult]) -> str:
+    """
+    Get a human-readable table with a row per variant: the total seconds, the seconds of each step (see
+    get_step_seconds()) and the number of operations in the holder stage.
+    """
+    step_names = ["socket"] + STEPS + ["holder_ops", "other"]
+    header = ["Variant", "Total s"] + step_names + ["Op count"]
+
+    rows = []
+    for result in results:
+        if not result.success:
+            rows.append([result.name, "failed"] + [""] * (len(header) - 2))
+            continue
+
+        steps = get_step_seconds(result)
+        holder = result.stages.get(HOLDER_STAGE)
+        rows.append(
+            [result.name, f"{result.wall_seconds:.3f}"]
+            + [f"{steps[step]:.3f}" for step in step_names]
+            + [str(sum(holder.operations.values())) if holder else "0"]
+        )
+
+    return format_table(header, rows)
+
+
+def main():
+    args = get_argument_parser("Klavgen switch holder benchmarks").parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run_benchmarks(get_benchmarks(args.full), args.repeat, args.filter)
+    write_results("switch_holders", "full" if args.full else "quick", results, args.output)
+
+    print(f"\n{get_steps_table(results)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
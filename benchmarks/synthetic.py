@@ -0,0 +1,129 @@
+"""
+Scaling benchmarks on synthetic layouts (see klavgen.synthetic_layouts.generate_layout()):
+
+    python -m benchmarks.synthetic --output synthetic.json [--full]
+
+Times render_case() on ortho grids of 4 to 144 keys and on staggered, thumb cluster, mixed height, palm rest, screw
+hole and switch holder variants, each holder renderer, and exporting a case to every registered format. Exports are
+kept in memory, so nothing is written to the working directory.
+"""
+
+import functools
+from typing import Any, Dict, List
+
+from klavgen.config import CaseConfig, Config, SwitchType
+from klavgen.exporting import EXPORTERS, MemoryOutput
+from klavgen.renderer_case import RenderCaseResult, export_case, render_case
+from klavgen.renderer_connector import render_connector
+from klavgen.renderer_controller import render_controller_holder
+from klavgen.renderer_switch_holder import render_switch_holder
+from klavgen.renderer_trrs_jack import render_trrs_jack_holder
+from klavgen.renderer_usbc_jack import render_usbc_jack_holder
+from klavgen.synthetic_layouts import generate_layout
+
+from .common import Benchmark, main_for_suite
+
+# Name to generate_layout() keyword arguments
+QUICK_LAYOUTS = {
+    "grid_4": dict(key_count=4),
+    "grid_12": dict(key_count=12),
+    "grid_24": dict(key_count=24),
+    "stagger_12": dict(key_count=12, row_stagger=0.25),
+    "thumbs_12": dict(key_count=12, thumb_keys=3),
+    "z_12": dict(key_count=12, z_step=3),
+    "palm_rest_screws_12": dict(key_count=12, palm_rest=True, screw_holes=True),
+    "holders_8": dict(key_count=8, standard_components=True),
+}
+
+FULL_LAYOUTS = {
+    **QUICK_LAYOUTS,
+    "grid_48": dict(key_count=48),
+    "grid_72": dict(key_count=72),
+    "grid_96": dict(key_count=96, rows=6),
+    "grid_144": dict(key_count=144, rows=6),
+    "stagger_60": dict(key_count=60, rows=5, row_stagger=0.25),
+    "thumbs_z_60": dict(key_count=60, rows=5, thumb_keys=4, z_step=3),
+    "palm_rest_screws_60": dict(key_count=60, rows=5, palm_rest=True, screw_holes=True),
+    "fillet_24": dict(key_count=24, side_fillet=True),
+    "choc_24": dict(key_count=24, choc=True),
+    "holders_24": dict(key_count=24, standard_components=True),
+    "choc_holders_24": dict(key_count=24, choc=True, standard_components=True),
+}
+
+# The layout whose case is exported in each mode
+QUICK_EXPORT_LAYOUT = "grid_12"
+FULL_EXPORT_LAYOUT = "grid_48"
+
+MX_CONFIG = Config()
+CHOC_CONFIG = Config(case_config=CaseConfig(switch_type=SwitchType.CHOC))
+
+# Name to holder render function
+HOLDERS = {
+    "switch_holder_mx": lambda: render_switch_holder(MX_CONFIG),
+    "switch_holder_choc": lambda: render_switch_holder(CHOC_CONFIG),
+    "controller_holder": lambda: render_controller_holder(MX_CONFIG),
+    "trrs_jack_holder": lambda: render_trrs_jack_holder(MX_CONFIG.trrs_jack_config),
+    "usbc_jack_holder": lambda: render_usbc_jack_holder(MX_CONFIG),
+    "connector": lambda: render_connector(MX_CONFIG),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def render_layout(name: str) -> RenderCaseResult:
+    """
+    Render a layout once for all the export benchmarks using it.
+    """
+    return render_case(**generate_layout(**FULL_LAYOUTS[name]))
+
+
+def export_to_memory(case_result: RenderCaseResult, file_format: str) -> MemoryOutput:
+    output = MemoryOutput()
+    export_case(case_result, file_format, output)
+
+    return output
+
+
+def get_export_sizes(output: MemoryOutput) -> Dict[str, Any]:
+    return {"bytes": sum(len(output.get_view(name)) for name in output.file_names())}
+
+
+def get_benchmarks(full: bool = False) -> List[Benchmark]:
+    layouts = FULL_LAYOUTS if full else QUICK_LAYOUTS
+    export_layout = FULL_EXPORT_LAYOUT if full else QUICK_EXPORT_LAYOUT
+
+    benchmarks = [
+        Benchmark(
+            name=name,
+            kind="render_case",
+            func=functools.partial(render_case, **generate_layout(**options)),
+            parameters=options,
+        )
+        for name, options in layouts.items()
+    ]
+
+    benchmarks += [
+        Benchmark(name=name, kind="holder", func=render_holder)
+        for name, render_holder in HOLDERS.items()
+    ]
+
+    benchmarks += [
+        Benchmark(
+            name=f"{export_layout}_{file_format}",
+            kind="export",
+            func=functools.partial(export_to_memory, file_format=file_format),
+            parameters={"layout": export_layout, "format": file_format},
+            setup=functools.partial(render_layout, export_layout),
+            measure=get_export_sizes,
+        )
+        for file_format in EXPORTERS.exporters
+    ]
+
+    return benchmarks
+
+
+def main():
+    main_for_suite("synthetic", "Klavgen scaling benchmarks on synthetic layouts", get_benchmarks)
+
+
+if __name__ == "__main__":
+    main()
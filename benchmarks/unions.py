@@ -0,0 +1,268 @@
+"""
+Microbenchmarks of ways to union many key primitives, e.g. before changing utils.union_list() or the render_case()
+boolean sequence:
+
+    python -m benchmarks.unions --output unions.json [--full]
+
+Renders the primitives of grids of keys with render_key() (the case columns unioned in the input_unions stage, and
+the switch holes), at several key counts and rotations, and unions them with each strategy in STRATEGIES. Each
+result records the volume of what the strategy produced and its difference to the one of union_list(), and a
+summary table of the times is printed at the end, with the strategies that produced a different volume marked.
+"""
+
+import contextlib
+import functools
+import sys
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Tuple
+
+import cadquery as cq
+
+from klavgen.classes import Key
+from klavgen.config import Config
+from klavgen.profiling import format_table
+from klavgen.renderer_key import render_key, render_key_templates
+from klavgen.synthetic_layouts import KEY_PITCH
+from klavgen.utils import union_list
+
+from .common import Benchmark, BenchmarkResult, get_argument_parser, run_benchmarks, write_results
+
+# The relative volume difference to the union_list() result still counted as the same volume
+VOLUME_TOLERANCE = 1e-4
+
+QUICK_KEY_COUNTS = [4, 16]
+FULL_KEY_COUNTS = [4, 16, 36, 64]
+
+# "none": an axis-aligned grid. "uniform": the whole grid rotated 10 degrees, so no edge is axis-aligned. "splay":
+# each column rotated 4 degrees more than the previous one around its bottom, so neighboring columns overlap.
+QUICK_ROTATIONS = ["none", "splay"]
+FULL_ROTATIONS = ["none", "uniform", "splay"]
+
+# The RenderedKey fields unioned. Case columns are prisms of the same height, so they can also be unioned as 2D
+# outlines.
+PRIMITIVES = ["case_column", "switch_hole"]
+PRISM_PRIMITIVES = {"case_column"}
+
+
+def get_keys(key_count: int, rotation: str, rows: int = 4) -> List[Key]:
+    keys = []
+    for index in range(key_count):
+        column = index // rows
+        x = column * KEY_PITCH
+        y = (index % rows) * KEY_PITCH
+
+        if rotation == "uniform":
+            keys.append(Key(x=x, y=y, rotate=10, rotate_around=(0, 0)))
+        elif rotation == "splay":
+            keys.append(Key(x=x, y=y, rotate=-4 * column, rotate_around=(x, -KEY_PITCH / 2)))
+        else:
+            keys.append(Key(x=x, y=y))
+
+    return keys
+
+
+@functools.lru_cache(maxsize=None)
+def render_primitives(primitive: str, key_count: int, rotation: str) -> Tuple[cq.Workplane, ...]:
+    """
+    Render the primitives once for all the strategies unioning them.
+    """
+    config = Config()
+    templates = render_key_templates(config.case_config, config.get_switch_holder_config())
+
+    return tuple(
+        getattr(render_key(key, templates, config.case_config, config.get_key_config()), primitive)
+        for key in get_keys(key_count, rotation)
+    )
+
+
+def _get_shapes(workplanes: Tuple[cq.Workplane, ...]) -> List[cq.Shape]:
+    return [workplane.val() for workplane in workplanes]
+
+
+def reduce_union(workplanes: Tuple[cq.Workplane, ...]) -> cq.Workplane:
+    # What render_case() does: union one primitive at a time into the growing result
+    return union_list(list(workplanes))
+
+
+def tree_union(workplanes: Tuple[cq.Workplane, ...]) -> cq.Workplane:
+    # Union pairs, then pairs of pairs, etc., so each union has operands of similar size
+    level = list(workplanes)
+    while len(level) > 1:
+        level = [
+            level[index].union(level[index + 1]) if index + 1 < len(level) else level[index]
+            for index in range(0, len(level), 2)
+        ]
+
+    return level[0]
+
+
+def general_fuse(workplanes: Tuple[cq.Workplane, ...]) -> cq.Shape:
+    # A single boolean fusing all primitives at once
+    shapes = _get_shapes(workplanes)
+
+    return shapes[0].fuse(*shapes[1:]).clean()
+
+
+def glue_fuse(workplanes: Tuple[cq.Workplane, ...]) -> cq.Shape:
+    # Like general_fuse(), with the glue option, which skips intersecting faces that only touch. Only correct for
+    # shapes that touch without overlapping, so it's expected to get a different volume on overlapping keys.
+    shapes = _get_shapes(workplanes)
+
+    return shapes[0].fuse(*shapes[1:], glue=True).clean()
+
+
+def outline_extrusion(workplanes: Tuple[cq.Workplane, ...]) -> cq.Shape:
+    # Union the bottom faces in 2D, then extrude the outline once. Only for prisms with the same bottom and height.
+    shapes = _get_shapes(workplanes)
+    bounding_boxes = [shape.BoundingBox() for shape in shapes]
+
+    zmin = bounding_boxes[0].zmin
+    zmax = bounding_boxes[0].zmax
+    if any(abs(bb.zmin - zmin) > 1e-6 or abs(bb.zmax - zmax) > 1e-6 for bb in bounding_boxes):
+        raise Exception("Outline extrusion needs prisms with the same bottom and height")
+
+    bottoms = [
+        face for shape in shapes for face in shape.Faces() if face.BoundingBox().zmax - zmin < 1e-6
+    ]
+
+    outline = bottoms[0].fuse(*bottoms[1:]).clean()
+    solids = [
+        cq.Solid.extrudeLinear(face, cq.Vector(0, 0, zmax - zmin)) for face in outline.Faces()
+    ]
+
+    return solids[0] if len(solids) == 1 else cq.Compound.makeCompound(solids)
+
+
+# Strategy name to function. The first one is the reference the volumes are compared to.
+STRATEGIES: Dict[str, Callable[[Tuple[cq.Workplane, ...]], Any]] = {
+    "reduce": reduce_union,
+    "tree": tree_union,
+    "general_fuse": general_fuse,
+    "glue_fuse": glue_fuse,
+    "outline_extrusion": outline_extrusion,
+}
+
+
+def measure_union(value: Any) -> Dict[str, Any]:
+    if value is None:
+        return {}
+
+    shape = value.val() if isinstance(value, cq.Workplane) else value
+
+    return {"volume": shape.Volume(), "solids": len(shape.Solids())}
+
+
+def get_benchmarks(full: bool = False) -> List[Benchmark]:
+    benchmarks = []
+    for primitive in PRIMITIVES:
+        for key_count in FULL_KEY_COUNTS if full else QUICK_KEY_COUNTS:
+            for rotation in FULL_ROTATIONS if full else QUICK_ROTATIONS:
+                for strategy, func in STRATEGIES.items():
+                    if strategy == "outline_extrusion" and primitive not in PRISM_PRIMITIVES:
+                        continue
+
+                    benchmarks.append(
+                        Benchmark(
+                            name=f"{primitive}_{key_count}_{rotation}_{strategy}",
+                            kind="union",
+                            func=func,
+                            parameters={
+                                "primitive": primitive,
+                                "keys": key_count,
+                                "rotation": rotation,
+                                "strategy": strategy,
+                            },
+                            setup=functools.partial(
+                                render_primitives, primitive, key_count, rotation
+                            ),
+                            measure=measure_union,
+                        )
+                    )
+
+    return benchmarks
+
+
+def _get_case(result: BenchmarkResult) -> Tuple[str, int, str]:
+    return (
+        result.parameters["primitive"],
+        result.parameters["keys"],
+        result.parameters["rotation"],
+    )
+
+
+def check_volumes(results: List[BenchmarkResult]) -> List[BenchmarkResult]:
+    """
+    Add each result's relative volume difference to the reference strategy's result (in extra["volume_difference"]),
+    and whether that's within VOLUME_TOLERANCE (in extra["same_volume"]).
+
+    :return: The successful results with a different volume.
+    """
+    reference_strategy = next(iter(STRATEGIES))
+    reference_volumes = {
+        _get_case(result): result.extra["volume"]
+        for result in results
+        if result.success and result.parameters["strategy"] == reference_strategy
+    }
+
+    mismatches = []
+    for result in results:
+        reference_volume = reference_volumes.get(_get_case(result))
+        if not result.success or not reference_volume:
+            continue
+
+        difference = (result.extra["volume"] - reference_volume) / reference_volume
+        result.extra["volume_difference"] = difference
+        result.extra["same_volume"] = abs(difference) <= VOLUME_TOLERANCE
+        if not result.extra["same_volume"]:
+            mismatches.append(result)
+
+    return mismatches
+
+
+def get_summary_table(results: List[BenchmarkResult]) -> str:
+    """
+    Get a human-readable table with the seconds of each strategy, a row per primitive, key count and rotation. Failed
+    strategies show as "failed", and ones that produced a different volume have a "*".
+    """
+    rows_by_case: Dict[Tuple[str, int, str], Dict[str, str]] = defaultdict(dict)
+    for result in results:
+        if not result.success:
+            cell = "failed"
+        else:
+            cell = f"{result.wall_seconds:.3f}"
+            if not result.extra.get("same_volume", True):
+                cell += "*"
+
+        rows_by_case[_get_case(result)][result.parameters["strategy"]] = cell
+
+    header = ["Primitive", "Keys", "Rotation"] + list(STRATEGIES)
+    rows = [
+        [primitive, str(key_count), rotation]
+        + [cells.get(strategy, "-") for strategy in STRATEGIES]
+        for (primitive, key_count, rotation), cells in rows_by_case.items()
+    ]
+
+    return format_table(header, rows, left_aligned=(0, 2))
+
+
+def main():
+    args = get_argument_parser("Klavgen union strategy microbenchmarks").parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run_benchmarks(get_benchmarks(args.full), args.repeat, args.filter)
+    mismatches = check_volumes(results)
+    write_results("unions", "full" if args.full else "quick", results, args.output)
+
+    print(f"\n{get_summary_table(results)}\n", file=sys.stderr)
+    if mismatches:
+        print(
+            f"Different volume than {next(iter(STRATEGIES))}: "
+            + ", ".join(result.name for result in mismatches),
+            file=sys.stderr,
+        )
+    else:
+        print("All strategies produced the same volume", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,18 @@ from . import (
     classes,
     config,
     constants,
+    cost_model,
+    exporter_3mf,
+    exporter_glb,
+    exporter_step,
+    exporting,
     keyboard,
     kle,
+    mesh,
+    mesh_cache,
+    mesh_transfer,
+    operation_plan,
+    profiling,
     renderer_case,
     renderer_connector,
     renderer_controller,
@@ -16,12 +26,27 @@ from . import (
     renderer_trrs_jack,
     renderer_usbc_jack,
     rendering,
+    result_bundle,
+    shape_metrics,
+    synthetic_layouts,
 )
 
+importlib.reload(profiling)
+importlib.reload(operation_plan)
 importlib.reload(rendering)
+importlib.reload(shape_metrics)
 importlib.reload(classes)
 importlib.reload(config)
 importlib.reload(constants)
+importlib.reload(cost_model)
+importlib.reload(synthetic_layouts)
+importlib.reload(exporting)
+importlib.reload(mesh)
+importlib.reload(mesh_cache)
+importlib.reload(mesh_transfer)
+importlib.reload(exporter_3mf)
+importlib.reload(exporter_glb)
+importlib.reload(exporter_step)
 importlib.reload(keyboard)
 importlib.reload(kle)
 importlib.reload(renderer_case)
@@ -33,10 +58,12 @@ importlib.reload(renderer_key)
 importlib.reload(renderer_switch_holder)
 importlib.reload(renderer_trrs_jack)
 importlib.reload(renderer_usbc_jack)
+importlib.reload(result_bundle)
 
 
 # Classes
 from .classes import (
+    ComponentPlacements,
     Controller,
     Cut,
     Key,
@@ -82,12 +109,16 @@ from .keyboard import render_and_save_keyboard
 from .kle import generate_keys_from_kle_json
 from .renderer_case import (
     RenderCaseResult,
+    Retain,
+    export_case,
     export_case_to_step,
     export_case_to_stl,
     move_top,
+    release_intermediates,
     render_case,
 )
 from .renderer_connector import (
+    export_connector,
     export_connector_to_step,
     export_connector_to_stl,
     render_case_connector_support,
@@ -95,6 +126,7 @@ from .renderer_connector import (
     render_connector_cutout,
 )
 from .renderer_controller import (
+    export_controller_holder,
     export_controller_holder_to_step,
     export_controller_holder_to_stl,
     render_controller_holder,
@@ -102,6 +134,7 @@ from .renderer_controller import (
 from .renderer_kailh_choc_socket import draw_choc_socket
 from .renderer_kailh_mx_socket import draw_mx_socket
 from .renderer_switch_holder import (
+    export_switch_holder,
     export_switch_holder_to_step,
     export_switch_holder_to_stl,
     render_choc_switch_holder,
@@ -109,12 +142,69 @@ from .renderer_switch_holder import (
     render_switch_holder,
 )
 from .renderer_trrs_jack import (
+    export_trrs_jack_holder,
     export_trrs_jack_holder_to_step,
     export_trrs_jack_holder_to_stl,
     render_trrs_jack_holder,
 )
 from .renderer_usbc_jack import (
+    export_usbc_jack_holder,
     export_usbc_jack_holder_to_step,
     export_usbc_jack_holder_to_stl,
     render_usbc_jack_holder,
 )
+from .synthetic_layouts import generate_layout
+
+# isort: split
+
+# Exporting
+from .exporter_3mf import (
+    export_case_to_3mf,
+    export_components_to_3mf,
+    export_plates_to_3mf,
+    layout_on_plates,
+)
+from .exporter_glb import export_case_to_glb
+from .exporter_step import (
+    build_assembly,
+    export_case_to_step_assembly,
+    export_components_to_step_assembly,
+)
+from .exporting import (
+    EXPORTERS,
+    DirectoryOutput,
+    ExportOptions,
+    ExportOutput,
+    ExportRecord,
+    MemoryOutput,
+    StreamOutput,
+    TarOutput,
+    ZipOutput,
+    export_part,
+    export_to_bytes,
+    export_to_stream,
+)
+from .result_bundle import ResultBundle, load_result, save_result
+
+# isort: split
+
+# Meshes
+from .mesh import Mesh, export_mesh, mesh_from_shape
+from .mesh_cache import MeshCache
+
+# isort: split
+
+# Profiling
+from .cost_model import (
+    CostEstimate,
+    CostModel,
+    LayoutFeatures,
+    estimate_render_cost,
+    fit_cost_model,
+    get_layout_features,
+    load_cost_model,
+    sample_from_profile,
+)
+from .operation_plan import OperationPlan, PlannedOperation, planning
+from .profiling import InputCost, RenderProfile, StageProfile, profile_stage, profiling, tag_source
+from .shape_metrics import ComplexityThresholds, ShapeMetrics, get_metrics_table, get_shape_metrics
@@ -0,0 +1,116 @@
+"""
+Refit the render cost model (see cost_model.py) on this machine:
+
+    python -m klavgen.calibrate_cost_model --output cost_model.json [--quick]
+
+Renders a set of calibration layouts with render_case(), each in a fresh process so its peak memory is measured on its
+own, fits a model and saves it. Load it with load_cost_model() and pass it to estimate_render_cost().
+"""
+
+import argparse
+import multiprocessing
+import platform
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from klavgen.cost_model import (
+    CalibrationSample,
+    estimate_render_cost,
+    fit_cost_model,
+    get_layout_features,
+)
+from klavgen.profiling import get_max_rss_mb
+from klavgen.renderer_case import render_case
+from klavgen.synthetic_layouts import generate_layout
+
+
+def get_calibration_layouts(quick: bool = False) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Get the calibration layouts as (name, generate_layout() keyword arguments) tuples.
+    """
+    layouts = [
+        ("grid_4", dict(key_count=4)),
+        ("grid_12", dict(key_count=12)),
+        ("grid_24", dict(key_count=24)),
+        ("grid_12_thumbs", dict(key_count=12, thumb_keys=3)),
+        ("grid_12_z", dict(key_count=12, z_step=3)),
+        ("grid_12_palm_rest", dict(key_count=12, palm_rest=True)),
+        ("grid_12_extras", dict(key_count=12, screw_holes=True, text=True)),
+        ("grid_8_holders", dict(key_count=8, standard_components=True)),
+    ]
+
+    if not quick:
+        layouts += [
+            ("grid_48", dict(key_count=48)),
+            ("grid_72", dict(key_count=72)),
+            ("grid_36_thumbs_z", dict(key_count=36, thumb_keys=3, z_step=3)),
+            ("grid_24_palm_rest", dict(key_count=24, palm_rest=True, screw_holes=True)),
+            ("grid_24_fillet", dict(key_count=24, side_fillet=True)),
+            ("grid_24_choc", dict(key_count=24, choc=True)),
+            ("grid_24_extras", dict(key_count=24, screw_holes=True, text=True)),
+            ("grid_16_holders", dict(key_count=16, standard_components=True)),
+            ("grid_16_choc_holders", dict(key_count=16, choc=True, standard_components=True)),
+        ]
+
+    return layouts
+
+
+def measure_layout(name: str, options: Dict[str, Any]) -> CalibrationSample:
+    """
+    Render a calibration layout and measure it. Meant to run in a fresh process, see calibrate().
+    """
+    layout = generate_layout(**options)
+
+    start = time.perf_counter()
+    render_case(**layout)
+    wall_seconds = time.perf_counter() - start
+
+    return CalibrationSample(
+        features=get_layout_features(**layout),
+        wall_seconds=wall_seconds,
+        peak_memory_mb=get_max_rss_mb(),
+        name=name,
+    )
+
+
+def calibrate(quick: bool = False) -> List[CalibrationSample]:
+    samples = []
+    # A fresh process per layout, so peak memory isn't carried over from the previous one
+    context = multiprocessing.get_context("spawn")
+    for name, options in get_calibration_layouts(quick):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            try:
+                sample = executor.submit(measure_layout, name, options).result()
+            except Exception as e:
+                print(f"{name}: failed ({e})")
+                continue
+
+        print(f"{name}: {sample.wall_seconds:.1f} s, {sample.peak_memory_mb or 0:.0f} MB peak")
+        samples.append(sample)
+
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Refit the klavgen render cost model on this machine"
+    )
+    parser.add_argument("--output", default="cost_model.json", help="Where to save the model")
+    parser.add_argument("--quick", action="store_true", help="Only render the smaller layouts")
+    args = parser.parse_args()
+
+    samples = calibrate(args.quick)
+    model = fit_cost_model(samples, description=f"{platform.node()} ({platform.machine()})")
+    model.save(args.output)
+
+    print(f"\nSaved the model to {args.output}")
+    for sample in samples:
+        estimate = estimate_render_cost(sample.features, model)
+        print(
+            f"{sample.name}: measured {sample.wall_seconds:.1f} s, estimated {estimate.wall_seconds:.1f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -104,3 +104,11 @@ class PalmRest:
 class RenderedSwitchHolder:
     switch_holder: Any
     socket: Any
+
+
+@dataclass
+class ComponentPlacements:
+    # A component rendered once at the origin and the locations of all its copies
+    name: str
+    shape: Any
+    locations: List[LocationOrientation]
@@ -0,0 +1,311 @@
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, TextIO, Union
+
+import numpy as np
+
+from .classes import Controller, Cut, Key, PalmRest, Patch, ScrewHole, Text, TrrsJack
+from .config import Config, SwitchType
+from .profiling import RenderProfile
+from .rendering import Renderable
+
+# The layout features the cost model is linear in, see get_layout_features()
+FEATURES = [
+    "intercept",
+    "keys",
+    # keys^2 / 100: unioning key after key into a growing case is superlinear
+    "keys_squared",
+    "rotations",
+    "z_levels",
+    "palm_rests",
+    "connectors",
+    "screw_holes",
+    "texts",
+    # Keys if the case side fillet is on, since the fillet runs along every key's outline
+    "filleted_keys",
+    "choc",
+    # Keys if render_standard_components is set, since there is a switch holder per key
+    "standard_component_keys",
+]
+
+
+@dataclass
+class LayoutFeatures:
+    keys: int
+    # The number of distinct key rotations, e.g. 2 for a grid with an angled thumb cluster
+    rotations: int
+    # The number of distinct key heights
+    z_levels: int
+    palm_rests: int = 0
+    # The number of palm rest connectors
+    connectors: int = 0
+    screw_holes: int = 0
+    texts: int = 0
+    # Other inputs (controller, TRRS jack, patches, cuts, case_extras, components), counted but not in the model
+    other_inputs: int = 0
+    side_fillet: bool = False
+    choc: bool = False
+    standard_components: bool = False
+
+    def get_vector(self) -> List[float]:
+        """
+        Get the feature values in the order of FEATURES.
+        """
+        values = {
+            "intercept": 1.0,
+            "keys": self.keys,
+            "keys_squared": self.keys**2 / 100,
+            "rotations": self.rotations,
+            "z_levels": self.z_levels,
+            "palm_rests": self.palm_rests,
+            "connectors": self.connectors,
+            "screw_holes": self.screw_holes,
+            "texts": self.texts,
+            "filleted_keys": self.keys if self.side_fillet else 0,
+            "choc": 1.0 if self.choc else 0.0,
+            "standard_component_keys": self.keys if self.standard_components else 0,
+        }
+
+        return [float(values[name]) for name in FEATURES]
+
+
+def get_layout_features(
+    keys: List[Key],
+    screw_holes: Optional[List[ScrewHole]] = None,
+    controller: Optional[Controller] = None,
+    trrs_jack: Optional[TrrsJack] = None,
+    components: Optional[List[Renderable]] = None,
+    patches: Optional[List[Patch]] = None,
+    cuts: Optional[List[Cut]] = None,
+    case_extras: Optional[List[Any]] = None,
+    palm_rests: Optional[List[PalmRest]] = None,
+    texts: Optional[List[Text]] = None,
+    render_standard_components: bool = False,
+    config: Config = Config(),
+    **kwargs,
+) -> LayoutFeatures:
+    """
+    Get the features of a layout that drive its render time and memory. Takes the same parameters as render_case(),
+    and ignores the ones that don't matter (e.g. debug).
+    """
+    other_inputs = (
+        (1 if controller else 0)
+        + (1 if trrs_jack else 0)
+        + len(components or [])
+        + len(patches or [])
+        + len(cuts or [])
+        + len(case_extras or [])
+    )
+
+    return LayoutFeatures(
+        keys=len(keys),
+        rotations=len({round(key.rotate or 0, 3) for key in keys}),
+        z_levels=len({round(key.z or 0, 3) for key in keys}),
+        palm_rests=len(palm_rests or []),
+        connectors=sum(
+            len(palm_rest.connector_locations_x or []) for palm_rest in palm_rests or []
+        ),
+        screw_holes=len(screw_holes or []),
+        texts=len(texts or []),
+        other_inputs=other_inputs,
+        side_fillet=bool(config.case_config.side_fillet),
+        choc=config.case_config.switch_type == SwitchType.CHOC,
+        standard_components=render_standard_components,
+    )
+
+
+@dataclass
+class CostEstimate:
+    wall_seconds: float
+    # None if the model has no memory coefficients
+    peak_memory_mb: Optional[float]
+
+
+@dataclass
+class CostModel:
+    # Seconds and peak MB per unit of each feature, by name (see FEATURES)
+    seconds_coefficients: Dict[str, float]
+    memory_coefficients: Dict[str, float] = field(default_factory=dict)
+    # The number of samples the model was fitted on, and where, e.g. the host name
+    sample_count: int = 0
+    description: str = ""
+
+    def estimate(self, features: LayoutFeatures) -> CostEstimate:
+        vector = dict(zip(FEATURES, features.get_vector()))
+
+        def predict(coefficients: Dict[str, float]) -> float:
+            return max(
+                0.0, sum(coefficients.get(name, 0.0) * value for name, value in vector.items())
+            )
+
+        return CostEstimate(
+            wall_seconds=predict(self.seconds_coefficients),
+            peak_memory_mb=predict(self.memory_coefficients) if self.memory_coefficients else None,
+        )
+
+    def save(self, file: Union[str, os.PathLike, TextIO]):
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, "w") as f:
+                json.dump(asdict(self), f, indent=2)
+        else:
+            json.dump(asdict(self), file, indent=2)
+
+
+def load_cost_model(file: Union[str, os.PathLike, TextIO]) -> CostModel:
+    if isinstance(file, (str, os.PathLike)):
+        with open(file) as f:
+            return CostModel(**json.load(f))
+
+    return CostModel(**json.load(file))
+
+
+# Fitted with calibrate_cost_model.py on 17 layouts of 4 to 72 keys, on an x86-64 Linux VM
+DEFAULT_COST_MODEL = CostModel(
+    seconds_coefficients={
+        "intercept": 0.0,
+        "keys": 0.11,
+        "keys_squared": 0.69,
+        "rotations": 0.68,
+        "z_levels": 0.75,
+        "palm_rests": 0.1,
+        "connectors": 0.1,
+        "screw_holes": 0.14,
+        "texts": 3.0,
+        "filleted_keys": 0.0,
+        "choc": 0.0,
+        "standard_component_keys": 0.64,
+    },
+    memory_coefficients={
+        "intercept": 460.0,
+        "keys": 0.5,
+        "keys_squared": 0.63,
+        "rotations": 1.2,
+        "z_levels": 5.6,
+        "palm_rests": 0.86,
+        "connectors": 0.86,
+        "screw_holes": 1.4,
+        "texts": 42.0,
+        "filleted_keys": 0.12,
+        "choc": 0.0,
+        "standard_component_keys": 0.65,
+    },
+    sample_count=17,
+)
+
+
+def estimate_render_cost(
+    features: LayoutFeatures, model: Optional[CostModel] = None
+) -> CostEstimate:
+    """
+    Estimate the wall time and peak memory (RSS) of rendering a layout with render_case(), e.g. to schedule it on a
+    big enough worker. Estimates come from a linear model of the layout features, so they're only as good as the
+    calibration: refit the model on your own hardware with calibrate_cost_model.py.
+
+    :param features: The layout features, see get_layout_features().
+    :param model: The model to use. Defaults to DEFAULT_COST_MODEL.
+    """
+    return (model or DEFAULT_COST_MODEL).estimate(features)
+
+
+@dataclass
+class CalibrationSample:
+    features: LayoutFeatures
+    wall_seconds: float
+    # None if not measured, in which case the sample is only used for the time model
+    peak_memory_mb: Optional[float] = None
+    name: str = ""
+
+
+def sample_from_profile(
+    features: LayoutFeatures,
+    profile: RenderProfile,
+    peak_memory_mb: Optional[float] = None,
+    name: str = "",
+) -> CalibrationSample:
+    """
+    Make a calibration sample from a recorded profile (see render_case(profile=True)), using the time of its
+    render_case stage.
+    """
+    stage = profile.get_stage("render_case") or profile.get_stage(
+        "render_and_save_keyboard/render_case"
+    )
+    if not stage:
+        raise Exception("The profile has no render_case stage")
+
+    return CalibrationSample(features, stage.wall_seconds, peak_memory_mb, name)
+
+
+def _solve_non_negative(matrix: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """
+    Solve min |matrix @ x - target| subject to x >= 0 with the Lawson-Hanson active set method.
+    """
+    column_count = matrix.shape[1]
+    tolerance = 10 * max(matrix.shape) * np.finfo(float).eps * np.abs(matrix).sum(axis=0).max()
+
+    # Columns in the passive set are free, the others are held at 0
+    passive = np.zeros(column_count, dtype=bool)
+    solution = np.zeros(column_count)
+
+    for _ in range(3 * column_count):
+        gradient = matrix.T @ (target - matrix @ solution)
+        if passive.all() or gradient[~passive].max() <= tolerance:
+            break
+
+        passive[np.argmax(np.where(passive, -np.inf, gradient))] = True
+
+        while True:
+            candidate = np.zeros(column_count)
+            candidate[passive] = np.linalg.lstsq(matrix[:, passive], target, rcond=None)[0]
+            if candidate[passive].min() > 0:
+                break
+
+            # Move towards the candidate until the first coefficient reaches 0, and hold it there
+            blocking = passive & (candidate <= 0)
+            step = np.min(solution[blocking] / (solution[blocking] - candidate[blocking]))
+            solution += step * (candidate - solution)
+            passive &= solution > tolerance
+            solution[~passive] = 0
+
+        solution = candidate
+
+    return solution
+
+
+def _fit(rows: List[List[float]], targets: List[float]) -> Dict[str, float]:
+    # Least squares with non-negative coefficients, since no feature makes a render cheaper. A little ridge
+    # regularization, as extra rows pulling every coefficient towards 0, keeps features missing from the samples at 0.
+    matrix = np.vstack([np.array(rows), 1e-3 * np.eye(len(FEATURES))])
+    target = np.concatenate([np.array(targets), np.zeros(len(FEATURES))])
+
+    return {
+        name: float(value) for name, value in zip(FEATURES, _solve_non_negative(matrix, target))
+    }
+
+
+def fit_cost_model(samples: List[CalibrationSample], description: str = "") -> CostModel:
+    """
+    Fit a cost model on calibration samples, e.g. recorded profiles of your own renders (see sample_from_profile())
+    or the renders run by calibrate_cost_model.py.
+    """
+    if not samples:
+        raise Exception("Need at least one calibration sample")
+
+    memory_samples = [sample for sample in samples if sample.peak_memory_mb is not None]
+
+    return CostModel(
+        seconds_coefficients=_fit(
+            [sample.features.get_vector() for sample in samples],
+            [sample.wall_seconds for sample in samples],
+        ),
+        memory_coefficients=(
+            _fit(
+                [sample.features.get_vector() for sample in memory_samples],
+                [sample.peak_memory_mb for sample in memory_samples],
+            )
+            if memory_samples
+            else {}
+        ),
+        sample_count=len(samples),
+        description=description,
+    )
@@ -0,0 +1,244 @@
+import math
+import zipfile
+from typing import Any, BinaryIO, List, Optional
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+
+from .classes import ComponentPlacements, LocationOrientation
+from .exporting import (
+    EXPORTERS,
+    ExportOptions,
+    OutputTarget,
+    get_components_fingerprint,
+    get_output,
+    to_shape,
+    write_part,
+)
+from .mesh import Mesh, get_bounding_box, mesh_from_shape, weld
+from .renderer_case import IDENTITY_LOCATION, RenderCaseResult, get_case_components
+from .utils import location_to_matrix
+
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+ <Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+ <Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>
+</Types>
+"""
+
+RELATIONSHIPS = """<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+ <Relationship Target="/3D/3dmodel.model" Id="rel0" \
+Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>
+</Relationships>
+"""
+
+MODEL_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<model unit="millimeter" xml:lang="en-US" xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">
+ <metadata name="Application">klavgen</metadata>
+ <resources>
+"""
+
+
+def _format_transform(lr: LocationOrientation) -> str:
+    m = location_to_matrix(lr)
+
+    # 3MF uses row vectors, so the 3x3 rotation is written transposed, followed by the translation
+    values = [m[row][col] for col in range(3) for row in range(3)] + [m[row][3] for row in range(3)]
+
+    # Adding 0.0 turns -0.0 into 0.0
+    return " ".join(f"{round(value, 6) + 0.0:.6f}" for value in values)
+
+
+def _write_object(model: BinaryIO, object_id: int, name: str, obj: Any, options: ExportOptions):
+    # Meshes are already tessellated, e.g. memory-mapped from a MeshCache
+    mesh = obj if isinstance(obj, Mesh) else weld(mesh_from_shape(obj, options))
+    if not len(mesh.triangles):
+        return 0
+
+    model.write(
+        f'  <object id="{object_id}" name={quoteattr(name)} type="model">\n'
+        f"   <mesh>\n    <vertices>\n".encode()
+    )
+    # Formatted row by row from the arrays, without converting a whole (possibly memory-mapped) mesh to lists
+    np.savetxt(model, mesh.vertices, fmt='     <vertex x="%.4f" y="%.4f" z="%.4f"/>')
+    model.write(b"    </vertices>\n    <triangles>\n")
+    np.savetxt(model, mesh.triangles, fmt='     <triangle v1="%d" v2="%d" v3="%d"/>')
+    model.write(b"    </triangles>\n   </mesh>\n  </object>\n")
+
+    return len(mesh.triangles)
+
+
+def write_components_3mf(
+    components: List[ComponentPlacements], stream: BinaryIO, options: ExportOptions
+) -> int:
+    """
+    Write a 3MF file where each component's mesh is stored once and each of its locations is a build item referencing
+    it, so the file size doesn't grow with the number of copies.
+
+    :return: The number of unique triangles written.
+    """
+    triangle_count = 0
+
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", CONTENT_TYPES)
+        archive.writestr("_rels/.rels", RELATIONSHIPS)
+
+        with archive.open("3D/3dmodel.model", "w") as model:
+            model.write(MODEL_HEADER.encode())
+
+            written_ids = []
+            for object_id, component in enumerate(components, start=1):
+                object_triangle_count = _write_object(
+                    model, object_id, component.name, component.shape, options
+                )
+                if object_triangle_count:
+                    written_ids.append(object_id)
+                    triangle_count += object_triangle_count
+
+            model.write(b" </resources>\n <build>\n")
+
+            for object_id, component in enumerate(components, start=1):
+                if object_id not in written_ids:
+                    continue
+
+                for location in component.locations:
+                    model.write(
+                        f'  <item objectid="{object_id}" '
+                        f'transform="{_format_transform(location)}"/>\n'.encode()
+                    )
+
+            model.write(b" </build>\n</model>\n")
+
+    return triangle_count
+
+
+def write_3mf(shape, stream: BinaryIO, options: ExportOptions) -> int:
+    return write_components_3mf(
+        [ComponentPlacements("part", shape, [IDENTITY_LOCATION])], stream, options
+    )
+
+
+EXPORTERS.set_exporter("3mf", write_3mf)
+
+
+def export_components_to_3mf(
+    components: List[ComponentPlacements],
+    name: str,
+    output: OutputTarget = None,
+    options: Optional[ExportOptions] = None,
+) -> str:
+    """
+    Export components and their placements to <name>.3mf, storing each component mesh only once.
+    """
+    output = get_output(output)
+    options = options or ExportOptions()
+
+    fingerprint = None
+    if output.needs_fingerprints():
+        fingerprint = get_components_fingerprint(components, "3mf", options)
+
+    return write_part(
+        lambda stream: write_components_3mf(components, stream, options),
+        name,
+        "3mf",
+        output,
+        fingerprint,
+    )
+
+
+def export_case_to_3mf(
+    result: RenderCaseResult,
+    name: str = "keyboard",
+    output: OutputTarget = None,
+    options: Optional[ExportOptions] = None,
+) -> str:
+    """
+    Export the case with all holders and connectors in place to <name>.3mf. Requires render_case() to be called with
+    render_standard_components=True for the holders to be included (union_standard_components=False is enough and
+    much faster).
+    """
+    return export_components_to_3mf(get_case_components(result), name, output, options)
+
+
+def layout_on_plates(
+    obj: Any,
+    count: int,
+    plate_width: float = 200,
+    plate_depth: float = 200,
+    spacing: float = 5,
+) -> List[List[LocationOrientation]]:
+    """
+    Lay out copies of an object in a grid on build plates, starting at (spacing, spacing) and resting on Z = 0.
+
+    :param obj: The object to lay out, oriented for printing.
+    :param count: The total number of copies.
+    :param plate_width: The usable build plate width (X), in mm.
+    :param plate_depth: The usable build plate depth (Y), in mm.
+    :param spacing: The gap between copies and around the plate edge, in mm.
+    :return: A list of plates, each a list of locations.
+    """
+    if isinstance(obj, Mesh):
+        (xmin, ymin, zmin), (xmax, ymax, _) = get_bounding_box(obj)
+    else:
+        bb = to_shape(obj).BoundingBox()
+        xmin, ymin, zmin, xmax, ymax = bb.xmin, bb.ymin, bb.zmin, bb.xmax, bb.ymax
+    xlen = xmax - xmin
+    ylen = ymax - ymin
+
+    columns = math.floor((plate_width - spacing) / (xlen + spacing))
+    rows = math.floor((plate_depth - spacing) / (ylen + spacing))
+    if columns < 1 or rows < 1:
+        raise Exception(
+            f"Object of size {xlen:.1f} x {ylen:.1f} does not fit a {plate_width} x {plate_depth} plate"
+        )
+
+    per_plate = columns * rows
+
+    plates = []
+    for plate_start in range(0, count, per_plate):
+        locations = []
+        for index in range(min(per_plate, count - plate_start)):
+            row, column = divmod(index, columns)
+            locations.append(
+                LocationOrientation(
+                    x=float(spacing + column * (xlen + spacing) - xmin),
+                    y=float(spacing + row * (ylen + spacing) - ymin),
+                    z=float(-zmin),
+                )
+            )
+        plates.append(locations)
+
+    return plates
+
+
+def export_plates_to_3mf(
+    obj: Any,
+    count: int,
+    name: str,
+    output: OutputTarget = None,
+    plate_width: float = 200,
+    plate_depth: float = 200,
+    spacing: float = 5,
+    options: Optional[ExportOptions] = None,
+) -> List[str]:
+    """
+    Export print-ready build plates with count copies of an object (e.g. switch holders), one 3MF per plate. The mesh
+    is stored once per file and each copy is a build item. Writes <name>.3mf if everything fits on one plate, otherwise
+    <name>_plate_<index>.3mf.
+
+    :return: The file names written to the output.
+    """
+    output = get_output(output)
+    plates = layout_on_plates(obj, count, plate_width, plate_depth, spacing)
+
+    file_names = []
+    for index, locations in enumerate(plates):
+        plate_name = name if len(plates) == 1 else f"{name}_plate_{index}"
+        file_names.append(
+            export_components_to_3mf(
+                [ComponentPlacements(name, obj, locations)], plate_name, output, options
+            )
+        )
+
+    return file_names
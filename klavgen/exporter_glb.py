@@ -0,0 +1,364 @@
+import json
+import math
+import struct
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .classes import LocationOrientation
+from .exporting import (
+    EXPORTERS,
+    ExportOptions,
+    OutputTarget,
+    get_fingerprint,
+    get_output,
+    write_part,
+)
+from .keyboard import RenderKeyboardResult
+from .mesh import get_bounding_box, mesh_from_shape, weld
+from .renderer_case import RenderCaseResult
+from .utils import is_computed, location_to_matrix
+
+# glTF constants
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+
+QUANTIZATION_STEPS = 65535
+
+# glTF is Y-up and klavgen is Z-up: a -90 degree rotation around X, as an (x, y, z, w) quaternion
+Z_UP_TO_Y_UP_ROTATION = [-math.sqrt(0.5), 0.0, 0.0, math.sqrt(0.5)]
+
+# Previews don't need print-quality curves
+PREVIEW_EXPORT_OPTIONS = ExportOptions(tolerance=0.2, angular_tolerance=0.5)
+
+PART_COLORS = {
+    "top": [0.85, 0.85, 0.85, 1.0],
+    "bottom": [0.25, 0.25, 0.28, 1.0],
+    "palm_rests": [0.55, 0.45, 0.35, 1.0],
+    "debug": [1.0, 0.2, 0.2, 1.0],
+    "standard_components": [0.2, 0.5, 0.9, 1.0],
+}
+
+
+class GlbBuilder:
+    """
+    Builds a binary glTF with indexed meshes and positions quantized to 16 bits (KHR_mesh_quantization). Each mesh is
+    quantized to its own bounding box and nodes referencing it carry the dequantization transform. Nodes are in
+    klavgen's Z-up coordinates, and write() puts them under a root node rotating them to glTF's Y-up.
+    """
+
+    def __init__(self, options: Optional[ExportOptions] = None):
+        self.options = options or PREVIEW_EXPORT_OPTIONS
+        self.binary = bytearray()
+        self.buffer_views = []
+        self.accessors = []
+        self.meshes = []
+        self.materials = []
+        self.nodes = []
+        self.scene_nodes = []
+        self.triangle_count = 0
+
+        # Mesh index and dequantization (offset, scale) by id() of the source object, so copies share one mesh
+        self._meshes_by_object: Dict[int, Any] = {}
+        self._objects = []
+        self._material_by_part: Dict[str, int] = {}
+
+    def _add_buffer_view(self, data: bytes, target: int, byte_stride: Optional[int] = None):
+        # All buffer views are 4-byte aligned
+        self.binary.extend(b"\x00" * (-len(self.binary) % 4))
+
+        buffer_view = {"buffer": 0, "byteOffset": len(self.binary), "byteLength": len(data)}
+        buffer_view["target"] = target
+        if byte_stride:
+            buffer_view["byteStride"] = byte_stride
+
+        self.binary.extend(data)
+        self.buffer_views.append(buffer_view)
+
+        return len(self.buffer_views) - 1
+
+    def _add_accessor(self, accessor: Dict[str, Any]) -> int:
+        self.accessors.append(accessor)
+
+        return len(self.accessors) - 1
+
+    def get_material(self, part: str) -> int:
+        if part not in self._material_by_part:
+            self.materials.append(
+                {
+                    "name": part,
+                    "pbrMetallicRoughness": {
+                        "baseColorFactor": PART_COLORS.get(part, [0.7, 0.7, 0.7, 1.0]),
+                        "metallicFactor": 0.0,
+                        "roughnessFactor": 0.8,
+                    },
+                }
+            )
+            self._material_by_part[part] = len(self.materials) - 1
+
+        return self._material_by_part[part]
+
+    def add_mesh(self, obj: Any, name: str, part: str):
+        """
+        Add a mesh for an object, or reuse the existing one if the same object was already added.
+
+        :return: A tuple of (mesh index, dequantization offset, dequantization scale), or None if the object has no
+                 triangles.
+        """
+        if id(obj) in self._meshes_by_object:
+            return self._meshes_by_object[id(obj)]
+
+        welded = weld(mesh_from_shape(obj, self.options))
+
+        mesh = None
+        if len(welded.triangles):
+            mins, maxs = get_bounding_box(welded)
+            scale = np.where(maxs > mins, (maxs - mins) / QUANTIZATION_STEPS, 1.0)
+
+            # 3 quantized coordinates padded to 4, since vertex attributes need to be 4-byte aligned
+            positions = np.zeros((len(welded.vertices), 4), dtype="<u2")
+            positions[:, :3] = np.round((welded.vertices - mins) / scale)
+
+            position_accessor = self._add_accessor(
+                {
+                    "bufferView": self._add_buffer_view(
+                        positions.tobytes(), ARRAY_BUFFER, byte_stride=8
+                    ),
+                    "componentType": UNSIGNED_SHORT,
+                    "count": len(positions),
+                    "type": "VEC3",
+                    "min": positions[:, :3].min(axis=0).tolist(),
+                    "max": positions[:, :3].max(axis=0).tolist(),
+                }
+            )
+
+            use_short_indices = len(positions) <= 65535
+            indices = welded.triangles.astype("<u2" if use_short_indices else "<u4")
+
+            index_accessor = self._add_accessor(
+                {
+                    "bufferView": self._add_buffer_view(indices.tobytes(), ELEMENT_ARRAY_BUFFER),
+                    "componentType": UNSIGNED_SHORT if use_short_indices else UNSIGNED_INT,
+                    "count": indices.size,
+                    "type": "SCALAR",
+                }
+            )
+
+            # No normals, viewers compute flat normals which suit the faceted preview
+            self.meshes.append(
+                {
+                    "name": name,
+                    "primitives": [
+                        {
+                            "attributes": {"POSITION": position_accessor},
+                            "indices": index_accessor,
+                            "material": self.get_material(part),
+                        }
+                    ],
+                }
+            )
+            self.triangle_count += len(welded.triangles)
+
+            mesh = (len(self.meshes) - 1, mins.tolist(), scale.tolist())
+
+        # Keep the object alive so its id() is not reused while building
+        self._objects.append(obj)
+        self._meshes_by_object[id(obj)] = mesh
+
+        return mesh
+
+    def add_node(self, node: Dict[str, Any], parent: Optional[int] = None) -> int:
+        self.nodes.append(node)
+        index = len(self.nodes) - 1
+
+        if parent is None:
+            self.scene_nodes.append(index)
+        else:
+            self.nodes[parent].setdefault("children", []).append(index)
+
+        return index
+
+    def add_object(
+        self,
+        obj: Any,
+        name: str,
+        part: str,
+        parent: Optional[int] = None,
+        location: Optional[LocationOrientation] = None,
+    ) -> Optional[int]:
+        """
+        Add a node rendering an object, optionally placed at a location.
+        """
+        mesh = self.add_mesh(obj, name, part)
+        if not mesh:
+            return None
+
+        mesh_index, offset, scale = mesh
+
+        if not location:
+            node = {"name": name, "mesh": mesh_index, "translation": offset, "scale": scale}
+        else:
+            # Compose the location transform with the dequantization transform
+            m = location_to_matrix(location)
+            columns = [[m[row][col] * scale[col] for row in range(3)] + [0.0] for col in range(3)]
+            translation = [
+                sum(m[row][axis] * offset[axis] for axis in range(3)) + m[row][3]
+                for row in range(3)
+            ]
+            node = {
+                "name": name,
+                "mesh": mesh_index,
+                "matrix": columns[0] + columns[1] + columns[2] + translation + [1.0],
+            }
+
+        return self.add_node(node, parent)
+
+    def write(self, stream: BinaryIO):
+        root_node = {"name": "klavgen", "rotation": Z_UP_TO_Y_UP_ROTATION}
+        if self.scene_nodes:
+            root_node["children"] = self.scene_nodes
+
+        gltf = {
+            "asset": {"version": "2.0", "generator": "klavgen"},
+            "extensionsUsed": ["KHR_mesh_quantization"],
+            "extensionsRequired": ["KHR_mesh_quantization"],
+            "scene": 0,
+            "scenes": [{"nodes": [len(self.nodes)]}],
+            "nodes": self.nodes + [root_node],
+            "meshes": self.meshes,
+            "materials": self.materials,
+            "accessors": self.accessors,
+            "bufferViews": self.buffer_views,
+            "buffers": [{"byteLength": len(self.binary)}],
+        }
+
+        json_chunk = json.dumps(gltf, separators=(",", ":")).encode()
+        json_chunk += b" " * (-len(json_chunk) % 4)
+        binary_chunk = bytes(self.binary) + b"\x00" * (-len(self.binary) % 4)
+
+        total_length = 12 + 8 + len(json_chunk) + 8 + len(binary_chunk)
+
+        stream.write(struct.pack("<4sII", b"glTF", 2, total_length))
+        stream.write(struct.pack("<I4s", len(json_chunk), b"JSON"))
+        stream.write(json_chunk)
+        stream.write(struct.pack("<I4s", len(binary_chunk), b"BIN\x00"))
+        stream.write(binary_chunk)
+
+
+def write_glb(shape, stream: BinaryIO, options: ExportOptions) -> int:
+    builder = GlbBuilder(options)
+    builder.add_object(shape, "part", "part")
+    builder.write(stream)
+
+    return builder.triangle_count
+
+
+EXPORTERS.set_exporter("glb", write_glb)
+
+
+# An object in a case preview: (object, node name, part, name of the group node it's under, location)
+PreviewObject = Tuple[Any, str, str, Optional[str], Optional[LocationOrientation]]
+
+
+def _get_preview_objects(
+    result: Union[RenderCaseResult, RenderKeyboardResult], include_debug: Optional[bool]
+) -> List[PreviewObject]:
+    if isinstance(result, RenderKeyboardResult):
+        result = result.case_result
+
+    objects = [
+        (result.top, "top", "top", None, None),
+        (result.bottom, "bottom", "bottom", None, None),
+    ]
+
+    for index, palm_rest in enumerate(result.palm_rests or []):
+        objects.append((palm_rest, f"palm_rest_{index}", "palm_rests", "palm_rests", None))
+
+    if include_debug is None:
+        include_debug = is_computed(result, "debug")
+
+    if include_debug and result.debug:
+        objects.append((result.debug, "debug", "debug", None, None))
+
+    if result.standard_component_placements:
+        for placements in result.standard_component_placements:
+            for location in placements.locations:
+                objects.append(
+                    (
+                        placements.shape,
+                        placements.name,
+                        "standard_components",
+                        "standard_components",
+                        location,
+                    )
+                )
+    elif result.standard_components:
+        objects.append(
+            (result.standard_components, "standard_components", "standard_components", None, None)
+        )
+
+    return objects
+
+
+def write_case_glb(
+    result: Union[RenderCaseResult, RenderKeyboardResult],
+    stream: BinaryIO,
+    options: ExportOptions,
+    include_debug: Optional[bool] = None,
+) -> int:
+    """
+    Write a GLB preview with one node per part (top, bottom, palm_rests, debug, standard_components). Standard
+    components use ComponentPlacements if available, so repeated holders share one mesh.
+
+    :param include_debug: Whether to add the debug shapes. By default (None), they're only added if they were already
+                          computed (see RenderCaseResult.debug), so the preview doesn't render them.
+    :return: The number of unique triangles written.
+    """
+    builder = GlbBuilder(options)
+    group_nodes = {}
+
+    for obj, name, part, group, location in _get_preview_objects(result, include_debug):
+        if group and group not in group_nodes:
+            group_nodes[group] = builder.add_node({"name": group})
+
+        builder.add_object(obj, name, part, group_nodes.get(group), location)
+
+    builder.write(stream)
+
+    return builder.triangle_count
+
+
+def export_case_to_glb(
+    result: Union[RenderCaseResult, RenderKeyboardResult],
+    name: str = "keyboard_preview",
+    output: OutputTarget = None,
+    options: Optional[ExportOptions] = None,
+    include_debug: Optional[bool] = None,
+) -> str:
+    """
+    Export a compact GLB preview of a RenderCaseResult or RenderKeyboardResult to <name>.glb, for web viewers. Uses
+    PREVIEW_EXPORT_OPTIONS (coarser tessellation) unless options are passed. The debug shapes are only included if
+    already computed, unless include_debug is set (see write_case_glb()).
+    """
+    output = get_output(output)
+    options = options or PREVIEW_EXPORT_OPTIONS
+
+    fingerprint = None
+    if output.needs_fingerprints():
+        objects = _get_preview_objects(result, include_debug)
+        # Repeated objects (e.g. switch holders) are only hashed once, and referenced by index
+        unique_objects = list({id(obj): obj for obj, *_ in objects}.values())
+        indices = {id(obj): index for index, obj in enumerate(unique_objects)}
+        fingerprint = get_fingerprint(
+            unique_objects, "glb", options, [(indices[id(obj)], *rest) for obj, *rest in objects]
+        )
+
+    return write_part(
+        lambda stream: write_case_glb(result, stream, options, include_debug),
+        name,
+        "glb",
+        output,
+        fingerprint,
+    )
@@ -0,0 +1,126 @@
+from typing import BinaryIO, List, Union
+
+import cadquery as cq
+from cadquery.occ_impl.assembly import toCAF
+from OCP.Interface import Interface_Static
+from OCP.STEPCAFControl import STEPCAFControl_Writer
+from OCP.STEPControl import STEPControl_AsIs
+from OCP.StepData import StepData_StepModel
+from OCP.StepRepr import StepRepr_NextAssemblyUsageOccurrence
+from OCP.TCollection import TCollection_HAsciiString
+from OCP.XSControl import XSControl_WorkSession
+
+from .classes import ComponentPlacements
+from .exporting import (
+    OutputTarget,
+    get_components_fingerprint,
+    get_output,
+    set_step_header,
+    to_shape,
+    write_part,
+)
+from .keyboard import RenderKeyboardResult
+from .renderer_case import RenderCaseResult, get_case_components
+from .utils import location_to_cq_location
+
+
+def build_assembly(components: List[ComponentPlacements], name: str = "keyboard") -> cq.Assembly:
+    """
+    Build an assembly with one child per component location. All locations of a component reference the same shape
+    object, so the STEP writer stores its geometry once and each copy is only a placement.
+    """
+    assembly = cq.Assembly(name=name)
+
+    for component in components:
+        if not component.locations:
+            continue
+
+        shape = to_shape(component.shape)
+
+        if len(component.locations) == 1:
+            assembly.add(
+                shape, name=component.name, loc=location_to_cq_location(component.locations[0])
+            )
+            continue
+
+        component_assembly = cq.Assembly(name=component.name)
+        for index, location in enumerate(component.locations):
+            component_assembly.add(
+                shape, name=f"{component.name}_{index}", loc=location_to_cq_location(location)
+            )
+        assembly.add(component_assembly)
+
+    return assembly
+
+
+def _set_assembly_usage_ids(model: StepData_StepModel):
+    # The ids of the assembly usages come from a counter that increases with every export in the session, so number
+    # them in the order they're written instead
+    usage_index = 0
+    for index in range(1, model.NbEntities() + 1):
+        entity = model.Value(index)
+        if isinstance(entity, StepRepr_NextAssemblyUsageOccurrence):
+            usage_index += 1
+            entity.SetId(TCollection_HAsciiString(str(usage_index)))
+
+
+def write_assembly_step(assembly: cq.Assembly, stream: BinaryIO):
+    # Same settings as cq.occ_impl.exporters.assembly.exportAssembly(), but written to a stream
+    _, doc = toCAF(assembly, True)
+
+    session = XSControl_WorkSession()
+    writer = STEPCAFControl_Writer(session, False)
+    writer.SetColorMode(True)
+    writer.SetLayerMode(True)
+    writer.SetNameMode(True)
+
+    Interface_Static.SetIVal_s("write.surfacecurve.mode", 1)
+    Interface_Static.SetIVal_s("write.precision.mode", 0)
+    Interface_Static.SetIVal_s("write.stepcaf.subshapes.name", 1)
+
+    writer.Transfer(doc, STEPControl_AsIs)
+    set_step_header(writer.ChangeWriter().Model(), assembly.name)
+    _set_assembly_usage_ids(writer.ChangeWriter().Model())
+    writer.WriteStream(stream)
+
+
+def export_components_to_step_assembly(
+    components: List[ComponentPlacements],
+    name: str,
+    output: OutputTarget = None,
+) -> str:
+    """
+    Export components and their placements as a STEP assembly to <name>.step, storing each component's geometry once.
+    """
+    output = get_output(output)
+
+    fingerprint = None
+    if output.needs_fingerprints():
+        fingerprint = get_components_fingerprint(components, "step_assembly")
+
+    return write_part(
+        lambda stream: write_assembly_step(build_assembly(components, name), stream),
+        name,
+        "step",
+        output,
+        fingerprint,
+    )
+
+
+def export_case_to_step_assembly(
+    result: Union[RenderCaseResult, RenderKeyboardResult],
+    name: str = "keyboard_assembly",
+    output: OutputTarget = None,
+) -> str:
+    """
+    Export the case parts and all holders and connectors in place as a STEP assembly to <name>.step. Each kind of
+    holder is a single shared definition referenced by one placement per copy, so the file stays small and CAD tools
+    can treat the holders as instances.
+
+    Requires render_case() to be called with render_standard_components=True for the holders to be included.
+    union_standard_components=False is enough and skips the expensive union of all holders.
+    """
+    if isinstance(result, RenderKeyboardResult):
+        result = result.case_result
+
+    return export_components_to_step_assembly(get_case_components(result), name, output)
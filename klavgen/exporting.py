@@ -0,0 +1,675 @@
+import hashlib
+import io
+import json
+import os
+import tarfile
+import tempfile
+import time
+import zipfile
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Union
+
+import cadquery as cq
+from OCP.APIHeaderSection import APIHeaderSection_MakeHeader
+from OCP.BRep import BRep_Builder
+from OCP.Interface import Interface_Static
+from OCP.StepBasic import StepBasic_Product
+from OCP.STEPControl import STEPControl_AsIs, STEPControl_Writer
+from OCP.StepData import StepData_StepModel
+from OCP.TCollection import TCollection_HAsciiString
+from OCP.TopAbs import TopAbs_COMPOUND, TopAbs_COMPSOLID, TopAbs_FACE, TopAbs_SHELL, TopAbs_SOLID
+from OCP.TopoDS import TopoDS_Iterator, TopoDS_Shape
+
+from .profiling import profile_stage
+
+
+@dataclass
+class ExportOptions:
+    # Same defaults as cq.exporters.export()
+    tolerance: float = 0.1
+    angular_tolerance: float = 0.1
+    # Byte-stable output: fixed headers, canonical ordering of solids, faces and triangles, and rounded coordinates
+    deterministic: bool = True
+    # Decimal places mesh coordinates are rounded to in deterministic mode
+    precision: int = 4
+
+
+@dataclass
+class ExportRecord:
+    name: str
+    file_name: str
+    file_format: str
+    size: int
+    sha256: str
+    triangle_count: Optional[int]
+    seconds: float
+    # Hash of the part geometry and export inputs, set when the output needs it (see ExportOutput.needs_fingerprints())
+    fingerprint: Optional[str] = None
+    skipped: bool = False
+
+
+# Exporters return the number of triangles written, or None for formats that are not meshes
+ExporterFunc = Callable[[cq.Shape, BinaryIO, ExportOptions], Optional[int]]
+
+
+class Exporters:
+    def __init__(self):
+        self.exporters: Dict[str, ExporterFunc] = {}
+
+    def set_exporter(self, file_format: str, export_func: ExporterFunc):
+        self.exporters[file_format.lower()] = export_func
+
+    def get_exporter(self, file_format: str) -> ExporterFunc:
+        return self.exporters.get(file_format.lower())
+
+
+EXPORTERS = Exporters()
+
+
+class ExportOutput:
+    """
+    A destination for exported parts. Subclasses provide a binary stream for each file name. Every exported file is
+    recorded in .records.
+
+    Outputs with skip_unchanged = True are asked for a previous record matching a part's fingerprint before it is
+    exported, and the part is neither tessellated nor written if one is returned.
+    """
+
+    skip_unchanged = False
+
+    def __init__(self):
+        self.records: List[ExportRecord] = []
+
+    def open(self, file_name: str) -> BinaryIO:
+        raise NotImplementedError()
+
+    def get_unchanged_record(self, file_name: str, fingerprint: str) -> Optional[ExportRecord]:
+        return None
+
+    def needs_fingerprints(self) -> bool:
+        """
+        Whether parts exported to this output should be fingerprinted (see get_fingerprint()): to skip unchanged parts,
+        or to list the fingerprints in a manifest.
+        """
+        return self.skip_unchanged
+
+    def get_skipped(self) -> List[ExportRecord]:
+        return [record for record in self.records if record.skipped]
+
+    def add_record(self, record: ExportRecord):
+        self.records.append(record)
+
+    def get_manifest(self) -> Dict[str, Any]:
+        return {"parts": [asdict(record) for record in self.records]}
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class DirectoryOutput(ExportOutput):
+    """
+    Writes each part to a file in a directory (the current working directory by default).
+
+    With skip_unchanged, a manifest of part fingerprints is kept next to the files, and parts whose fingerprint and
+    file are unchanged since the last export are skipped, so their files (and modification times) are left untouched.
+
+    :param path: The directory to write to.
+    :param skip_unchanged: Whether to skip parts that are unchanged since the last export. Off by default, so no
+                           manifest is written.
+    :param manifest_name: The file name of the fingerprint manifest in the directory.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, os.PathLike] = ".",
+        skip_unchanged: bool = False,
+        manifest_name: str = ".klavgen_manifest.json",
+    ):
+        super().__init__()
+        self.path = path
+        self.skip_unchanged = skip_unchanged
+        self.manifest_name = manifest_name
+        self._manifest: Optional[Dict[str, Dict[str, Any]]] = None
+
+    @contextmanager
+    def open(self, file_name: str) -> Iterator[BinaryIO]:
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, file_name), "wb") as stream:
+            yield stream
+
+    def _get_manifest(self) -> Dict[str, Dict[str, Any]]:
+        if self._manifest is None:
+            self._manifest = {}
+
+            manifest_path = os.path.join(self.path, self.manifest_name)
+            if os.path.exists(manifest_path):
+                try:
+                    with open(manifest_path) as f:
+                        self._manifest = {part["file_name"]: part for part in json.load(f)["parts"]}
+                except (ValueError, KeyError, TypeError):
+                    print(f"Ignoring invalid export manifest {manifest_path}")
+
+        return self._manifest
+
+    def _save_manifest(self):
+        os.makedirs(self.path, exist_ok=True)
+        manifest_path = os.path.join(self.path, self.manifest_name)
+
+        # Write to a temporary file first, so an interrupted export never leaves a truncated manifest
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump({"parts": list(self._get_manifest().values())}, f, indent=2)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def get_unchanged_record(self, file_name: str, fingerprint: str) -> Optional[ExportRecord]:
+        previous = self._get_manifest().get(file_name)
+        if not previous or previous.get("fingerprint") != fingerprint:
+            return None
+
+        # The file has to still be there with the same contents
+        file_path = os.path.join(self.path, file_name)
+        if not os.path.exists(file_path) or os.path.getsize(file_path) != previous["size"]:
+            return None
+
+        file_hash = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                file_hash.update(chunk)
+
+        if file_hash.hexdigest() != previous["sha256"]:
+            return None
+
+        return ExportRecord(**{**previous, "skipped": True})
+
+    def add_record(self, record: ExportRecord):
+        super().add_record(record)
+
+        if self.skip_unchanged and record.fingerprint and not record.skipped:
+            self._get_manifest()[record.file_name] = asdict(record)
+            self._save_manifest()
+
+    def close(self):
+        if not self.skip_unchanged or not self.records:
+            return
+
+        skipped = self.get_skipped()
+        message = (
+            f"Exported {len(self.records) - len(skipped)} parts, skipped {len(skipped)} unchanged"
+        )
+        if skipped:
+            message += f": {', '.join(record.file_name for record in skipped)}"
+        print(message)
+
+
+class MemoryOutput(ExportOutput):
+    """
+    Keeps each part in memory. Use get_bytes() for a copy or get_view() for a zero-copy memoryview.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.buffers: Dict[str, io.BytesIO] = {}
+
+    @contextmanager
+    def open(self, file_name: str) -> Iterator[BinaryIO]:
+        buffer = io.BytesIO()
+        yield buffer
+        self.buffers[file_name] = buffer
+
+    def file_names(self):
+        return list(self.buffers.keys())
+
+    def get_bytes(self, file_name: str) -> bytes:
+        return self.buffers[file_name].getvalue()
+
+    def get_view(self, file_name: str) -> memoryview:
+        return self.buffers[file_name].getbuffer()
+
+
+class StreamOutput(ExportOutput):
+    """
+    Writes each part to a stream supplied by the caller. The streams are not closed.
+
+    :param stream_factory: A function that takes a file name and returns a writable binary stream.
+    """
+
+    def __init__(self, stream_factory: Callable[[str], BinaryIO]):
+        super().__init__()
+        self.stream_factory = stream_factory
+
+    @contextmanager
+    def open(self, file_name: str) -> Iterator[BinaryIO]:
+        yield self.stream_factory(file_name)
+
+
+class ZipOutput(ExportOutput):
+    """
+    Streams each part into a ZIP archive as soon as it is exported, followed by a manifest.json on close(). Parts are
+    not kept in memory after they are written.
+
+    :param file: A path or a writable binary stream (does not need to be seekable).
+    :param manifest_name: The file name of the manifest in the archive. Set to None to skip the manifest.
+    :param compression: The zipfile compression method.
+    """
+
+    def __init__(
+        self,
+        file: Union[str, os.PathLike, BinaryIO],
+        manifest_name: Optional[str] = "manifest.json",
+        compression: int = zipfile.ZIP_DEFLATED,
+    ):
+        super().__init__()
+        self.manifest_name = manifest_name
+        self.archive = zipfile.ZipFile(file, "w", compression=compression)
+
+    @contextmanager
+    def open(self, file_name: str) -> Iterator[BinaryIO]:
+        with self.archive.open(file_name, "w") as stream:
+            yield stream
+
+    def needs_fingerprints(self) -> bool:
+        return self.manifest_name is not None
+
+    def close(self):
+        if self.archive.fp is None:
+            return
+
+        if self.manifest_name:
+            self.archive.writestr(self.manifest_name, json.dumps(self.get_manifest(), indent=2))
+
+        self.archive.close()
+
+
+class TarOutput(ExportOutput):
+    """
+    Streams each part into a tar archive as soon as it is exported, followed by a manifest.json on close(). Since tar
+    needs the size of each file up front, parts are spooled to a temporary file (in memory when small) and released
+    after they are written.
+
+    :param file: A path or a writable binary stream (does not need to be seekable).
+    :param compression: "", "gz", "bz2" or "xz".
+    :param manifest_name: The file name of the manifest in the archive. Set to None to skip the manifest.
+    """
+
+    def __init__(
+        self,
+        file: Union[str, os.PathLike, BinaryIO],
+        compression: str = "",
+        manifest_name: Optional[str] = "manifest.json",
+    ):
+        super().__init__()
+        self.manifest_name = manifest_name
+
+        if isinstance(file, (str, os.PathLike)):
+            self.archive = tarfile.open(name=file, mode=f"w|{compression}")
+        else:
+            self.archive = tarfile.open(fileobj=file, mode=f"w|{compression}")
+
+        self.closed = False
+
+    def _add_file(self, file_name: str, stream: BinaryIO, size: int):
+        info = tarfile.TarInfo(file_name)
+        info.size = size
+        info.mtime = int(time.time())
+        self.archive.addfile(info, stream)
+
+    @contextmanager
+    def open(self, file_name: str) -> Iterator[BinaryIO]:
+        with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as spool:
+            yield spool
+
+            size = spool.tell()
+            spool.seek(0)
+            self._add_file(file_name, spool, size)
+
+    def needs_fingerprints(self) -> bool:
+        return self.manifest_name is not None
+
+    def close(self):
+        if self.closed:
+            return
+
+        if self.manifest_name:
+            manifest = json.dumps(self.get_manifest(), indent=2).encode()
+            self._add_file(self.manifest_name, io.BytesIO(manifest), len(manifest))
+
+        self.archive.close()
+        self.closed = True
+
+
+OutputTarget = Optional[Union[str, os.PathLike, ExportOutput]]
+
+
+def get_output(output: OutputTarget = None) -> ExportOutput:
+    """
+    Get an ExportOutput, defaulting to the current working directory. Paths ending in .zip, .tar, .tar.gz, .tgz,
+    .tar.bz2 or .tar.xz become archives, all other strings and paths are treated as directories.
+    """
+    if output is None:
+        return DirectoryOutput()
+
+    if isinstance(output, ExportOutput):
+        return output
+
+    path = os.fspath(output)
+    if path.endswith(".zip"):
+        return ZipOutput(path)
+
+    for extension, compression in (
+        (".tar", ""),
+        (".tar.gz", "gz"),
+        (".tgz", "gz"),
+        (".tar.bz2", "bz2"),
+        (".tar.xz", "xz"),
+    ):
+        if path.endswith(extension):
+            return TarOutput(path, compression=compression)
+
+    return DirectoryOutput(path)
+
+
+class _RecordingStream:
+    """
+    Passes writes through to a stream while computing their size and SHA-256.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.size = 0
+        self.hash = hashlib.sha256()
+
+    def write(self, data) -> int:
+        self.stream.write(data)
+        self.hash.update(data)
+        self.size += len(data)
+
+        return len(data)
+
+    def flush(self):
+        if hasattr(self.stream, "flush"):
+            self.stream.flush()
+
+
+def to_shape(obj: Any) -> cq.Shape:
+    """
+    Convert a Workplane, a Shape or a list of Shapes to a single Shape (multiple objects become a compound).
+    """
+    if isinstance(obj, cq.Shape):
+        return obj
+
+    shapes = [o for o in obj if isinstance(o, cq.Shape)]
+
+    if len(shapes) == 1:
+        return shapes[0]
+
+    return cq.Compound.makeCompound(shapes)
+
+
+def export_to_stream(
+    obj: Any, stream: BinaryIO, file_format: str = "stl", options: Optional[ExportOptions] = None
+) -> Optional[int]:
+    """
+    Export a Workplane or Shape to a writable binary stream.
+
+    :param obj: The Workplane or Shape to export.
+    :param stream: The stream to write to.
+    :param file_format: The format name, e.g. "stl" or "step". See EXPORTERS for all registered formats.
+    :param options: Tessellation and format options. Optional.
+    :return: The number of triangles written for mesh formats, otherwise None.
+    """
+    export_func = EXPORTERS.get_exporter(file_format)
+    if not export_func:
+        raise Exception(f"Exporter for format {file_format} not found")
+
+    return export_func(to_shape(obj), stream, options or ExportOptions())
+
+
+def export_to_bytes(
+    obj: Any, file_format: str = "stl", options: Optional[ExportOptions] = None
+) -> bytes:
+    """
+    Export a Workplane or Shape and return the file contents.
+    """
+    stream = io.BytesIO()
+    export_to_stream(obj, stream, file_format, options)
+
+    return stream.getvalue()
+
+
+def _round_coords(values, digits: int = 5):
+    # Adding 0.0 turns -0.0 into 0.0
+    return tuple(round(value, digits) + 0.0 for value in values)
+
+
+def fingerprint_shape(obj: Any) -> str:
+    """
+    Get the SHA-256 of a Workplane or Shape's geometry. Booleans don't always produce faces and edges in the same order
+    or orientation, so the hash is computed over sorted, rounded face and vertex properties rather than the BREP.
+    """
+    shape = to_shape(obj)
+
+    faces = sorted(
+        (face.geomType(), round(face.Area(), 5) + 0.0, _round_coords(face.Center().toTuple()))
+        for face in shape.Faces()
+    )
+    vertices = sorted(_round_coords(vertex.toTuple()) for vertex in shape.Vertices())
+
+    return hashlib.sha256(repr((faces, vertices)).encode()).hexdigest()
+
+
+def get_fingerprint(objs: List[Any], *inputs: Any) -> str:
+    """
+    Get a fingerprint for exporting objects with some inputs (format, options, locations, ...). Inputs are hashed by
+    their repr(), so they should be simple values or dataclasses.
+    """
+    fingerprint = hashlib.sha256()
+    fingerprint.update(repr(inputs).encode())
+    for obj in objs:
+        if hasattr(obj, "get_fingerprint"):
+            # Meshes hash their arrays
+            fingerprint.update(obj.get_fingerprint().encode())
+        else:
+            fingerprint.update(fingerprint_shape(obj).encode())
+
+    return fingerprint.hexdigest()
+
+
+def get_input_fingerprints(**inputs: Any) -> Dict[str, str]:
+    """
+    Fingerprint each input separately, so it's possible to tell which ones changed. Lists of CadQuery objects (e.g.
+    case_extras) are hashed by geometry, everything else by repr().
+    """
+    fingerprints = {}
+    for name, value in inputs.items():
+        if isinstance(value, (list, tuple)) and any(
+            isinstance(item, (cq.Workplane, cq.Shape)) for item in value
+        ):
+            fingerprints[name] = get_fingerprint(list(value))
+        else:
+            fingerprints[name] = get_fingerprint([], value)
+
+    return fingerprints
+
+
+def get_components_fingerprint(components: List[Any], *inputs: Any) -> str:
+    """
+    Get a fingerprint for exporting ComponentPlacements, covering each component's name, locations and geometry.
+    """
+    return get_fingerprint(
+        [component.shape for component in components],
+        [(component.name, component.locations) for component in components],
+        *inputs,
+    )
+
+
+def export_part(
+    obj: Any,
+    name: str,
+    file_format: str = "stl",
+    output: OutputTarget = None,
+    options: Optional[ExportOptions] = None,
+) -> str:
+    """
+    Export a Workplane or Shape as <name>.<file_format> to an output.
+
+    :param obj: The Workplane or Shape to export.
+    :param name: The part name, used as the file name without extension.
+    :param file_format: The format name, e.g. "stl" or "step".
+    :param output: An ExportOutput, or a directory path. Defaults to the current working directory.
+    :param options: Tessellation and format options. Optional.
+    :return: The file name written to the output.
+    """
+    output = get_output(output)
+    options = options or ExportOptions()
+
+    fingerprint = None
+    if output.needs_fingerprints():
+        fingerprint = get_fingerprint([obj], file_format.lower(), options)
+
+    return write_part(
+        lambda stream: export_to_stream(obj, stream, file_format, options),
+        name,
+        file_format,
+        output,
+        fingerprint,
+    )
+
+
+def write_part(
+    write_func: Callable[[BinaryIO], Optional[int]],
+    name: str,
+    file_format: str,
+    output: OutputTarget = None,
+    fingerprint: Optional[str] = None,
+) -> str:
+    """
+    Write <name>.<file_format> to an output with a custom writer function, and record it on the output.
+
+    :param write_func: A function that writes the file to a stream and returns the number of triangles written (or
+                       None).
+    :param name: The part name, used as the file name without extension.
+    :param file_format: The format name, used as the file name extension.
+    :param output: An ExportOutput, or a directory path. Defaults to the current working directory.
+    :param fingerprint: A fingerprint of everything the file depends on (see get_fingerprint()). If the output skips
+                        unchanged parts and has a record with the same fingerprint, write_func is not called.
+    :return: The file name written to the output.
+    """
+    output = get_output(output)
+    file_name = f"{name}.{file_format.lower()}"
+
+    start_time = time.perf_counter()
+
+    if fingerprint and output.skip_unchanged:
+        unchanged_record = output.get_unchanged_record(file_name, fingerprint)
+        if unchanged_record:
+            unchanged_record.seconds = time.perf_counter() - start_time
+            output.add_record(unchanged_record)
+            return file_name
+    with profile_stage(f"export_{file_format.lower()}"), output.open(file_name) as stream:
+        recording_stream = _RecordingStream(stream)
+        triangle_count = write_func(recording_stream)
+
+    output.add_record(
+        ExportRecord(
+            name=name,
+            file_name=file_name,
+            file_format=file_format.lower(),
+            size=recording_stream.size,
+            sha256=recording_stream.hash.hexdigest(),
+            triangle_count=triangle_count,
+            seconds=time.perf_counter() - start_time,
+            fingerprint=fingerprint,
+        )
+    )
+
+    return file_name
+
+
+def _get_shape_sort_key(shape: TopoDS_Shape):
+    cq_shape = cq.Shape.cast(shape)
+    geom_type = cq_shape.geomType() if shape.ShapeType() == TopAbs_FACE else ""
+    bb = cq_shape.BoundingBox()
+
+    return (
+        int(shape.ShapeType()),
+        geom_type,
+        _round_coords(cq_shape.Center().toTuple()),
+        round(cq_shape.Area(), 5) + 0.0,
+        _round_coords((bb.xmin, bb.ymin, bb.zmin, bb.xmax, bb.ymax, bb.zmax)),
+    )
+
+
+def get_canonical_shape(shape: TopoDS_Shape) -> TopoDS_Shape:
+    """
+    Rebuild compounds, solids and shells with their children sorted by geometry, so shapes that only differ in the
+    order booleans produced their faces and solids are written the same way. Faces are shared, not copied.
+    """
+    if shape.ShapeType() not in (TopAbs_COMPOUND, TopAbs_COMPSOLID, TopAbs_SOLID, TopAbs_SHELL):
+        return shape
+
+    children = []
+    iterator = TopoDS_Iterator(shape, False, False)
+    while iterator.More():
+        children.append(get_canonical_shape(iterator.Value()))
+        iterator.Next()
+
+    children.sort(key=_get_shape_sort_key)
+
+    canonical_shape = shape.EmptyCopied()
+    builder = BRep_Builder()
+    for child in children:
+        builder.Add(canonical_shape, child)
+
+    canonical_shape.Closed(shape.Closed())
+    canonical_shape.Orientable(shape.Orientable())
+    canonical_shape.Convex(shape.Convex())
+
+    return canonical_shape
+
+
+def set_step_header(model: StepData_StepModel, name: str = "klavgen"):
+    """
+    Replace the STEP header fields that vary between runs (time stamp, system and author) with fixed values.
+    """
+    header = APIHeaderSection_MakeHeader(model)
+    header.SetName(TCollection_HAsciiString(name))
+    header.SetTimeStamp(TCollection_HAsciiString("1970-01-01T00:00:00"))
+    header.SetAuthorValue(1, TCollection_HAsciiString(""))
+    header.SetOrganizationValue(1, TCollection_HAsciiString(""))
+    header.SetOriginatingSystem(TCollection_HAsciiString("klavgen"))
+    header.SetPreprocessorVersion(TCollection_HAsciiString("klavgen"))
+    header.SetAuthorisation(TCollection_HAsciiString(""))
+
+
+def _set_product_names(model: StepData_StepModel, name: str):
+    # Default product names have a counter that increases with every export in the session
+    for index in range(1, model.NbEntities() + 1):
+        entity = model.Value(index)
+        if isinstance(entity, StepBasic_Product):
+            entity.SetId(TCollection_HAsciiString(name))
+            entity.SetName(TCollection_HAsciiString(name))
+
+
+def write_step(shape: cq.Shape, stream: BinaryIO, options: ExportOptions):
+    # Same settings as cq.Shape.exportStep()
+    writer = STEPControl_Writer()
+    Interface_Static.SetIVal_s("write.surfacecurve.mode", 1)
+    Interface_Static.SetIVal_s("write.precision.mode", 0)
+
+    if options.deterministic:
+        writer.Transfer(get_canonical_shape(shape.wrapped), STEPControl_AsIs)
+        set_step_header(writer.Model())
+        _set_product_names(writer.Model(), "klavgen")
+    else:
+        writer.Transfer(shape.wrapped, STEPControl_AsIs)
+
+    writer.WriteStream(stream)
+
+
+EXPORTERS.set_exporter("step", write_step)
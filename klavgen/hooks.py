@@ -0,0 +1,92 @@
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+# A hook: the class and name of a method, and a function taking the method and returning its replacement
+Hook = Tuple[type, str, Callable[[Callable], Callable]]
+
+_lock = threading.Lock()
+# (class, name) to the method defined before any hook, and the keys and wrap functions of the hooks applied to it, in
+# the order they were installed
+_hooked_methods: Dict[
+    Tuple[type, str], Tuple[Any, List[Tuple[str, Callable[[Callable], Callable]]]]
+] = {}
+# Hook key to the number of install_hooks() calls not yet matched by remove_hooks()
+_users: Dict[str, int] = {}
+
+
+def get_defining_class(cls: type, name: str) -> type:
+    """
+    Get the class in cls's MRO that defines an attribute, e.g. cq.Shape for cq.Solid and "fillet" in CadQuery
+    versions defining it there. Raises AttributeError if no class does.
+    """
+    for klass in cls.__mro__:
+        if name in klass.__dict__:
+            return klass
+
+    raise AttributeError(f"{cls.__name__} has no attribute {name}")
+
+
+def _apply(owner: type, name: str):
+    method, hooks = _hooked_methods[(owner, name)]
+    for _, wrap in hooks:
+        method = wrap(method)
+
+    setattr(owner, name, method)
+
+
+def _remove(key: str):
+    for (owner, name), (original, hooks) in list(_hooked_methods.items()):
+        if not any(hook_key == key for hook_key, _ in hooks):
+            continue
+
+        hooks[:] = [(hook_key, wrap) for hook_key, wrap in hooks if hook_key != key]
+        if hooks:
+            _apply(owner, name)
+        else:
+            setattr(owner, name, original)
+            del _hooked_methods[(owner, name)]
+
+
+def install_hooks(key: str, hooks: List[Hook]):
+    """
+    Replace methods with wrapped versions, under a key. Hooks of different keys on the same method stack, each
+    wrapping the ones installed before it, and removing one rebuilds the others, so they can be installed and removed
+    in any order (e.g. profiling in one thread while planning in another).
+
+    Calls with the same key are counted: the hooks are installed by the first call and removed when remove_hooks() has
+    been called as many times. If a hook fails to install, the ones already installed by the call are removed again.
+    """
+    with _lock:
+        _users[key] = _users.get(key, 0) + 1
+        if _users[key] > 1:
+            return
+
+        try:
+            for owner, name, wrap in hooks:
+                if (owner, name) not in _hooked_methods:
+                    _hooked_methods[(owner, name)] = (owner.__dict__[name], [])
+                _hooked_methods[(owner, name)][1].append((key, wrap))
+                _apply(owner, name)
+        except BaseException:
+            _remove(key)
+            del _users[key]
+            raise
+
+
+def remove_hooks(key: str, all_users: bool = False):
+    """
+    Undo an install_hooks() call with the key, removing the hooks if it was the last one. With all_users, remove the
+    hooks right away, e.g. in a forked worker process that inherited them from threads that don't exist there.
+    """
+    with _lock:
+        users = 0 if all_users else _users.get(key, 0) - 1
+        if users > 0:
+            _users[key] = users
+            return
+
+        _users.pop(key, None)
+        _remove(key)
+
+
+def is_hooked(key: str) -> bool:
+    return _users.get(key, 0) > 0
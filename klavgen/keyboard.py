@@ -1,13 +1,18 @@
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
 
 from .classes import Controller, Cut, Key, PalmRest, Patch, ScrewHole, Text, TrrsJack
 from .config import Config
-from .renderer_case import RenderCaseResult, export_case_to_stl, render_case
-from .renderer_connector import export_connector_to_stl, render_connector
-from .renderer_controller import export_controller_holder_to_stl, render_controller_holder
-from .renderer_switch_holder import export_switch_holder_to_stl, render_switch_holder
-from .renderer_trrs_jack import export_trrs_jack_holder_to_stl, render_trrs_jack_holder
+from .exporting import ExportOptions, ExportOutput, OutputTarget, get_output
+from .mesh import export_mesh
+from .mesh_transfer import collect_shared_meshes, free_shared_meshes, submit_mesh_renders
+from .profiling import RenderProfile, profile_stage, profiling
+from .renderer_case import RenderCaseResult, Retain, export_case, render_case
+from .renderer_connector import export_connector, render_connector
+from .renderer_controller import export_controller_holder, render_controller_holder
+from .renderer_switch_holder import export_switch_holder, render_switch_holder
+from .renderer_trrs_jack import export_trrs_jack_holder, render_trrs_jack_holder
 from .rendering import Renderable
 
 
@@ -22,6 +27,21 @@ class RenderKeyboardResult:
     trrs_jack_holder: Optional[Any] = None
     separate_components: Optional[Dict[str, Any]] = None
     palm_rests: Optional[List[Any]] = None
+    profile: Optional[RenderProfile] = None
+
+
+def _render_holder(name: str, config: Config):
+    # Module-level, so it can be pickled for worker processes
+    if name == "switch_holder":
+        return render_switch_holder(config).switch_holder
+    elif name == "controller_holder":
+        return render_controller_holder(config)
+    elif name == "trrs_jack_holder":
+        return render_trrs_jack_holder(config.trrs_jack_config)
+    elif name == "connector":
+        return render_connector(config)
+
+    raise Exception(f"Unknown holder {name}")
 
 
 def render_and_save_keyboard(
@@ -39,9 +59,18 @@ def render_and_save_keyboard(
     render_standard_components: bool = False,
     result: Optional[RenderCaseResult] = None,
     config: Optional[Config] = None,
+    union_standard_components: bool = True,
+    output: OutputTarget = None,
+    file_format: str = "stl",
+    mesh_workers: int = 0,
+    retain: Retain = Retain.ALL,
+    profile: bool = False,
+    trace: bool = False,
+    attribute: bool = False,
+    memory: bool = False,
 ) -> RenderKeyboardResult:
     """
-    The core method that renders and saves as STL files all keyboard components.
+    The core method that renders and saves all keyboard components, as STL files by default.
 
     :param keys: A list of Key objects defining the key positions. Required.
     :param screw_holes: A list of ScrewHole objects defining the screw hole positions. Optional.
@@ -61,68 +90,200 @@ def render_and_save_keyboard(
                    way if the code crashes, you can inspect all the completed steps. Most useful to troubleshoot issues
                    with the shell step and fillets.
     :param config: Pass a custom Config object to override the keyboard configuration.
+    :param union_standard_components: A boolean defining whether to union all standard components into
+                                      RenderCaseResult.standard_components, see render_case().
+    :param output: Where to save the files: a directory path, an archive path (.zip, .tar, .tar.gz) or an ExportOutput
+                   (e.g. MemoryOutput to keep the files in memory). Archives are streamed as each part finishes and
+                   include a manifest.json. Defaults to the current working directory.
+    :param file_format: The file format to save in, e.g. "stl" or "step". Defaults to "stl".
+    :param mesh_workers: When above 0 and saving STL files, the switch, controller and TRRS jack holders and the
+                         connector are rendered and tessellated in this many worker processes while the case renders,
+                         and passed back through shared memory. Their RenderKeyboardResult values are then Mesh objects
+                         instead of CadQuery objects.
+    :param retain: Which intermediate shapes to keep on RenderKeyboardResult.case_result, see render_case().
+    :param profile: A boolean defining whether to record the time and CadQuery operations of each stage (rendering the
+                    case and holders, exporting) in RenderKeyboardResult.profile, see render_case().
+    :param trace: A boolean defining whether to also record a timeline of every stage, CadQuery operation, export and
+                  tessellation, including those in mesh_workers, to save with RenderKeyboardResult.profile.write_trace().
+                  Implies profile.
+    :param attribute: A boolean defining whether to also attribute the time of every CadQuery operation to the inputs
+                      involved, see render_case(). Implies profile.
+    :param memory: A boolean defining whether to also record the RSS before and after each stage, its peak RSS and the
+                   Python heap, see render_case(). Worker processes are not included. Implies profile.
     :return: A RenderKeyboardResult object with all components of the keyboard
     """
+    with profiling(profile, trace, attribute, memory) as render_profile:
+        with profile_stage("render_and_save_keyboard"):
+            keyboard_result = _render_and_save_keyboard(
+                keys=keys,
+                screw_holes=screw_holes,
+                controller=controller,
+                trrs_jack=trrs_jack,
+                components=components,
+                case_extras=case_extras,
+                patches=patches,
+                cuts=cuts,
+                palm_rests=palm_rests,
+                texts=texts,
+                debug=debug,
+                render_standard_components=render_standard_components,
+                result=result,
+                config=config,
+                union_standard_components=union_standard_components,
+                output=output,
+                file_format=file_format,
+                mesh_workers=mesh_workers,
+                retain=retain,
+                trace=trace,
+            )
+
+    keyboard_result.profile = render_profile
+
+    return keyboard_result
+
+
+def _render_and_save_keyboard(
+    keys: List[Key],
+    screw_holes: Optional[List[ScrewHole]],
+    controller: Optional[Controller],
+    trrs_jack: Optional[TrrsJack],
+    components: Optional[List[Renderable]],
+    case_extras: Optional[List[Any]],
+    patches: Optional[List[Patch]],
+    cuts: Optional[List[Cut]],
+    palm_rests: Optional[List[PalmRest]],
+    texts: Optional[List[Text]],
+    debug: bool,
+    render_standard_components: bool,
+    result: Optional[RenderCaseResult],
+    config: Optional[Config],
+    union_standard_components: bool,
+    output: OutputTarget,
+    file_format: str,
+    mesh_workers: int,
+    retain: Retain,
+    trace: bool,
+) -> RenderKeyboardResult:
     if not config:
         config = Config()
 
-    case_result = render_case(
-        keys=keys,
-        screw_holes=screw_holes,
-        controller=controller,
-        trrs_jack=trrs_jack,
-        components=components,
-        patches=patches,
-        cuts=cuts,
-        case_extras=case_extras,
-        palm_rests=palm_rests,
-        texts=texts,
-        debug=debug,
-        render_standard_components=render_standard_components,
-        result=result,
-        config=config,
-    )
-    export_case_to_stl(case_result)
-
-    switch_holder = None
-    if config.case_config.use_switch_holders:
-        switch_holder_result = render_switch_holder(config)
-        export_switch_holder_to_stl(switch_holder_result)
-        switch_holder = switch_holder_result.switch_holder
-
-    controller_holder = None
-    if controller:
-        controller_holder = render_controller_holder(config)
-        export_controller_holder_to_stl(controller_holder)
-
-    trrs_jack_holder = None
-    if trrs_jack:
-        trrs_jack_holder = render_trrs_jack_holder(config.trrs_jack_config)
-        export_trrs_jack_holder_to_stl(trrs_jack_holder)
-
-    palm_rests = None
-    connector = None
-    if case_result.palm_rests:
-        connector = render_connector(config)
-        palm_rests = case_result.palm_rests
-
-        export_connector_to_stl(connector)
-
-    rendered_components = None
-    if case_result.separate_components:
-        rendered_components = {}
-        for separate_component in case_result.separate_components:
-            rendered_component = separate_component.render_and_export_to_stl()
-            rendered_components[separate_component.name] = rendered_component
-
-    return RenderKeyboardResult(
-        case_result=case_result,
-        top=case_result.top,
-        bottom=case_result.bottom,
-        switch_holder=switch_holder,
-        connector=connector,
-        controller_holder=controller_holder,
-        trrs_jack_holder=trrs_jack_holder,
-        separate_components=rendered_components,
-        palm_rests=palm_rests,
-    )
+    # Close outputs we create (e.g. archives from a path), but leave ones passed by the caller open
+    owns_output = not isinstance(output, ExportOutput)
+    output = get_output(output)
+
+    try:
+        # The same options the holders rendered here are exported with, so worker meshes export to the same files
+        mesh_export_options = ExportOptions()
+
+        executor = None
+        mesh_futures = {}
+        if mesh_workers > 0 and file_format.lower() == "stl":
+            names = []
+            if config.case_config.use_switch_holders:
+                names.append("switch_holder")
+            if controller:
+                names.append("controller_holder")
+            if trrs_jack:
+                names.append("trrs_jack_holder")
+            if palm_rests:
+                names.append("connector")
+
+            executor = ProcessPoolExecutor(max_workers=mesh_workers)
+            mesh_futures = submit_mesh_renders(
+                executor,
+                {name: (_render_holder, (name, config)) for name in names},
+                mesh_export_options,
+                trace=trace,
+            )
+
+        try:
+            case_result = render_case(
+                keys=keys,
+                screw_holes=screw_holes,
+                controller=controller,
+                trrs_jack=trrs_jack,
+                components=components,
+                patches=patches,
+                cuts=cuts,
+                case_extras=case_extras,
+                palm_rests=palm_rests,
+                texts=texts,
+                debug=debug,
+                render_standard_components=render_standard_components,
+                result=result,
+                config=config,
+                union_standard_components=union_standard_components,
+                retain=retain,
+            )
+            with profile_stage("export_case"):
+                export_case(case_result, file_format, output)
+
+            with profile_stage("collect_worker_meshes"):
+                shared_meshes = collect_shared_meshes(mesh_futures)
+        except BaseException:
+            free_shared_meshes(mesh_futures)
+            raise
+        finally:
+            if executor:
+                executor.shutdown()
+
+        # Holders rendered in workers: export straight from shared memory, then keep a copy and free the block
+        meshes = {}
+        try:
+            for name, shared_mesh in shared_meshes.items():
+                with shared_mesh:
+                    if name != "connector" or case_result.palm_rests:
+                        export_mesh(shared_mesh.mesh, name, output, mesh_export_options)
+                    meshes[name] = shared_mesh.copy()
+        finally:
+            # If an export failed, the blocks after it still have to be freed
+            for shared_mesh in shared_meshes.values():
+                shared_mesh.close()
+
+        switch_holder = meshes.get("switch_holder")
+        if config.case_config.use_switch_holders and switch_holder is None:
+            switch_holder_result = render_switch_holder(config)
+            export_switch_holder(switch_holder_result, file_format, output)
+            switch_holder = switch_holder_result.switch_holder
+
+        controller_holder = meshes.get("controller_holder")
+        if controller and controller_holder is None:
+            controller_holder = render_controller_holder(config)
+            export_controller_holder(controller_holder, file_format, output)
+
+        trrs_jack_holder = meshes.get("trrs_jack_holder")
+        if trrs_jack and trrs_jack_holder is None:
+            trrs_jack_holder = render_trrs_jack_holder(config.trrs_jack_config)
+            export_trrs_jack_holder(trrs_jack_holder, file_format, output)
+
+        palm_rests = None
+        connector = None
+        if case_result.palm_rests:
+            palm_rests = case_result.palm_rests
+
+            connector = meshes.get("connector")
+            if connector is None:
+                connector = render_connector(config)
+                export_connector(connector, file_format, output)
+
+        rendered_components = None
+        if case_result.separate_components:
+            rendered_components = {}
+            for separate_component in case_result.separate_components:
+                rendered_component = separate_component.render_and_export(file_format, output)
+                rendered_components[separate_component.name] = rendered_component
+
+        return RenderKeyboardResult(
+            case_result=case_result,
+            top=case_result.top,
+            bottom=case_result.bottom,
+            switch_holder=switch_holder,
+            connector=connector,
+            controller_holder=controller_holder,
+            trrs_jack_holder=trrs_jack_holder,
+            separate_components=rendered_components,
+            palm_rests=palm_rests,
+        )
+    finally:
+        if owns_output:
+            output.close()
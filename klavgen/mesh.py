@@ -0,0 +1,380 @@
+import hashlib
+import struct
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Optional, Tuple
+
+import numpy as np
+from OCP.BRep import BRep_Tool
+from OCP.TopAbs import TopAbs_REVERSED
+from OCP.TopLoc import TopLoc_Location
+
+from .classes import LocationOrientation
+from .exporting import (
+    EXPORTERS,
+    ExportOptions,
+    OutputTarget,
+    get_fingerprint,
+    get_output,
+    to_shape,
+    write_part,
+)
+from .profiling import profiled
+from .utils import location_to_matrix
+
+
+@dataclass
+class Mesh:
+    # float64 array of shape (vertex count, 3)
+    vertices: np.ndarray
+    # int64 array of shape (triangle count, 3), counter-clockwise when seen from outside
+    triangles: np.ndarray
+
+    def get_fingerprint(self) -> str:
+        fingerprint = hashlib.sha256()
+        fingerprint.update(np.ascontiguousarray(self.vertices, dtype="<f8").tobytes())
+        fingerprint.update(np.ascontiguousarray(self.triangles, dtype="<i8").tobytes())
+
+        return fingerprint.hexdigest()
+
+
+def _get_transform_matrix(location: TopLoc_Location) -> np.ndarray:
+    trsf = location.Transformation()
+
+    return np.array([[trsf.Value(row, col) for col in range(1, 5)] for row in range(1, 4)])
+
+
+@profiled("tessellate")
+def mesh_from_shape(obj: Any, options: Optional[ExportOptions] = None) -> Mesh:
+    """
+    Tessellate a Workplane or Shape and read the OCCT triangulation of every face into NumPy arrays. Face vertices are
+    not merged (see weld()), matching cq.Shape.tessellate().
+
+    :param obj: The Workplane or Shape to tessellate.
+    :param options: The tessellation tolerances. Optional.
+    :return: A Mesh.
+    """
+    options = options or ExportOptions()
+    shape = to_shape(obj)
+    shape.mesh(options.tolerance, options.angular_tolerance)
+
+    vertex_arrays = []
+    triangle_arrays = []
+    offset = 0
+
+    for face in shape.Faces():
+        location = TopLoc_Location()
+        poly = BRep_Tool.Triangulation_s(face.wrapped, location)
+        if poly is None:
+            continue
+
+        node_count = poly.NbNodes()
+        coords = []
+        for index in range(1, node_count + 1):
+            node = poly.Node(index)
+            coords.extend((node.X(), node.Y(), node.Z()))
+
+        vertices = np.array(coords).reshape(-1, 3)
+        if not location.IsIdentity():
+            matrix = _get_transform_matrix(location)
+            vertices = vertices @ matrix[:, :3].T + matrix[:, 3]
+
+        indices = []
+        for triangle in poly.Triangles():
+            indices.extend((triangle.Value(1), triangle.Value(2), triangle.Value(3)))
+
+        triangles = np.array(indices, dtype=np.int64).reshape(-1, 3) + (offset - 1)
+        if face.wrapped.Orientation() == TopAbs_REVERSED:
+            triangles = triangles[:, ::-1]
+
+        vertex_arrays.append(vertices)
+        triangle_arrays.append(triangles)
+        offset += node_count
+
+    if not vertex_arrays:
+        return Mesh(np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64))
+
+    return Mesh(
+        np.concatenate(vertex_arrays), np.ascontiguousarray(np.concatenate(triangle_arrays))
+    )
+
+
+def weld(mesh: Mesh, precision: int = 4) -> Mesh:
+    """
+    Merge vertices that are equal when rounded to precision decimal places, and drop triangles that become
+    degenerate. Vertices are sorted, so the result doesn't depend on the face order.
+    """
+    rounded = np.round(mesh.vertices, precision) + 0.0
+    vertices, inverse = np.unique(rounded, axis=0, return_inverse=True)
+    triangles = inverse.reshape(-1)[mesh.triangles]
+
+    degenerate = (
+        (triangles[:, 0] == triangles[:, 1])
+        | (triangles[:, 1] == triangles[:, 2])
+        | (triangles[:, 0] == triangles[:, 2])
+    )
+
+    return Mesh(vertices, triangles[~degenerate])
+
+
+def get_triangle_corners(mesh: Mesh) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Get the first, second and third vertex of every triangle, each as an array of shape (triangle count, 3).
+    """
+    corners = mesh.vertices[mesh.triangles]
+
+    return corners[:, 0], corners[:, 1], corners[:, 2]
+
+
+def _get_unit_normals(v1: np.ndarray, v2: np.ndarray, v3: np.ndarray) -> np.ndarray:
+    normals = np.cross(v2 - v1, v3 - v1)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+
+    return np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+
+def get_triangle_normals(mesh: Mesh) -> np.ndarray:
+    """
+    Get the unit normal of every triangle. Degenerate triangles get a zero normal.
+    """
+    return _get_unit_normals(*get_triangle_corners(mesh))
+
+
+def get_vertex_normals(mesh: Mesh) -> np.ndarray:
+    """
+    Get the unit normal of every vertex, averaged over the adjacent triangles weighted by their area. Only smooth on
+    welded meshes.
+    """
+    v1, v2, v3 = get_triangle_corners(mesh)
+    # Unnormalized cross products are weighted by twice the triangle area
+    face_normals = np.cross(v2 - v1, v3 - v1)
+
+    normals = np.zeros_like(mesh.vertices)
+    for corner in range(3):
+        np.add.at(normals, mesh.triangles[:, corner], face_normals)
+
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+
+    return np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+
+def get_bounding_box(mesh: Mesh) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the (min, max) corners of the mesh bounding box.
+    """
+    return mesh.vertices.min(axis=0), mesh.vertices.max(axis=0)
+
+
+def get_surface_area(mesh: Mesh) -> float:
+    v1, v2, v3 = get_triangle_corners(mesh)
+
+    return float(np.linalg.norm(np.cross(v2 - v1, v3 - v1), axis=1).sum() / 2)
+
+
+def get_volume(mesh: Mesh) -> float:
+    """
+    Get the enclosed volume, as the sum of signed tetrahedra to the origin. Only meaningful for closed meshes.
+    """
+    v1, v2, v3 = get_triangle_corners(mesh)
+
+    return float(np.einsum("ij,ij->i", v1, np.cross(v2, v3)).sum() / 6)
+
+
+def transform(mesh: Mesh, matrix: Any) -> Mesh:
+    """
+    Apply an affine transform, given as a 3x4 or 4x4 matrix. Triangles are flipped if the transform mirrors, so they
+    still face outwards.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    rotation = matrix[:3, :3]
+
+    vertices = mesh.vertices @ rotation.T + matrix[:3, 3]
+    triangles = mesh.triangles[:, ::-1] if np.linalg.det(rotation) < 0 else mesh.triangles
+
+    return Mesh(vertices, np.ascontiguousarray(triangles))
+
+
+def position_mesh(mesh: Mesh, lr: LocationOrientation) -> Mesh:
+    """
+    Move and rotate a mesh the same way position() moves a Workplane.
+    """
+    return transform(mesh, location_to_matrix(lr))
+
+
+def mirror(mesh: Mesh, axis: int = 0, center: float = 0) -> Mesh:
+    """
+    Mirror a mesh across the plane perpendicular to an axis (0 for X, 1 for Y, 2 for Z) at a center coordinate, e.g.
+    to get the other half of a split keyboard.
+    """
+    matrix = np.eye(3, 4)
+    matrix[axis, axis] = -1
+    matrix[axis, 3] = 2 * center
+
+    return transform(mesh, matrix)
+
+
+def _rotate_to_smallest(triangles: np.ndarray) -> np.ndarray:
+    # Start every triangle at its smallest vertex, keeping the winding
+    order = (np.argmin(triangles, axis=1)[:, np.newaxis] + np.arange(3)) % 3
+
+    return np.take_along_axis(triangles, order, axis=1)
+
+
+def _get_angles(at: np.ndarray, p1: np.ndarray, p2: np.ndarray) -> np.ndarray:
+    u = p1 - at
+    v = p2 - at
+    lengths = np.sqrt(np.einsum("ij,ij->i", u, u) * np.einsum("ij,ij->i", v, v))
+
+    return np.arccos(np.clip(np.einsum("ij,ij->i", u, v) / lengths, -1.0, 1.0))
+
+
+def _get_ambiguous_diagonals(
+    vertices: np.ndarray, triangles: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find the diagonals shared by two coplanar triangles (a, b, c) and (b, a, d) that form a cocircular quad, where
+    either diagonal is a valid Delaunay triangulation and the mesher picks one depending on face orientation.
+
+    :return: The a, b, c and d vertex indices of each, and the indices of the two triangles, in edge order.
+    """
+    # Every directed edge (a, b) with the opposite vertex c, and the triangle it belongs to
+    a = triangles.reshape(-1)
+    b = np.roll(triangles, -1, axis=1).reshape(-1)
+    c = np.roll(triangles, -2, axis=1).reshape(-1)
+    owners = np.repeat(np.arange(len(triangles)), 3)
+
+    # The reverse edge (b, a), in the neighbouring triangle
+    keys = a * len(vertices) + b
+    reverse_keys = b * len(vertices) + a
+    order = np.argsort(keys, kind="stable")
+    reverse_edges = order[np.searchsorted(keys[order], reverse_keys).clip(max=len(keys) - 1)]
+    d = c[reverse_edges]
+    others = owners[reverse_edges]
+
+    # Each quad is seen from both triangles, so only the one with the lower index is kept
+    edges = np.nonzero((keys[reverse_edges] == reverse_keys) & (owners < others))[0]
+
+    pa, pb, pc, pd = (vertices[corner[edges]] for corner in (a, b, c, d))
+    n1 = _get_unit_normals(pa, pb, pc)
+    n2 = _get_unit_normals(pb, pa, pd)
+    coplanar = np.einsum("ij,ij->i", n1, n2) >= 1 - 1e-6
+    edges = edges[coplanar]
+
+    angles = _get_angles(pc[coplanar], pa[coplanar], pb[coplanar]) + _get_angles(
+        pd[coplanar], pb[coplanar], pa[coplanar]
+    )
+    edges = edges[np.abs(angles - np.pi) < 1e-3]
+
+    return a[edges], b[edges], c[edges], d[edges], owners[edges], others[edges]
+
+
+def _flip_ambiguous_diagonals(vertices: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """
+    Flip every ambiguous diagonal (see _get_ambiguous_diagonals()) so it touches the smallest vertex of its quad, which
+    makes e.g. rectangles and polygons on circles always split the same way.
+
+    Flips are repeated until none is left, which always ends since every flip lowers the smallest vertex of an edge.
+    Large polygons (e.g. cylinder caps) take many passes, so after the first one only the triangles of cocircular
+    regions are looked at: the others never change, and flips keep the regions' triangles ambiguous with each other.
+    """
+    triangles = triangles.copy()
+    regions = np.unique(np.concatenate(_get_ambiguous_diagonals(vertices, triangles)[4:]))
+    region_triangles = triangles[regions]
+
+    while True:
+        a, b, c, d, owners, others = _get_ambiguous_diagonals(vertices, region_triangles)
+        flippable = np.nonzero(np.minimum(c, d) < np.minimum(a, b))[0]
+
+        # Triangles can only take part in one flip per pass: the first of theirs, if it's also the first of the other
+        # triangle
+        flip_indices = np.arange(len(flippable))
+        first_flips = np.full(len(region_triangles), len(flippable))
+        np.minimum.at(first_flips, owners[flippable], flip_indices)
+        np.minimum.at(first_flips, others[flippable], flip_indices)
+        flips = flippable[
+            (first_flips[owners[flippable]] == flip_indices)
+            & (first_flips[others[flippable]] == flip_indices)
+        ]
+        if not len(flips):
+            break
+
+        a, b, c, d = a[flips], b[flips], c[flips], d[flips]
+        region_triangles[owners[flips]] = np.stack([a, d, c], axis=1)
+        region_triangles[others[flips]] = np.stack([d, b, c], axis=1)
+
+    triangles[regions] = region_triangles
+
+    return triangles
+
+
+def canonicalize(mesh: Mesh, precision: int = 4) -> Mesh:
+    """
+    Get a mesh in a canonical form: welded at precision decimal places (see weld()), with ambiguous diagonals flipped
+    the same way, each triangle starting at its smallest vertex (keeping the winding) and the triangles sorted without
+    duplicates. The result only depends on the surface, not on the order or orientation the faces were tessellated in.
+    """
+    mesh = weld(mesh, precision)
+    # weld() sorts the vertices, so index order is coordinate order
+    triangles = np.unique(_rotate_to_smallest(mesh.triangles), axis=0)
+    triangles = _flip_ambiguous_diagonals(mesh.vertices, triangles)
+
+    return Mesh(mesh.vertices, np.unique(_rotate_to_smallest(triangles), axis=0))
+
+
+STL_FACET_DTYPE = np.dtype(
+    [("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attribute", "<u2")]
+)
+
+
+def write_mesh_stl(mesh: Mesh, stream: BinaryIO, options: Optional[ExportOptions] = None) -> int:
+    """
+    Write a binary STL from a Mesh, without re-tessellating. Works directly on read-only memory-mapped meshes.
+
+    In deterministic mode (the default, see ExportOptions), the mesh is canonicalized first (see canonicalize()), so
+    the file is the same as exporting the shape the mesh was tessellated from. Otherwise it's written as-is.
+
+    :return: The number of triangles written.
+    """
+    options = options or ExportOptions()
+    if options.deterministic:
+        mesh = canonicalize(mesh, options.precision)
+
+    facets = np.empty(len(mesh.triangles), dtype=STL_FACET_DTYPE)
+    facets["normal"] = get_triangle_normals(mesh)
+    facets["vertices"] = mesh.vertices[mesh.triangles]
+    facets["attribute"] = 0
+
+    # Fixed header, so identical meshes produce identical files
+    stream.write(b"klavgen".ljust(80, b" "))
+    stream.write(struct.pack("<I", len(facets)))
+    stream.write(facets.tobytes())
+
+    return len(facets)
+
+
+def write_stl(shape: Any, stream: BinaryIO, options: ExportOptions) -> int:
+    return write_mesh_stl(mesh_from_shape(shape, options), stream, options)
+
+
+EXPORTERS.set_exporter("stl", write_stl)
+
+
+def export_mesh(
+    mesh: Mesh,
+    name: str,
+    output: OutputTarget = None,
+    options: Optional[ExportOptions] = None,
+) -> str:
+    """
+    Export a Mesh as <name>.stl to an output.
+
+    :param options: The STL options, see write_mesh_stl(). The tolerances don't apply, since the mesh is already
+                    tessellated. Optional.
+    :return: The file name written to the output.
+    """
+    options = options or ExportOptions()
+    output = get_output(output)
+    fingerprint = get_fingerprint([mesh], "stl", options) if output.needs_fingerprints() else None
+
+    return write_part(
+        lambda stream: write_mesh_stl(mesh, stream, options), name, "stl", output, fingerprint
+    )
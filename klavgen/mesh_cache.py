@@ -0,0 +1,93 @@
+import os
+import tempfile
+from typing import Any, Optional, Union
+
+import numpy as np
+
+from .exporting import ExportOptions, get_fingerprint
+from .mesh import Mesh, mesh_from_shape, weld
+
+
+class MeshCache:
+    """
+    A directory of tessellated meshes, stored as <key>.vertices.npy and <key>.triangles.npy. Meshes are memory-mapped
+    read-only, so worker processes sharing the directory share one copy of each mesh in the OS page cache instead of
+    each keeping its own.
+
+    Files are written to a temporary name and renamed, so workers can fill the cache concurrently.
+
+    :param path: The cache directory. Created if missing.
+    :param options: The tessellation tolerances. Part of every key, so caches with different options don't mix.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], options: Optional[ExportOptions] = None):
+        self.path = path
+        self.options = options or ExportOptions()
+        os.makedirs(path, exist_ok=True)
+
+    def get_key(self, obj: Any, name: Optional[str] = None) -> str:
+        """
+        Get the cache key of an object. If a name is given, it's used instead of fingerprinting the geometry, which
+        is faster but relies on the name changing whenever the part does.
+        """
+        if name:
+            return get_fingerprint([], name, self.options)
+
+        return get_fingerprint([obj], self.options)
+
+    def _get_paths(self, key: str):
+        return (
+            os.path.join(self.path, f"{key}.vertices.npy"),
+            os.path.join(self.path, f"{key}.triangles.npy"),
+        )
+
+    def get(self, key: str) -> Optional[Mesh]:
+        """
+        Get a memory-mapped, read-only mesh, or None if it's not in the cache.
+        """
+        vertices_path, triangles_path = self._get_paths(key)
+        if not os.path.exists(vertices_path) or not os.path.exists(triangles_path):
+            return None
+
+        return Mesh(
+            np.load(vertices_path, mmap_mode="r"),
+            np.load(triangles_path, mmap_mode="r"),
+        )
+
+    def _save_array(self, array: np.ndarray, path: str):
+        handle, temp_path = tempfile.mkstemp(dir=self.path, suffix=".npy.tmp")
+        try:
+            with os.fdopen(handle, "wb") as f:
+                np.save(f, array)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def put(self, key: str, mesh: Mesh) -> Mesh:
+        """
+        Store a mesh and return its memory-mapped copy.
+        """
+        vertices_path, triangles_path = self._get_paths(key)
+
+        # get() only returns a mesh once both files exist
+        self._save_array(np.ascontiguousarray(mesh.vertices, dtype=np.float64), vertices_path)
+        self._save_array(np.ascontiguousarray(mesh.triangles, dtype=np.int64), triangles_path)
+
+        return self.get(key)
+
+    def get_mesh(self, obj: Any, name: Optional[str] = None) -> Mesh:
+        """
+        Get the welded mesh of a Workplane or Shape, tessellating and storing it only if it's not in the cache yet.
+
+        :param obj: The Workplane or Shape.
+        :param name: A name to use as the key instead of the geometry fingerprint (see get_key()). Optional.
+        :return: A memory-mapped, read-only Mesh.
+        """
+        key = self.get_key(obj, name)
+
+        mesh = self.get(key)
+        if mesh is None:
+            mesh = self.put(key, weld(mesh_from_shape(obj, self.options)))
+
+        return mesh
@@ -0,0 +1,174 @@
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .exporting import ExportOptions
+from .mesh import Mesh, mesh_from_shape, weld
+from .profiling import add_trace_events, profile_stage, worker_profiling
+
+
+@dataclass
+class SharedMeshHandle:
+    # The name of the multiprocessing.shared_memory block holding the vertex array followed by the triangle array
+    shm_name: str
+    vertex_count: int
+    triangle_count: int
+    # Trace events recorded in the worker process, if tracing
+    trace_events: Optional[List[Dict[str, Any]]] = None
+
+
+def _get_arrays(buffer, vertex_count: int, triangle_count: int) -> Tuple[np.ndarray, np.ndarray]:
+    vertices = np.ndarray((vertex_count, 3), dtype=np.float64, buffer=buffer)
+    triangles = np.ndarray(
+        (triangle_count, 3), dtype=np.int64, buffer=buffer, offset=vertices.nbytes
+    )
+
+    return vertices, triangles
+
+
+def mesh_to_shared_memory(mesh: Mesh) -> SharedMeshHandle:
+    """
+    Copy a mesh into a new shared memory block, e.g. in a worker process. The block stays alive after this process
+    closes its mapping; the receiving process owns it and unlinks it with SharedMesh.close().
+    """
+    vertex_count = len(mesh.vertices)
+    triangle_count = len(mesh.triangles)
+
+    # A zero-size block is not allowed
+    size = max(1, (vertex_count + triangle_count) * 3 * 8)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+
+    vertices, triangles = _get_arrays(shm.buf, vertex_count, triangle_count)
+    vertices[:] = mesh.vertices
+    triangles[:] = mesh.triangles
+    del vertices, triangles
+
+    # The receiving process owns the block, so the resource tracker must not remove it when this process exits
+    resource_tracker.unregister(shm._name, "shared_memory")
+    shm.close()
+
+    return SharedMeshHandle(shm.name, vertex_count, triangle_count)
+
+
+class SharedMesh:
+    """
+    A mesh in a shared memory block received from another process. The arrays in .mesh are views of the block, not
+    copies, and are only valid until close(), which also frees the block. Can be used as a context manager.
+    """
+
+    def __init__(self, handle: SharedMeshHandle):
+        self.handle = handle
+        self.shm = shared_memory.SharedMemory(name=handle.shm_name)
+        self.mesh = Mesh(*_get_arrays(self.shm.buf, handle.vertex_count, handle.triangle_count))
+
+    def copy(self) -> Mesh:
+        """
+        Get a copy of the mesh that stays valid after close().
+        """
+        return Mesh(self.mesh.vertices.copy(), self.mesh.triangles.copy())
+
+    def close(self):
+        if self.shm is None:
+            return
+
+        # The views have to be released before the block can be closed
+        self.mesh = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def render_mesh_to_shared_memory(
+    render_func: Callable[..., Any],
+    args: Tuple = (),
+    options: Optional[ExportOptions] = None,
+    trace: bool = False,
+) -> SharedMeshHandle:
+    """
+    Render a part, tessellate it and put the welded mesh in shared memory. Meant to run in a worker process, so
+    render_func and args have to be picklable (e.g. a module-level function and a Config).
+
+    If trace is set, the worker's trace events are returned in SharedMeshHandle.trace_events.
+    """
+    with worker_profiling(trace) as profile:
+        with profile_stage("worker_mesh_render"):
+            obj = render_func(*args)
+            # Welded at the export precision, so it doesn't change what write_mesh_stl() writes
+            options = options or ExportOptions()
+            mesh = weld(mesh_from_shape(obj, options), options.precision)
+
+            with profile_stage("copy_to_shared_memory"):
+                handle = mesh_to_shared_memory(mesh)
+
+    if profile:
+        handle.trace_events = profile.trace_events
+
+    return handle
+
+
+def submit_mesh_renders(
+    executor: Executor,
+    tasks: Dict[str, Tuple[Callable[..., Any], Tuple]],
+    options: Optional[ExportOptions] = None,
+    trace: bool = False,
+) -> Dict[str, Future]:
+    """
+    Start rendering parts to shared memory meshes in an executor (normally a ProcessPoolExecutor), so the calling
+    process can keep working in the meantime. Pass the result to collect_shared_meshes().
+
+    :param executor: The executor to run the renders in.
+    :param tasks: A dict of part name to a (render function, arguments) tuple.
+    :param options: The tessellation tolerances. Optional.
+    :param trace: Whether to trace the renders, see render_mesh_to_shared_memory(). collect_shared_meshes() adds the
+                  events to the active trace.
+    :return: A dict of part name to a future of SharedMeshHandle.
+    """
+    return {
+        name: executor.submit(render_mesh_to_shared_memory, render_func, args, options, trace)
+        for name, (render_func, args) in tasks.items()
+    }
+
+
+def free_shared_meshes(futures: Dict[str, Future]):
+    """
+    Free the meshes of all renders started by submit_mesh_renders() that succeeded, e.g. after an error. Waits for
+    renders that are still running.
+    """
+    for future in futures.values():
+        if future.cancelled() or future.exception() is not None:
+            continue
+
+        try:
+            SharedMesh(future.result()).close()
+        except FileNotFoundError:
+            # Already freed
+            pass
+
+
+def collect_shared_meshes(futures: Dict[str, Future]) -> Dict[str, SharedMesh]:
+    """
+    Wait for the renders started by submit_mesh_renders() and attach to their meshes. If any render failed, all
+    meshes are freed and the error is raised. Trace events recorded by the workers are added to the active trace.
+    """
+    shared_meshes = {}
+    try:
+        for name, future in futures.items():
+            handle = future.result()
+            add_trace_events(handle.trace_events)
+            shared_meshes[name] = SharedMesh(handle)
+    except BaseException:
+        for shared_mesh in shared_meshes.values():
+            shared_mesh.close()
+        free_shared_meshes(futures)
+        raise
+
+    return shared_meshes
@@ -0,0 +1,341 @@
+import functools
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import cadquery as cq
+from OCP.BRepAlgoAPI import (
+    BRepAlgoAPI_Common,
+    BRepAlgoAPI_Cut,
+    BRepAlgoAPI_Fuse,
+    BRepAlgoAPI_Splitter,
+)
+from OCP.TopAbs import TopAbs_FACE
+from OCP.TopExp import TopExp
+from OCP.TopTools import TopTools_IndexedMapOfShape
+
+from .hooks import Hook, get_defining_class, install_hooks, remove_hooks
+from .profiling import format_table, get_stage_path
+
+# The Workplane methods listed in a plan
+PLANNED_OPERATIONS = ["union", "cut", "intersect", "split", "fillet", "shell"]
+
+# The operations run by the OCCT boolean algorithms, e.g. when extruding into an existing solid
+BOOLEAN_OPERATIONS = {
+    BRepAlgoAPI_Fuse: "union",
+    BRepAlgoAPI_Cut: "cut",
+    BRepAlgoAPI_Common: "intersect",
+    BRepAlgoAPI_Splitter: "split",
+}
+
+# Estimated seconds per operation and per planned operand face, fitted on renders of 12 to 40 keys. Only meant to tell
+# a 4-key render from a 100-key one, see estimate_seconds().
+OPERATION_COSTS = {
+    "union": (0.002, 0.0008),
+    "cut": (0.005, 0.0005),
+    "intersect": (0.01, 0.0003),
+    "split": (0.03, 0.0003),
+    "fillet": (0.01, 0.0006),
+    "shell": (0.02, 0.0015),
+}
+
+
+@dataclass
+class PlannedOperation:
+    # One of PLANNED_OPERATIONS
+    operation: str
+    # The profile stage it runs in, e.g. "render_case/case_after_shell"
+    stage: str
+    # The number of shapes involved, including the one being changed
+    operands: int
+    # The total face count of the operands
+    faces: int
+    # The bounding box (xmin, ymin, zmin, xmax, ymax, zmax) of each operand
+    bboxes: List[List[float]]
+    estimated_seconds: float
+
+
+@dataclass
+class OperationPlan:
+    # In the order they would run
+    operations: List[PlannedOperation] = field(default_factory=list)
+
+    @property
+    def estimated_seconds(self) -> float:
+        return sum(operation.estimated_seconds for operation in self.operations)
+
+    def get_operation_counts(self) -> Dict[str, int]:
+        """
+        Get the number of planned operations by name, e.g. {"union": 57, "cut": 9, ...}.
+        """
+        counts = {name: 0 for name in PLANNED_OPERATIONS}
+        for operation in self.operations:
+            counts[operation.operation] += 1
+
+        return counts
+
+    def get_table(self) -> str:
+        """
+        Get a human-readable table with a row per stage: the number of each operation, the largest operand face count
+        and the estimated seconds.
+        """
+        stages: Dict[str, List[PlannedOperation]] = {}
+        for operation in self.operations:
+            stages.setdefault(operation.stage, []).append(operation)
+
+        header = (
+            ["Stage"] + [name.capitalize() for name in PLANNED_OPERATIONS] + ["Max faces", "Est s"]
+        )
+        rows = [
+            [stage or "-"]
+            + [
+                str(sum(1 for operation in operations if operation.operation == name))
+                for name in PLANNED_OPERATIONS
+            ]
+            + [
+                str(max(operation.faces for operation in operations)),
+                f"{sum(operation.estimated_seconds for operation in operations):.2f}",
+            ]
+            for stage, operations in stages.items()
+        ]
+        rows.append(
+            ["Total"]
+            + [str(count) for count in self.get_operation_counts().values()]
+            + [
+                str(max((operation.faces for operation in self.operations), default=0)),
+                f"{self.estimated_seconds:.2f}",
+            ]
+        )
+
+        return format_table(header, rows)
+
+    def print_table(self):
+        print(self.get_table())
+
+
+def estimate_seconds(operation: str, faces: int) -> float:
+    fixed_seconds, seconds_per_face = OPERATION_COSTS[operation]
+
+    return fixed_seconds + seconds_per_face * faces
+
+
+def _count_faces(shape: cq.Shape) -> int:
+    face_map = TopTools_IndexedMapOfShape()
+    TopExp.MapShapes_s(shape.wrapped, TopAbs_FACE, face_map)
+
+    return face_map.Extent()
+
+
+def _get_bbox(shape: cq.Shape) -> List[float]:
+    bb = shape.BoundingBox()
+
+    return [round(value, 3) for value in (bb.xmin, bb.ymin, bb.zmin, bb.xmax, bb.ymax, bb.zmax)]
+
+
+def _compound(shapes: List[cq.Shape]) -> cq.Shape:
+    return shapes[0] if len(shapes) == 1 else cq.Compound.makeCompound(shapes)
+
+
+def _bboxes_overlap(shapes: List[cq.Shape], others: List[cq.Shape]) -> bool:
+    bb = _compound(shapes).BoundingBox()
+    other_bb = _compound(others).BoundingBox()
+
+    return (
+        bb.xmin <= other_bb.xmax
+        and other_bb.xmin <= bb.xmax
+        and bb.ymin <= other_bb.ymax
+        and other_bb.ymin <= bb.ymax
+        and bb.zmin <= other_bb.zmax
+        and other_bb.zmin <= bb.zmax
+    )
+
+
+class Planner:
+    """
+    Records the operations that would run into an OperationPlan, see planning().
+    """
+
+    def __init__(self):
+        self.plan = OperationPlan()
+        # Set while a Workplane operation runs, so the boolean it runs is only listed once
+        self.in_operation = False
+
+    def record(self, operation: str, shapes: List[cq.Shape]):
+        faces = sum(_count_faces(shape) for shape in shapes)
+
+        self.plan.operations.append(
+            PlannedOperation(
+                operation=operation,
+                stage=get_stage_path(),
+                operands=len(shapes),
+                faces=faces,
+                bboxes=[_get_bbox(shape) for shape in shapes],
+                estimated_seconds=estimate_seconds(operation, faces),
+            )
+        )
+
+
+# The active planner of each thread, in .planner
+_state = threading.local()
+
+# The key of the planning hooks, see hooks.install_hooks()
+HOOKS_KEY = "planning"
+
+
+def _get_planner() -> Optional[Planner]:
+    return getattr(_state, "planner", None)
+
+
+def _get_operand_shapes(workplane: cq.Workplane, args: Tuple) -> List[cq.Shape]:
+    try:
+        # E.g. the solid that selected edges are filleted on
+        shapes = [workplane.findSolid()]
+    except ValueError:
+        shapes = [val for val in workplane.vals() if isinstance(val, cq.Shape)]
+
+    for arg in args:
+        if isinstance(arg, cq.Workplane):
+            shapes.extend(val for val in arg.vals() if isinstance(val, cq.Shape))
+        elif isinstance(arg, cq.Shape):
+            shapes.append(arg)
+
+    return shapes
+
+
+def _plan_workplane_operation(method_name: str, method: Callable) -> Callable:
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        planner = _get_planner()
+        if planner is None or planner.in_operation:
+            return method(self, *args, **kwargs)
+
+        planner.record(method_name, _get_operand_shapes(self, args + tuple(kwargs.values())))
+
+        planner.in_operation = True
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            planner.in_operation = False
+
+    return wrapper
+
+
+def _plan_bool_op(method, self, args, tools, op, parallel=True):
+    # Instead of running the boolean, returns a compound of the shapes it would start from. Its bounding box and face
+    # count are upper bounds of the real result's, and later selectors (e.g. edges("|Z")) still find something.
+    args = list(args)
+    tools = list(tools)
+    operation = BOOLEAN_OPERATIONS.get(type(op), "union")
+
+    planner = _get_planner()
+    if not planner.in_operation:
+        planner.record(operation, args + tools)
+
+    if operation == "union":
+        return _compound(args + tools)
+
+    if operation == "intersect":
+        # Texts are only added to the parts they intersect, so an empty result has to stay empty
+        return _compound(tools) if _bboxes_overlap(args, tools) else cq.Compound.makeCompound([])
+
+    return _compound(args)
+
+
+def _plan_fillet(method, self, *args, **kwargs):
+    planner = _get_planner()
+    if not planner.in_operation:
+        planner.record("fillet", [self])
+
+    return self
+
+
+def _plan_shell(method, self, *args, **kwargs):
+    # Also used for Shape.hollow(), which Workplane.shell() calls in newer CadQuery versions
+    planner = _get_planner()
+    if not planner.in_operation:
+        planner.record("shell", [self])
+
+    return self
+
+
+def _plan_offset2D(method, self, d, kind="arc"):
+    # The faces of a placeholder compound overlap, so offsetting their outline can fail where the real one wouldn't
+    try:
+        return method(self, d, kind)
+    except ValueError:
+        return [self]
+
+
+def _plan_clean(method, self):
+    # Cleaning the compounds standing in for boolean results would be slow and pointless
+    return self
+
+
+def _plan_only_when_planning(plan_method: Callable) -> Callable[[Callable], Callable]:
+    # The hooks are installed for the whole process, so threads that aren't planning run the original method
+    def wrap(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if _get_planner() is None:
+                return method(*args, **kwargs)
+
+            return plan_method(method, *args, **kwargs)
+
+        return wrapper
+
+    return wrap
+
+
+def _get_planning_hooks() -> List[Hook]:
+    # Patched on the class that defines each method, which differs between CadQuery versions (e.g. fillet() and
+    # shell() moved from Mixin3D to Shape), and only if it exists (e.g. hollow())
+    hooks = [
+        (
+            get_defining_class(cq.Workplane, name),
+            name,
+            functools.partial(_plan_workplane_operation, name),
+        )
+        for name in PLANNED_OPERATIONS
+    ]
+
+    for cls, name, plan_method in [
+        (cq.Shape, "_bool_op", _plan_bool_op),
+        (cq.Shape, "clean", _plan_clean),
+        (cq.Wire, "offset2D", _plan_offset2D),
+        (cq.Solid, "fillet", _plan_fillet),
+        (cq.Solid, "shell", _plan_shell),
+        (cq.Solid, "hollow", _plan_shell),
+    ]:
+        if hasattr(cls, name):
+            hooks.append(
+                (get_defining_class(cls, name), name, _plan_only_when_planning(plan_method))
+            )
+
+    return hooks
+
+
+@contextmanager
+def planning() -> Iterator[OperationPlan]:
+    """
+    List the unions, cuts, intersections, splits, fillets and shells run inside the block in an OperationPlan instead
+    of running them. Each boolean returns a compound of its operands instead, and fillets, shells and clean() return
+    the shape unchanged, so no OCCT boolean runs and code made of these operations keeps working. The shapes built in
+    the block are only placeholders.
+
+    Planning is per thread: the operations are patched on the CadQuery classes for the whole process while any thread
+    plans, but they only plan in the thread that entered the block, and run as usual in all others. Work the block
+    hands to other threads or processes (e.g. a thread pool) is not planned and runs for real.
+    """
+    if _get_planner() is not None:
+        raise Exception("Already planning")
+
+    # Only plans once every hook is in place: if one fails, install_hooks() removes the others
+    install_hooks(HOOKS_KEY, _get_planning_hooks())
+    planner = Planner()
+    _state.planner = planner
+    try:
+        yield planner.plan
+    finally:
+        _state.planner = None
+        remove_hooks(HOOKS_KEY)
@@ -0,0 +1,837 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields, is_dataclass
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, TextIO, Union
+
+import cadquery as cq
+
+from .hooks import get_defining_class, install_hooks, is_hooked, remove_hooks
+
+# The Workplane methods counted and timed while profiling, and their names in the profile
+OPERATIONS = {
+    "union": "unions",
+    "cut": "cuts",
+    "split": "splits",
+    "fillet": "fillets",
+    "shell": "shells",
+}
+
+# The source of operations whose operands can't be traced back to an input, see tag_source()
+UNATTRIBUTED = "unattributed"
+
+
+@dataclass
+class StageProfile:
+    # The stage path, e.g. "render_case/case_after_shell"
+    path: str
+    # Nesting level, 0 for top-level stages
+    depth: int
+    calls: int = 0
+    # Times and operation counts include nested stages
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    # Operation name (see OPERATIONS) to count and to total seconds
+    operation_counts: Dict[str, int] = field(default_factory=dict)
+    operation_seconds: Dict[str, float] = field(default_factory=dict)
+    # If profiling memory: the RSS when the stage was first entered and last left, the highest RSS while it ran, and
+    # the Python heap (as traced by tracemalloc) when last left and at its highest, all in MB
+    rss_before_mb: Optional[float] = None
+    rss_after_mb: Optional[float] = None
+    peak_rss_mb: Optional[float] = None
+    python_heap_after_mb: Optional[float] = None
+    python_heap_peak_mb: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        return self.path.rsplit("/", 1)[-1]
+
+
+@dataclass
+class InputCost:
+    # The input, e.g. "Key #3 (x=19.0, y=0.0)", see tag_source()
+    label: str
+    # The share of operation time attributed to the input, see profiling()
+    seconds: float = 0.0
+    operations: int = 0
+    # The slowest operation involving the input, e.g. "cuts in render_case/case_before_fillet", and its full time
+    slowest_operation: Optional[str] = None
+    slowest_seconds: float = 0.0
+
+
+@dataclass
+class RenderProfile:
+    # In the order the stages were first entered, so nested stages follow their parent
+    stages: List[StageProfile] = field(default_factory=list)
+    # Chrome trace events, if tracing (see write_trace())
+    trace_events: Optional[List[Dict[str, Any]]] = None
+    # Operation time by input label, if attributing (see get_costliest_inputs())
+    input_costs: Optional[Dict[str, InputCost]] = None
+
+    def get_stage(self, path: str) -> Optional[StageProfile]:
+        for stage in self.stages:
+            if stage.path == path:
+                return stage
+
+        return None
+
+    def get_table(self) -> str:
+        """
+        Get a human-readable table with a row per stage, nested stages indented below their parent.
+        """
+        operation_names = list(OPERATIONS.values())
+        header = ["Stage", "Calls", "Wall s", "CPU s"] + [
+            name.capitalize() for name in operation_names
+        ]
+
+        rows = [
+            [
+                "  " * stage.depth + stage.name,
+                str(stage.calls),
+                f"{stage.wall_seconds:.3f}",
+                f"{stage.cpu_seconds:.3f}",
+            ]
+            + [str(stage.operation_counts.get(name, 0)) for name in operation_names]
+            for stage in self.stages
+        ]
+
+        if any(stage.rss_after_mb is not None for stage in self.stages):
+            header += ["RSS MB", "Peak MB", "Py peak MB"]
+            for row, stage in zip(rows, self.stages):
+                row += [
+                    _format_mb(stage.rss_after_mb),
+                    _format_mb(stage.peak_rss_mb),
+                    _format_mb(stage.python_heap_peak_mb),
+                ]
+
+        return format_table(header, rows)
+
+    def print_table(self):
+        print(self.get_table())
+
+    def get_costliest_inputs(self, count: Optional[int] = 10) -> List[InputCost]:
+        """
+        Get the inputs with the most operation time attributed to them, costliest first.
+
+        :param count: The number of inputs to return, None for all.
+        """
+        if self.input_costs is None:
+            raise Exception("The profile has no input costs, profile with attribute=True")
+
+        costs = sorted(self.input_costs.values(), key=lambda cost: cost.seconds, reverse=True)
+
+        return costs if count is None else costs[:count]
+
+    def get_input_table(self, count: Optional[int] = 10) -> str:
+        """
+        Get a human-readable table of the costliest inputs, see get_costliest_inputs().
+        """
+        header = ["Input", "Seconds", "Operations", "Slowest s", "Slowest operation"]
+        rows = [
+            [
+                cost.label,
+                f"{cost.seconds:.3f}",
+                str(cost.operations),
+                f"{cost.slowest_seconds:.3f}",
+                cost.slowest_operation or "-",
+            ]
+            for cost in self.get_costliest_inputs(count)
+        ]
+
+        return format_table(header, rows, left_aligned=(0, 4))
+
+    def print_input_table(self, count: Optional[int] = 10):
+        print(self.get_input_table(count))
+
+    def get_trace(self) -> Dict[str, Any]:
+        """
+        Get the trace in the Chrome trace event format, with the timestamps starting at 0.
+        """
+        if self.trace_events is None:
+            raise Exception("The profile has no trace, profile with trace=True")
+
+        start = min((event["ts"] for event in self.trace_events), default=0)
+        events = [dict(event, ts=event["ts"] - start) for event in self.trace_events]
+
+        main_pid = os.getpid()
+        for pid in sorted({event["pid"] for event in events}):
+            process_name = "klavgen" if pid == main_pid else f"klavgen worker {pid}"
+            events.append(
+                {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": process_name}}
+            )
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_trace(self, file: Union[str, os.PathLike, TextIO]):
+        """
+        Write the trace as Chrome trace event JSON, which can be opened in https://ui.perfetto.dev or chrome://tracing.
+
+        :param file: A path or a writable text stream.
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, "w") as f:
+                json.dump(self.get_trace(), f)
+        else:
+            json.dump(self.get_trace(), file)
+
+
+def format_table(
+    header: List[str], rows: List[List[str]], left_aligned: Iterable[int] = (0,)
+) -> str:
+    """
+    Format rows of cells as a plain text table under a header, with the columns separated by two spaces. Columns are
+    right-aligned, except the ones at the indices in left_aligned.
+    """
+    left_aligned = set(left_aligned)
+    widths = [max(len(row[index]) for row in [header] + rows) for index in range(len(header))]
+
+    return "\n".join(
+        "  ".join(
+            cell.ljust(width) if index in left_aligned else cell.rjust(width)
+            for index, (cell, width) in enumerate(zip(row, widths))
+        ).rstrip()
+        for row in [header] + rows
+    )
+
+
+def _format_mb(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.0f}"
+
+
+def get_rss_mb() -> Optional[float]:
+    """
+    Get the resident set size of this process in MB, or None if it can't be read (not Linux and no psutil).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        import psutil
+    except ImportError:
+        return None
+
+    return psutil.Process().memory_info().rss / 1024**2
+
+
+def get_max_rss_mb() -> Optional[float]:
+    """
+    Get the highest RSS of this process so far in MB (ru_maxrss), or None if it can't be read (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # In bytes on macOS, in KB elsewhere
+    return max_rss / 1024**2 if sys.platform == "darwin" else max_rss / 1024
+
+
+def _read_and_reset_peak_rss_mb() -> Optional[float]:
+    """
+    Get the peak RSS since the last call from the kernel's high water mark (VmHWM), and reset it. Only works on Linux;
+    returns None elsewhere. The reset applies to the whole process, see profiling().
+    """
+    try:
+        with open("/proc/self/status") as f:
+            peak = next(int(line.split()[1]) / 1024 for line in f if line.startswith("VmHWM:"))
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except (OSError, StopIteration, ValueError):
+        return None
+
+    return peak
+
+
+class _OpenStage:
+    def __init__(self, stage: StageProfile, sequential: bool):
+        self.stage = stage
+        self.sequential = sequential
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        # Highest RSS and Python heap seen while the stage is open, if profiling memory
+        self.peak_rss: Optional[float] = None
+        self.python_heap_peak: Optional[float] = None
+
+
+class Profiler:
+    """
+    Records stages and operations into a RenderProfile. Only one profiler is active at a time in each thread, see
+    profiling().
+    """
+
+    def __init__(self, profile: RenderProfile):
+        self.profile = profile
+        self.open_stages: List[_OpenStage] = []
+        self.stages_by_path: Dict[str, StageProfile] = {
+            stage.path: stage for stage in profile.stages
+        }
+        # Set while an operation runs, so operations calling other operations are only counted once
+        self.in_operation = False
+        self.pid = os.getpid()
+        # Source labels by Workplane or Shape, if attributing (see tag_source())
+        self.sources: "weakref.WeakKeyDictionary[Any, FrozenSet[str]]" = weakref.WeakKeyDictionary()
+        # The label of the input being rendered, see attributed()
+        self.current_source: Optional[str] = None
+        # Whether to record memory use, and whether to reset the kernel's RSS high water mark to get the peaks, see
+        # profiling()
+        self.memory = False
+        self.reset_peak_rss = False
+        # The highest RSS of the process at the last update, if not resetting the high water mark
+        self.max_rss: Optional[float] = None
+        # Whether the profiler started tracemalloc, and so has to stop it
+        self.started_tracemalloc = False
+
+    def start_memory(self, reset_peak_rss: bool = False):
+        self.memory = True
+        self.reset_peak_rss = reset_peak_rss
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+
+        # Peaks are only counted from now on
+        if reset_peak_rss:
+            _read_and_reset_peak_rss_mb()
+        else:
+            self.max_rss = get_max_rss_mb()
+        tracemalloc.reset_peak()
+
+    def _get_peak_rss(self) -> Optional[float]:
+        # The peak RSS since the last update, if known
+        if self.reset_peak_rss:
+            return _read_and_reset_peak_rss_mb()
+
+        # The highest RSS of the process can't be reset, but when it grew, the new one was reached since the last update
+        max_rss = get_max_rss_mb()
+        previous_max_rss = self.max_rss
+        self.max_rss = max_rss
+        if max_rss is not None and previous_max_rss is not None and max_rss > previous_max_rss:
+            return max_rss
+
+        return None
+
+    def stop_memory(self):
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+    def update_memory_peaks(self) -> Dict[str, Optional[float]]:
+        """
+        Fold the peak RSS and Python heap since the last update into every open stage, and reset the peaks so the next
+        update only sees what came after. Returns the current RSS and Python heap.
+        """
+        rss = get_rss_mb()
+        peak_rss = self._get_peak_rss()
+        if peak_rss is None:
+            # Otherwise, the peak is approximated by the RSS at stage boundaries
+            peak_rss = rss
+
+        python_heap, python_heap_peak = (
+            value / 1024**2 for value in tracemalloc.get_traced_memory()
+        )
+        tracemalloc.reset_peak()
+
+        for open_stage in self.open_stages:
+            if peak_rss is not None:
+                open_stage.peak_rss = max(open_stage.peak_rss or 0.0, peak_rss)
+            open_stage.python_heap_peak = max(open_stage.python_heap_peak or 0.0, python_heap_peak)
+
+        memory = {"rss_mb": rss, "python_heap_mb": python_heap}
+        if self.tracing:
+            self.profile.trace_events.append(
+                {
+                    "name": "memory",
+                    "ph": "C",
+                    "ts": time.perf_counter() * 1e6,
+                    "pid": self.pid,
+                    "args": {name: value for name, value in memory.items() if value is not None},
+                }
+            )
+
+        return memory
+
+    def begin(self, name: str, sequential: bool = False) -> _OpenStage:
+        parent_path = self.open_stages[-1].stage.path if self.open_stages else ""
+        path = f"{parent_path}/{name}" if parent_path else name
+
+        stage = self.stages_by_path.get(path)
+        if not stage:
+            stage = StageProfile(path=path, depth=len(self.open_stages))
+            self.stages_by_path[path] = stage
+            self.profile.stages.append(stage)
+
+        stage.calls += 1
+
+        memory = self.update_memory_peaks() if self.memory else None
+
+        open_stage = _OpenStage(stage, sequential)
+        self.open_stages.append(open_stage)
+
+        if memory:
+            if stage.rss_before_mb is None:
+                stage.rss_before_mb = memory["rss_mb"]
+            open_stage.peak_rss = memory["rss_mb"]
+            open_stage.python_heap_peak = memory["python_heap_mb"]
+
+        return open_stage
+
+    def end(self, open_stage: _OpenStage):
+        """
+        End a stage, and any stages nested in it that are still open (e.g. after an exception).
+        """
+        if open_stage not in self.open_stages:
+            return
+
+        wall_end = time.perf_counter()
+        cpu_end = time.process_time()
+
+        memory = self.update_memory_peaks() if self.memory else None
+
+        while self.open_stages:
+            ended = self.open_stages.pop()
+            stage = ended.stage
+            stage.wall_seconds += wall_end - ended.wall_start
+            stage.cpu_seconds += cpu_end - ended.cpu_start
+
+            trace_args = {"path": stage.path}
+            if memory:
+                # Stages entered before memory profiling started have no peaks
+                stage.rss_after_mb = memory["rss_mb"]
+                stage.python_heap_after_mb = memory["python_heap_mb"]
+                if ended.peak_rss is not None:
+                    stage.peak_rss_mb = max(stage.peak_rss_mb or 0.0, ended.peak_rss)
+                if ended.python_heap_peak is not None:
+                    stage.python_heap_peak_mb = max(
+                        stage.python_heap_peak_mb or 0.0, ended.python_heap_peak
+                    )
+
+                trace_args.update(
+                    rss_before_mb=stage.rss_before_mb,
+                    rss_after_mb=stage.rss_after_mb,
+                    peak_rss_mb=stage.peak_rss_mb,
+                    python_heap_peak_mb=stage.python_heap_peak_mb,
+                )
+
+            self.add_trace_event(stage.name, "stage", ended.wall_start, wall_end, trace_args)
+
+            if ended is open_stage:
+                break
+
+    def next_stage(self, name: str):
+        if self.open_stages and self.open_stages[-1].sequential:
+            self.end(self.open_stages[-1])
+
+        self.begin(name, sequential=True)
+
+    def record_operation(
+        self,
+        name: str,
+        start: float,
+        end: float,
+        args: Optional[Dict[str, Any]] = None,
+        event_name: Optional[str] = None,
+    ):
+        for open_stage in self.open_stages:
+            stage = open_stage.stage
+            stage.operation_counts[name] = stage.operation_counts.get(name, 0) + 1
+            stage.operation_seconds[name] = stage.operation_seconds.get(name, 0.0) + end - start
+
+        self.add_trace_event(event_name or name, "operation", start, end, args)
+
+    @property
+    def tracing(self) -> bool:
+        return self.profile.trace_events is not None
+
+    @property
+    def attributing(self) -> bool:
+        return self.profile.input_costs is not None
+
+    def get_sources(self, obj: Any) -> FrozenSet[str]:
+        """
+        Get the source labels of a Workplane or Shape. Untagged Workplanes inherit the sources of the Workplane they
+        were made from (e.g. with translate() or clean()).
+        """
+        untagged = []
+        node = obj
+        sources = frozenset()
+        while isinstance(node, (cq.Workplane, cq.Shape)):
+            tagged = self.sources.get(node)
+            if tagged is not None:
+                sources = tagged
+                break
+
+            untagged.append(node)
+            node = node.parent if isinstance(node, cq.Workplane) else None
+
+        # Only found sources are cached, so tagging an ancestor later still reaches its descendants
+        if sources:
+            for node in untagged:
+                self.sources[node] = sources
+
+        return sources
+
+    def add_sources(self, obj: Any, sources: FrozenSet[str]):
+        if sources and isinstance(obj, (cq.Workplane, cq.Shape)):
+            self.sources[obj] = self.get_sources(obj) | sources
+
+    def attribute_operation(self, name: str, seconds: float, sources: FrozenSet[str]):
+        """
+        Split the time of an operation equally between its sources.
+        """
+        stage_path = self.open_stages[-1].stage.path if self.open_stages else ""
+        description = f"{name} in {stage_path}" if stage_path else name
+
+        for label in sources or [UNATTRIBUTED]:
+            cost = self.profile.input_costs.get(label)
+            if not cost:
+                cost = self.profile.input_costs[label] = InputCost(label)
+
+            cost.seconds += seconds / max(1, len(sources))
+            cost.operations += 1
+            if seconds > cost.slowest_seconds:
+                cost.slowest_seconds = seconds
+                cost.slowest_operation = description
+
+    def add_trace_event(
+        self, name: str, category: str, start: float, end: float, args: Optional[Dict[str, Any]]
+    ):
+        if self.profile.trace_events is None:
+            return
+
+        # perf_counter() is a system-wide monotonic clock, so events from worker processes line up
+        self.profile.trace_events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": start * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": self.pid,
+                "tid": threading.get_ident(),
+                "args": args or {},
+            }
+        )
+
+
+# The active profiler of each thread, in .profiler
+_state = threading.local()
+
+# The key of the operation hooks, see hooks.install_hooks()
+HOOKS_KEY = "profiling"
+
+
+def get_profiler() -> Optional[Profiler]:
+    """
+    Get the profiler active in this thread, if any.
+    """
+    return getattr(_state, "profiler", None)
+
+
+def get_stage_path() -> str:
+    """
+    Get the path of the innermost open stage, or "" if there is none or profiling is off.
+    """
+    profiler = get_profiler()
+    if profiler is None or not profiler.open_stages:
+        return ""
+
+    return profiler.open_stages[-1].stage.path
+
+
+def describe_shape(obj: Any) -> Optional[Dict[str, Any]]:
+    """
+    Get the face count and bounding box of a Workplane or Shape, for trace event args.
+    """
+    if isinstance(obj, cq.Workplane):
+        shapes = [val for val in obj.vals() if isinstance(val, cq.Shape)]
+    elif isinstance(obj, cq.Shape):
+        shapes = [obj]
+    else:
+        return None
+
+    if not shapes:
+        return {"faces": 0}
+
+    compound = shapes[0] if len(shapes) == 1 else cq.Compound.makeCompound(shapes)
+    bb = compound.BoundingBox()
+
+    return {
+        "faces": len(compound.Faces()),
+        "bbox": [
+            round(value, 3) for value in (bb.xmin, bb.ymin, bb.zmin, bb.xmax, bb.ymax, bb.zmax)
+        ],
+    }
+
+
+def _wrap_operation(method_name: str, method: Callable) -> Callable:
+    operation_name = OPERATIONS[method_name]
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # Threads that aren't profiling run the operation as-is
+        profiler = get_profiler()
+        if profiler is None or profiler.in_operation:
+            return method(self, *args, **kwargs)
+
+        tools = [
+            arg
+            for arg in list(args) + list(kwargs.values())
+            if isinstance(arg, (cq.Workplane, cq.Shape))
+        ]
+
+        trace_args = None
+        if profiler.tracing:
+            # Described outside the timed region, so tracing doesn't inflate the operation time
+            trace_args = {"operands": [describe_shape(operand) for operand in [self] + tools]}
+
+        sources = None
+        if profiler.attributing:
+            # Blamed on the shapes being added or removed, e.g. the key being unioned into the case, rather than on
+            # everything the case is made of. Fillets, shells and splits have no tools, so they're blamed on self.
+            sources = frozenset().union(*[profiler.get_sources(tool) for tool in tools])
+            if not sources:
+                sources = profiler.get_sources(self)
+            if not sources and profiler.current_source:
+                sources = frozenset([profiler.current_source])
+
+            if trace_args is not None:
+                trace_args["sources"] = sorted(sources)
+
+        profiler.in_operation = True
+        start = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+        finally:
+            end = time.perf_counter()
+            profiler.in_operation = False
+            profiler.record_operation(operation_name, start, end, trace_args, method_name)
+            if sources is not None:
+                profiler.attribute_operation(operation_name, end - start, sources)
+
+        if trace_args is not None:
+            trace_args["result"] = describe_shape(result)
+
+        if sources is not None:
+            # The result is made of all operands, so later operations on it are blamed on all of them
+            profiler.add_sources(result, sources | profiler.get_sources(self))
+
+        return result
+
+    return wrapper
+
+
+def _install_operation_hooks():
+    install_hooks(
+        HOOKS_KEY,
+        [
+            (
+                get_defining_class(cq.Workplane, method_name),
+                method_name,
+                functools.partial(_wrap_operation, method_name),
+            )
+            for method_name in OPERATIONS
+        ],
+    )
+
+
+def _remove_operation_hooks(all_users: bool = False):
+    remove_hooks(HOOKS_KEY, all_users)
+
+
+@contextmanager
+def profiling(
+    enabled: bool = True,
+    trace: bool = False,
+    attribute: bool = False,
+    memory: bool = False,
+    reset_peak_rss: bool = False,
+) -> Iterator[Optional[RenderProfile]]:
+    """
+    Profile the stages (see profile_stage()) and the CadQuery unions, cuts, splits, fillets and shells run inside the
+    block. Operations are counted by temporarily wrapping the cq.Workplane methods, so nothing is wrapped when
+    profiling is off.
+
+    If profiling is already active (e.g. render_and_save_keyboard() profiling a render_case() call), the block records
+    into the active profile.
+
+    Profiling is per thread: only the operations run by the thread that entered the block are recorded, and other
+    threads run theirs unrecorded (and can profile them separately). Work handed to other threads or processes inside
+    the block is not recorded, except for trace events added with add_trace_events().
+
+    :param enabled: Whether to start profiling if it's not active yet.
+    :param trace: Whether to also record a timeline of every stage and operation, with the face counts and bounding
+                  boxes of the operands, in RenderProfile.trace_events (see RenderProfile.write_trace()). Slower than
+                  plain profiling, since every operand is inspected. Implies enabled.
+    :param attribute: Whether to also attribute the time of every operation to the inputs it involves (see
+                      tag_source()), in RenderProfile.input_costs (see RenderProfile.get_costliest_inputs()). An
+                      operation's time is split between the sources of the shapes being added or removed, or of the
+                      shape being changed if there are none (e.g. fillets). Implies enabled.
+    :param memory: Whether to also record the RSS when each stage starts and ends, its peak RSS and the Python heap
+                   (with tracemalloc, started if needed) in the StageProfile memory fields, and as counters in the
+                   trace. The peak RSS of a stage is the process's highest RSS so far (ru_maxrss) if that grew while
+                   the stage ran, and otherwise the highest RSS seen at stage boundaries, which can miss short peaks.
+                   Implies enabled.
+    :param reset_peak_rss: With memory, whether to get exact peaks on Linux from the kernel's RSS high water mark
+                           (VmHWM), reset at each stage boundary by writing to /proc/self/clear_refs. The reset applies
+                           to the whole process, so it also changes the peak memory seen by the rest of the
+                           application and by outer profilers; only use it where nothing else relies on it.
+    :return: The RenderProfile being recorded, or None if profiling is off.
+    """
+    active_profiler = get_profiler()
+    if active_profiler is not None:
+        if trace and not active_profiler.tracing:
+            active_profiler.profile.trace_events = []
+        if attribute and not active_profiler.attributing:
+            active_profiler.profile.input_costs = {}
+        if memory and not active_profiler.memory:
+            # Only stages entered from now on get memory data
+            active_profiler.start_memory(reset_peak_rss)
+        yield active_profiler.profile
+        return
+
+    if not enabled and not trace and not attribute and not memory:
+        yield None
+        return
+
+    profile = RenderProfile(
+        trace_events=[] if trace else None, input_costs={} if attribute else None
+    )
+    _install_operation_hooks()
+    profiler = Profiler(profile)
+    _state.profiler = profiler
+    if memory:
+        profiler.start_memory(reset_peak_rss)
+    try:
+        yield profile
+    finally:
+        while profiler.open_stages:
+            profiler.end(profiler.open_stages[0])
+        _remove_operation_hooks()
+        profiler.stop_memory()
+        _state.profiler = None
+
+
+@contextmanager
+def profile_stage(name: str) -> Iterator[None]:
+    """
+    Record the block as a named stage, nested in the current stage. Does nothing when profiling is off.
+    """
+    profiler = get_profiler()
+    if profiler is None:
+        yield
+        return
+
+    open_stage = profiler.begin(name)
+    try:
+        yield
+    finally:
+        profiler.end(open_stage)
+
+
+def next_stage(name: str):
+    """
+    End the previous stage started with next_stage() in the current stage, if any, and start a new one. Meant for
+    long functions made of consecutive steps; the last step ends with the enclosing stage. Does nothing when profiling
+    is off.
+    """
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.next_stage(name)
+
+
+def profiled(name: str) -> Callable[[Callable], Callable]:
+    """
+    A decorator recording every call of a function as a named stage.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if get_profiler() is None:
+                return func(*args, **kwargs)
+
+            with profile_stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def tag_source(obj: Any, label: str):
+    """
+    Tag the Workplanes and Shapes in obj (which can also be a list, tuple or dataclass of them, e.g. a RenderedKey)
+    with an input label, so the operations they take part in are attributed to it. Does nothing unless attributing,
+    see profiling().
+    """
+    profiler = get_profiler()
+    if profiler is None or not profiler.attributing:
+        return
+
+    if isinstance(obj, (list, tuple)):
+        for item in obj:
+            tag_source(item, label)
+    elif is_dataclass(obj) and not isinstance(obj, type):
+        for obj_field in fields(obj):
+            tag_source(getattr(obj, obj_field.name), label)
+    else:
+        profiler.add_sources(obj, frozenset([label]))
+
+
+def attributed(label: str, func: Callable, *args, **kwargs) -> Any:
+    """
+    Call func, attributing the operations it runs to label and tagging its result with label (see tag_source()).
+    Just calls func unless attributing, see profiling().
+    """
+    profiler = get_profiler()
+    if profiler is None or not profiler.attributing:
+        return func(*args, **kwargs)
+
+    previous_source = profiler.current_source
+    profiler.current_source = label
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        profiler.current_source = previous_source
+
+    tag_source(result, label)
+
+    return result
+
+
+@contextmanager
+def worker_profiling(trace: bool = False) -> Iterator[Optional[RenderProfile]]:
+    """
+    Like profiling(), for code running in a worker process: a forked worker inherits the parent's active profiler, but
+    anything recorded in it never reaches the parent, so it's dropped first. Pass the trace events back to the parent
+    and add them with add_trace_events().
+    """
+    # The hooks are dropped even if another thread of the parent installed them, since that thread doesn't exist here
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.stop_memory()
+        _state.profiler = None
+    if is_hooked(HOOKS_KEY):
+        _remove_operation_hooks(all_users=True)
+
+    with profiling(enabled=trace, trace=trace) as profile:
+        yield profile
+
+
+def add_trace_events(events: Optional[List[Dict[str, Any]]]):
+    """
+    Add trace events recorded elsewhere (e.g. in a worker process, see worker_profiling()) to the active trace, if any.
+    """
+    profiler = get_profiler()
+    if profiler is not None and profiler.tracing and events:
+        profiler.profile.trace_events.extend(events)
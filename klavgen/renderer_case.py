@@ -1,13 +1,17 @@
+import functools
 import importlib
 import math
 from collections import defaultdict
+from contextlib import nullcontext
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from enum import Enum
+from typing import Any, Dict, List, Optional, Union
 
 import cadquery as cq
 
 from . import renderer_controller, renderer_trrs_jack
 from .classes import (
+    ComponentPlacements,
     Controller,
     Cut,
     Key,
@@ -20,26 +24,92 @@ from .classes import (
     TrrsJack,
 )
 from .config import Config
+from .exporting import OutputTarget, export_part, get_input_fingerprints, get_output
+from .operation_plan import OperationPlan, planning
+from .profiling import RenderProfile, attributed, next_stage, profile_stage, profiling, tag_source
 from .renderer_connector import (
     render_case_connector_support,
     render_connector,
     render_connector_cutout,
 )
 from .renderer_cut import render_cut
-from .renderer_key import render_key, render_key_templates
+from .renderer_key import render_key, render_key_debug, render_key_templates
 from .renderer_palm_rest import render_palm_rest
 from .renderer_patch import render_patch
-from .renderer_screw_hole import render_screw_hole
+from .renderer_screw_hole import render_screw_hole, render_screw_hole_debug
 from .renderer_switch_holder import render_switch_holder
 from .renderer_text import render_text
 from .rendering import RENDERERS, RenderingPipelineStage, SeparateComponentRender
-from .utils import position, union_list
+from .shape_metrics import ComplexityThresholds, ShapeMetrics, check_metrics, get_shape_metrics
+from .utils import Lazy, LazyField, position, union_list
 
 importlib.reload(renderer_controller)
 importlib.reload(renderer_trrs_jack)
 from .renderer_controller import render_controller_case_cutout_and_support, render_controller_holder
 from .renderer_trrs_jack import render_trrs_jack_case_cutout_and_support, render_trrs_jack_holder
 
+IDENTITY_LOCATION = LocationOrientation(x=0, y=0)
+
+
+class Retain(Enum):
+    # Keep every intermediate shape on the result
+    ALL = 0
+    # Release each intermediate shape as soon as no later stage needs it
+    FINAL = 1
+    # Keep every intermediate shape while rendering, release them all once rendering succeeds
+    ON_FAILURE = 2
+
+
+# The RenderCaseResult fields only needed while rendering
+INTERMEDIATE_FIELDS = [
+    "switch_holes",
+    "screw_hole_rims",
+    "screw_hole_rims_bottom",
+    "patches",
+    "cuts",
+    "case_extras",
+    "controller_hole",
+    "controller_rail",
+    "trrs_jack_hole",
+    "trrs_jack_rail",
+    "case_before_fillet",
+    "top_before_fillet",
+    "vertical_clearance_before_fillet",
+    "case_after_fillet",
+    "case_after_shell",
+    "shell_cut",
+    "palm_rests_before_case_clearance",
+    "palm_rests_before_fillet",
+    "palm_rests_after_side_fillet",
+    "palm_rests_after_fillet",
+    "case_with_rests_before_fillet",
+    "bottom_before_fillet",
+]
+
+# The RenderCaseResult fields measured with metrics=True, in rendering order
+METRIC_FIELDS = [
+    "switch_holes",
+    "screw_hole_rims",
+    "patches",
+    "cuts",
+    "case_extras",
+    "case_before_fillet",
+    "top_before_fillet",
+    "vertical_clearance_before_fillet",
+    "case_after_fillet",
+    "case_after_shell",
+    "shell_cut",
+    "top",
+    "palm_rests_before_case_clearance",
+    "palm_rests_before_fillet",
+    "palm_rests_after_side_fillet",
+    "palm_rests_after_fillet",
+    "case_with_rests_before_fillet",
+    "bottom_before_fillet",
+    "bottom",
+    "palm_rests",
+]
+
 
 @dataclass
 class RenderCaseResult:
@@ -67,11 +137,18 @@ class RenderCaseResult:
     palm_rests: Optional[List[Any]] = None
     case_with_rests_before_fillet: Any = None
     bottom_before_fillet: Any = None
+    screw_hole_rims_bottom: Any = None
     bottom: Any = None
-    debug: Any = None
+    # Computed on first access unless render_case() ran in debug mode
+    debug: Any = LazyField()
     standard_components: Any = None
+    standard_component_placements: Optional[List[ComponentPlacements]] = None
     components: Optional[Dict[str, Dict[str, List[Any]]]] = None
     separate_components: Optional[List[SeparateComponentRender]] = None
+    # Computed on first access (e.g. by save_result()), since hashing case_extras geometry isn't free
+    input_fingerprints: Optional[Dict[str, str]] = LazyField()
+    profile: Optional[RenderProfile] = None
+    metrics: Optional[Dict[str, ShapeMetrics]] = None
 
 
 def render_case(
@@ -89,7 +166,16 @@ def render_case(
     render_standard_components: bool = False,
     result: Optional[RenderCaseResult] = None,
     config: Config = Config(),
-) -> RenderCaseResult:
+    union_standard_components: bool = True,
+    retain: Retain = Retain.ALL,
+    profile: bool = False,
+    trace: bool = False,
+    metrics: bool = False,
+    metric_thresholds: Optional[ComplexityThresholds] = None,
+    attribute: bool = False,
+    dry_run: bool = False,
+    memory: bool = False,
+) -> Union[RenderCaseResult, OperationPlan]:
     """
     The core method that renders the keyboard case.
 
@@ -104,20 +190,143 @@ def render_case(
     :param palm_rests: A list of PalmRest objects that define palm rests (overlapping with keys is fine). Optional.
     :param texts: A list of Text objects with text to be drawn to either the top or palm rests. Optional.
     :param debug: A boolean defining whether to run in debug mode which skips the finicky shell step (that produces
-                  the empty internal volume of the case.
+                  the empty internal volume of the case. Debug mode also renders RenderCaseResult.debug (keycap and
+                  screw rim outlines, plus the debug shapes of the components) right away; otherwise it's only
+                  rendered when first accessed.
     :param render_standard_components: A boolean defining whether to render all the holders and connectors in the
                                        RenderCaseResult.standard_components value.
     :param result: Pass an existing instance of RenderCaseResult which will be populated as rendering proceeds. This
                    way if the code crashes, you can inspect all the completed steps. Most useful to troubleshoot issues
                    with the shell step and fillets.
     :param config: Pass a custom Config object to override the keyboard configuration.
-    :return: A new or existing RenderCaseResult, if one was provided via the result parameter.
+    :param union_standard_components: A boolean defining whether to union all standard components into
+                                      RenderCaseResult.standard_components. Set to False to only get
+                                      RenderCaseResult.standard_component_placements (each holder rendered once, plus
+                                      its locations), which is much faster for large keyboards.
+    :param retain: Which intermediate shapes (e.g. RenderCaseResult.case_before_fillet) to keep on the result.
+                   Retain.ALL keeps all of them. Retain.FINAL releases each one as soon as no later stage needs it, so
+                   only the final parts are left; if a stage fails, the shapes it was working on are still there to
+                   troubleshoot. Retain.ON_FAILURE keeps all of them until rendering succeeds, then releases them.
+    :param profile: A boolean defining whether to record the wall and CPU time of each stage, and the number of
+                    unions, cuts, splits, fillets and shells it ran, in RenderCaseResult.profile (see
+                    RenderProfile.print_table()). Costs little, so it can stay on in production.
+    :param trace: A boolean defining whether to also record a timeline of every stage and CadQuery operation in
+                  RenderCaseResult.profile, to save with RenderCaseResult.profile.write_trace() and open in Perfetto.
+                  Implies profile.
+    :param metrics: A boolean defining whether to record the solid, face, edge and vertex counts, smallest edge and
+                    tolerances of each stage in RenderCaseResult.metrics, as soon as the stage completes. Stages whose
+                    complexity jumps (see ComplexityThresholds) print a warning, which often comes before a slow or
+                    failing shell step.
+    :param metric_thresholds: A ComplexityThresholds object to override the warning thresholds. Optional.
+    :param attribute: A boolean defining whether to also attribute the time of every CadQuery operation to the inputs
+                      involved (each key, screw hole, patch, cut, case_extras item, palm rest, text and component), to
+                      find the ones that make rendering slow with RenderCaseResult.profile.print_input_table(). Implies
+                      profile.
+    :param dry_run: A boolean defining whether to only plan the render: instead of a RenderCaseResult, return an
+                    OperationPlan listing every union, cut, intersection, split, fillet and shell the render would run,
+                    with its stage, operand count, face count and bounding boxes, and a rough time estimate. No
+                    boolean, fillet or shell is run, so planning takes a fraction of the render time. The face counts
+                    and bounding boxes are upper bounds, since the operands are not merged.
+    :param memory: A boolean defining whether to also record the RSS before and after each stage, its peak RSS and the
+                   Python heap (traced with tracemalloc) in RenderCaseResult.profile, to see which stage needs or keeps
+                   the most memory. Shown by RenderCaseResult.profile.print_table() and as counters in the trace.
+                   Implies profile.
+    :return: A new or existing RenderCaseResult, if one was provided via the result parameter, or an OperationPlan if
+             dry_run is set.
     """
 
-    if not result:
+    if not result or dry_run:
+        # The shapes built in a dry run are placeholders, so they don't go into a provided result
         result = RenderCaseResult()
 
+    # Dry runs are profiled so each planned operation has a stage
+    with profiling(profile or dry_run, trace, attribute, memory) as render_profile, (
+        planning() if dry_run else nullcontext()
+    ) as plan:
+        # Set before rendering, so the stages completed so far can be inspected if rendering fails
+        result.profile = render_profile
+        result.metrics = {} if metrics and not dry_run else None
+
+        with profile_stage("render_case"):
+            _render_case(
+                keys=keys,
+                screw_holes=screw_holes,
+                controller=controller,
+                trrs_jack=trrs_jack,
+                components=components,
+                patches=patches,
+                cuts=cuts,
+                case_extras=case_extras,
+                palm_rests=palm_rests,
+                texts=texts,
+                debug=debug,
+                render_standard_components=render_standard_components,
+                result=result,
+                config=config,
+                union_standard_components=union_standard_components,
+                retain=retain,
+                metric_thresholds=metric_thresholds,
+            )
+
+    if dry_run:
+        return plan
+
+    return result
+
+
+def _render_case(
+    keys: List[Key],
+    screw_holes: Optional[List[ScrewHole]],
+    controller: Optional[Controller],
+    trrs_jack: Optional[TrrsJack],
+    components: Optional[List[Renderable]],
+    patches: Optional[List[Patch]],
+    cuts: Optional[List[Cut]],
+    case_extras: Optional[List[Any]],
+    palm_rests: Optional[List[PalmRest]],
+    texts: Optional[List[Text]],
+    debug: bool,
+    render_standard_components: bool,
+    result: RenderCaseResult,
+    config: Config,
+    union_standard_components: bool,
+    retain: Retain,
+    metric_thresholds: Optional[ComplexityThresholds],
+):
+    def measure(names: List[str], remeasure: bool = False):
+        if result.metrics is not None:
+            record_metrics(result, names, len(keys), metric_thresholds, remeasure)
+
+    def stage(name: str):
+        # Stages completed so far are measured before the next one starts
+        measure(METRIC_FIELDS)
+        next_stage(name)
+
+    def release(*names):
+        if retain == Retain.FINAL:
+            measure(names)
+            release_intermediates(result, names)
+
     result.keys = keys
+    result.input_fingerprints = Lazy(
+        functools.partial(
+            get_input_fingerprints,
+            keys=keys,
+            screw_holes=screw_holes,
+            controller=controller,
+            trrs_jack=trrs_jack,
+            components=components,
+            patches=patches,
+            cuts=cuts,
+            case_extras=case_extras,
+            palm_rests=palm_rests,
+            texts=texts,
+            debug=debug,
+            render_standard_components=render_standard_components,
+            config=config,
+            union_standard_components=union_standard_components,
+        )
+    )
 
     case_config = config.case_config
     switch_holder_config = config.get_switch_holder_config()
@@ -133,14 +342,16 @@ def render_case(
             abs(case_config.side_fillet - case_config.case_thickness) >= 0.01
         ), "Side fillet needs to be at least 0.01 above or below case thickness"
 
+    stage("key_templates")
     key_templates = render_key_templates(case_config, switch_holder_config)
 
+    stage("components")
     # Do rendering
     stage_rendered_components: Dict[RenderingPipelineStage, List[Any]] = defaultdict(list)
     result.separate_components = []
     result.components = {}
     if components:
-        for component in components:
+        for index, component in enumerate(components):
             if not component.render_func_name:
                 raise Exception(f"Component {type(component)} needs to define render_func_name")
             render_func = RENDERERS.get_renderer(component.render_func_name)
@@ -149,7 +360,9 @@ def render_case(
                     f"Rendering function {component.render_func_name} for component {type(component)} not found"
                 )
 
-            render_result = render_func(component, config)
+            render_result = attributed(
+                f"{type(component).__name__} #{index}", render_func, component, config
+            )
 
             for rendered_item in render_result.items:
                 stage_rendered_components[rendered_item.pipeline_stage].append(rendered_item.shape)
@@ -168,30 +381,71 @@ def render_case(
             if render_result.separate_components:
                 result.separate_components.extend(render_result.separate_components)
 
-    rendered_keys = [render_key(key, key_templates, case_config, key_config) for key in keys]
+    stage("inputs")
+    # The labels identify each input in the profile when attributing operation time to inputs
+    rendered_keys = [
+        attributed(
+            f"Key #{index} (x={key.x:g}, y={key.y:g})",
+            render_key,
+            key,
+            key_templates,
+            case_config,
+            key_config,
+        )
+        for index, key in enumerate(keys)
+    ]
     rendered_screw_holes = [
-        render_screw_hole(screw_hole, config.screw_hole_config, case_config)
-        for screw_hole in (screw_holes or [])
+        attributed(
+            f"ScrewHole #{index} (x={screw_hole.x:g}, y={screw_hole.y:g})",
+            render_screw_hole,
+            screw_hole,
+            config.screw_hole_config,
+            case_config,
+        )
+        for index, screw_hole in enumerate(screw_holes or [])
     ]
     rendered_controller = (
-        render_controller_case_cutout_and_support(controller, config.controller_config, case_config)
+        attributed(
+            "Controller",
+            render_controller_case_cutout_and_support,
+            controller,
+            config.controller_config,
+            case_config,
+        )
         if controller
         else None
     )
     rendered_trrs_jack = (
-        render_trrs_jack_case_cutout_and_support(trrs_jack, config.trrs_jack_config, case_config)
+        attributed(
+            "TrrsJack",
+            render_trrs_jack_case_cutout_and_support,
+            trrs_jack,
+            config.trrs_jack_config,
+            case_config,
+        )
         if trrs_jack
         else None
     )
-    rendered_patches = [render_patch(patch, case_config) for patch in (patches or [])]
-    rendered_cuts = [render_cut(cut, case_config) for cut in (cuts or [])]
+    rendered_patches = [
+        attributed(f"Patch #{index}", render_patch, patch, case_config)
+        for index, patch in enumerate(patches or [])
+    ]
+    rendered_cuts = [
+        attributed(f"Cut #{index}", render_cut, cut, case_config)
+        for index, cut in enumerate(cuts or [])
+    ]
     rendered_palm_rests = [
-        render_palm_rest(palm_rest, case_config) for palm_rest in (palm_rests or [])
+        attributed(f"PalmRest #{index}", render_palm_rest, palm_rest, case_config)
+        for index, palm_rest in enumerate(palm_rests or [])
     ]
-    rendered_texts = [render_text(text) for text in (texts or [])]
-
-    standard_components = []
+    rendered_texts = [
+        attributed(f"Text #{index} '{text.text}'", render_text, text)
+        for index, text in enumerate(texts or [])
+    ]
+    for index, case_extra in enumerate(case_extras or []):
+        tag_source(case_extra, f"case_extras #{index}")
 
+    stage("input_unions")
     case_columns = union_list(
         [rk.case_column for rk in rendered_keys]
         + stage_rendered_components[RenderingPipelineStage.CASE_SOLID]
@@ -230,22 +484,6 @@ def render_case(
     for screw_hole in rendered_screw_holes:
         result.switch_holes = result.switch_holes.union(screw_hole.hole)
 
-    switch_debug = None
-    for rendered_key in rendered_keys:
-        if rendered_key.debug:
-            if switch_debug:
-                switch_debug = switch_debug.union(rendered_key.debug)
-            else:
-                switch_debug = rendered_key.debug
-
-    screw_hole_debug = None
-    for rendered_screw_hole in rendered_screw_holes:
-        if rendered_screw_hole.debug:
-            if screw_hole_debug:
-                screw_hole_debug = screw_hole_debug.union(rendered_screw_hole.debug)
-            else:
-                screw_hole_debug = rendered_screw_hole.debug
-
     if rendered_patches:
         result.patches = union_list(rendered_patches)
 
@@ -255,6 +493,7 @@ def render_case(
     if case_extras:
         result.case_extras = union_list(case_extras)
 
+    stage("case_before_fillet")
     # Create case
 
     case = case_columns.clean()
@@ -271,7 +510,11 @@ def render_case(
     case = case.cut(keycap_clearances).clean()
 
     result.case_before_fillet = case
+    # Don't keep the case alive after the field is released
+    del case
+    release("patches", "cuts", "case_extras")
 
+    stage("top_before_fillet")
     result.top_before_fillet = result.case_before_fillet.copyWorkplane(
         cq.Workplane("XY").workplane(offset=-case_config.case_thickness)
     ).split(keepTop=True)
@@ -285,7 +528,9 @@ def render_case(
         .extrude(case_config.clearance_height * 2)
         .translate((0, 0, -case_config.clearance_height))
     )
+    release("top_before_fillet")
 
+    stage("case_after_fillet")
     if case_config.side_fillet and not debug:
         try:
             result.case_after_fillet = (
@@ -301,6 +546,7 @@ def render_case(
     else:
         result.case_after_fillet = result.case_before_fillet
 
+    stage("case_after_shell")
     if not debug:
         try:
             result.case_after_shell = result.case_after_fillet.shell(
@@ -322,10 +568,13 @@ def render_case(
                 "troubleshoot, pass in the result param and inspect result.case_after_shell."
             )
             raise
+
+        release("case_after_shell")
     else:
         result.case_after_shell = None
         result.shell_cut = None
 
+    stage("top")
     result.top = result.case_after_fillet.copyWorkplane(
         cq.Workplane("XY").workplane(offset=-case_config.case_thickness)
     ).split(keepTop=True)
@@ -341,12 +590,15 @@ def render_case(
             )
             raise
 
+    stage("palm_rests")
     result.palm_rests_before_case_clearance = None
     result.palm_rests_before_fillet = None
     result.palm_rests_after_fillet = None
     result.palm_rests = None
     result.case_with_rests_before_fillet = result.case_before_fillet
 
+    connector_template = None
+    connector_locations = []
     connector_cutouts = []
     case_connector_supports = []
     if rendered_palm_rests:
@@ -514,66 +766,74 @@ def render_case(
                         connector_cutouts.append(connector_cutout)
                         case_connector_supports.append(case_connector_support)
 
-                        if render_standard_components:
-                            connector = position(connector_template, connector_location)
-                            standard_components.append(connector)
+                        connector_locations.append(connector_location)
 
                 result.palm_rests.append(final_palm_rest)
 
+    release(
+        "case_before_fillet",
+        "vertical_clearance_before_fillet",
+        "case_after_fillet",
+        "palm_rests_before_case_clearance",
+        "palm_rests_before_fillet",
+        "palm_rests_after_side_fillet",
+    )
+
+    stage("bottom_before_fillet")
     result.bottom_before_fillet = result.case_with_rests_before_fillet.copyWorkplane(
         cq.Workplane("XY").workplane(offset=-case_config.case_thickness)
     ).split(keepBottom=True)
+    release("case_with_rests_before_fillet")
 
+    stage("bottom")
     if case_config.side_fillet and not debug:
         result.bottom = (
             result.bottom_before_fillet.edges("|Z").fillet(case_config.side_fillet).clean()
         )
     else:
         result.bottom = result.bottom_before_fillet
+    release("bottom_before_fillet")
 
     # Add back the palm rests to get the top which was cut above
     if result.palm_rests_after_fillet and not case_config.detachable_palm_rests:
         result.bottom = result.bottom.union(result.palm_rests_after_fillet[0])
+    release("palm_rests_after_fillet")
 
+    stage("top_switch_holes")
     result.top = result.top.cut(result.switch_holes).clean()
 
+    stage("debug")
     # Debugs
-    if switch_debug:
-        result.debug = result.debug.union(switch_debug) if result.debug else switch_debug
-
-    if screw_hole_debug:
-        result.debug = result.debug.union(screw_hole_debug) if result.debug else screw_hole_debug
-
-    if rendered_controller and rendered_controller.debug:
-        result.debug = (
-            result.debug.union(rendered_controller.debug)
-            if result.debug
-            else rendered_controller.debug
-        )
-
-    if rendered_trrs_jack and rendered_trrs_jack.debug:
-        result.debug = (
-            result.debug.union(rendered_trrs_jack.debug)
-            if result.debug
-            else rendered_trrs_jack.debug
-        )
+    debug_items = [
+        rendered.debug
+        for rendered in (rendered_controller, rendered_trrs_jack)
+        if rendered and rendered.debug
+    ] + stage_rendered_components[RenderingPipelineStage.DEBUG]
+
+    # Only captures the inputs, so the debug shapes don't keep any rendering steps alive
+    result.debug = Lazy(
+        functools.partial(render_case_debug, keys, screw_holes or [], debug_items, config)
+    )
 
-    debug_items = union_list(stage_rendered_components[RenderingPipelineStage.DEBUG])
-    if debug_items:
-        result.debug = result.debug.union(debug_items) if result.debug else debug_items
+    if debug:
+        # Render right away
+        result.debug
 
+    stage("bottom_cuts_and_additions")
     cuts = union_list(stage_rendered_components[RenderingPipelineStage.BOTTOM_CUTS])
     if cuts:
         result.bottom = result.bottom.cut(cuts)
 
     if result.shell_cut:
         result.bottom = result.bottom.cut(result.shell_cut)
+    release("shell_cut")
 
     if result.controller_hole:
         result.bottom = result.bottom.cut(result.controller_hole)
 
     if result.trrs_jack_hole:
         result.bottom = result.bottom.cut(result.trrs_jack_hole)
+    release("controller_hole", "trrs_jack_hole")
 
     for connector_cut in connector_cutouts:
         result.bottom = result.bottom.cut(connector_cut)
@@ -582,12 +842,14 @@ def render_case(
         result.bottom = result.bottom.union(connector_support)
 
     # Add back screw hole rims
+    result.screw_hole_rims_bottom = None
     if result.screw_hole_rims:
         result.screw_hole_rims_bottom = result.screw_hole_rims.copyWorkplane(
             cq.Workplane("XY").workplane(offset=-case_config.case_thickness)
         ).split(keepBottom=True)
 
         result.bottom = result.bottom.union(result.screw_hole_rims_bottom)
+    release("screw_hole_rims", "screw_hole_rims_bottom")
 
     additions = union_list(stage_rendered_components[RenderingPipelineStage.AFTER_SHELL_ADDITIONS])
     if additions:
@@ -598,10 +860,12 @@ def render_case(
 
     if result.trrs_jack_rail:
         result.bottom = result.bottom.union(result.trrs_jack_rail)
+    release("controller_rail", "trrs_jack_rail")
 
     # This also contains screw holes
     result.bottom = result.bottom.cut(result.switch_holes).clean()
 
+    stage("texts")
     if rendered_texts:
         top_texts = []
         for text in rendered_texts:
@@ -631,7 +895,19 @@ def render_case(
 
             result.top = result.top.union(top_text_union)
 
+    release("switch_holes")
+
+    stage("standard_components")
     if render_standard_components:
+        # Each component is rendered once and placed at all its locations
+        standard_component_placements = []
+
+        # Add palm rest connectors
+        if connector_locations:
+            standard_component_placements.append(
+                ComponentPlacements("connector", connector_template, connector_locations)
+            )
+
         # Add switch holders
         if case_config.use_switch_holders:
             switch_holder_template = render_switch_holder(
@@ -642,15 +918,19 @@ def render_case(
 
             switch_holder_config = config.get_switch_holder_config()
 
-            for key in keys:
-                switch_holder_lr = LocationOrientation(
+            switch_holder_lrs = [
+                LocationOrientation(
                     x=key.x,
                     y=key.y,
                     z=key.z - case_config.case_thickness - switch_holder_config.holder_height,
                     rotate=key.rotate,
                     rotate_around=key.rotate_around,
                 )
-                standard_components.append(position(switch_holder_template, switch_holder_lr))
+                for key in keys
+            ]
+            standard_component_placements.append(
+                ComponentPlacements("switch_holder", switch_holder_template, switch_holder_lrs)
+            )
 
         # Add controller holder
         if controller:
@@ -668,7 +948,9 @@ def render_case(
                 rotate_around=controller.rotate_around,
             )
 
-            standard_components.append(position(controller_holder, controller_lr))
+            standard_component_placements.append(
+                ComponentPlacements("controller_holder", controller_holder, [controller_lr])
+            )
 
         # Add TRRS jack holder
         if trrs_jack:
@@ -686,16 +968,110 @@ def render_case(
                 rotate_around=trrs_jack.rotate_around,
             )
 
-            standard_components.append(position(trrs_jack_holder, trrs_jack_lr))
+            standard_component_placements.append(
+                ComponentPlacements("trrs_jack_holder", trrs_jack_holder, [trrs_jack_lr])
+            )
 
         for component in result.separate_components:
-            standard_components.append(component.render_in_place_func())
+            if component.render_template_func:
+                standard_component_placements.append(
+                    ComponentPlacements(
+                        component.name, component.render_template_func(), [component.location]
+                    )
+                )
+            else:
+                standard_component_placements.append(
+                    ComponentPlacements(
+                        component.name,
+                        component.render_in_place_func(),
+                        [LocationOrientation(x=0, y=0)],
+                    )
+                )
 
-        result.standard_components = union_list(standard_components)
+        result.standard_component_placements = standard_component_placements
+
+        if union_standard_components:
+            result.standard_components = union_list(
+                [
+                    position(placements.shape, location)
+                    for placements in standard_component_placements
+                    for location in placements.locations
+                ]
+            )
+
+    measure(METRIC_FIELDS)
+    # The final parts changed since they were first measured
+    measure(["top", "bottom", "palm_rests"], remeasure=True)
+
+    if retain != Retain.ALL:
+        release_intermediates(result, INTERMEDIATE_FIELDS)
 
     return result
 
 
+def record_metrics(
+    result: RenderCaseResult,
+    names: List[str],
+    key_count: int = 0,
+    thresholds: Optional[ComplexityThresholds] = None,
+    remeasure: bool = False,
+):
+    """
+    Measure RenderCaseResult fields into RenderCaseResult.metrics and print any complexity warnings. Fields already
+    measured are skipped unless remeasure is set.
+    """
+    if result.metrics is None:
+        result.metrics = {}
+
+    with profile_stage("shape_metrics"):
+        for name in names:
+            value = getattr(result, name)
+            if value is None or (name in result.metrics and not remeasure):
+                continue
+
+            metrics = get_shape_metrics(value)
+            if not metrics:
+                continue
+
+            result.metrics[name] = metrics
+            for warning in check_metrics(name, metrics, result.metrics, key_count, thresholds):
+                print(f"Complexity warning: {warning}")
+
+
+def release_intermediates(result: RenderCaseResult, names: Optional[List[str]] = None):
+    """
+    Release intermediate shapes from a RenderCaseResult, e.g. after troubleshooting a render done with
+    Retain.ON_FAILURE or Retain.ALL.
+
+    :param result: The RenderCaseResult.
+    :param names: The fields to release. Optional, defaults to all intermediate fields (INTERMEDIATE_FIELDS).
+    """
+    for name in names or INTERMEDIATE_FIELDS:
+        if name not in INTERMEDIATE_FIELDS:
+            raise Exception(f"{name} is not an intermediate RenderCaseResult field")
+
+        setattr(result, name, None)
+
+
+def render_case_debug(
+    keys: List[Key], screw_holes: List[ScrewHole], debug_items: List[Any], config: Config
+):
+    """
+    Render the RenderCaseResult.debug shapes: keycap outlines above the keys, rim outlines above the screw holes and
+    any other debug items (e.g. from components), unioned.
+    """
+    key_config = config.get_key_config()
+
+    return union_list(
+        [render_key_debug(key, key_config) for key in keys]
+        + [
+            render_screw_hole_debug(screw_hole, config.screw_hole_config, config.case_config)
+            for screw_hole in screw_holes
+        ]
+        + debug_items
+    )
+
+
 def get_y_and_angle_at_x_intersection(obj, x, highest_y=True):
     # Y intersect
     intersection_y = get_y_at_x_intersection(obj, x, highest_y)
@@ -724,20 +1100,42 @@ def get_y_at_x_intersection(obj, x, highest_y=True):
     return vertices.vals()[0].Y
 
 
-def export_case_to_stl(result: RenderCaseResult):
-    cq.exporters.export(result.top, "keyboard_top.stl")
-    cq.exporters.export(result.bottom, "keyboard_bottom.stl")
+def get_case_components(result: RenderCaseResult) -> List[ComponentPlacements]:
+    """
+    Get the case parts and, if rendered, the standard components in place, as ComponentPlacements.
+    """
+    components = [
+        ComponentPlacements("keyboard_top", result.top, [IDENTITY_LOCATION]),
+        ComponentPlacements("keyboard_bottom", result.bottom, [IDENTITY_LOCATION]),
+    ]
+
+    for index, palm_rest in enumerate(result.palm_rests or []):
+        components.append(ComponentPlacements(f"palm_rest_{index}", palm_rest, [IDENTITY_LOCATION]))
+
+    components.extend(result.standard_component_placements or [])
+
+    return components
+
+
+def export_case(result: RenderCaseResult, file_format: str = "stl", output: OutputTarget = None):
+    output = get_output(output)
+
+    export_part(result.top, "keyboard_top", file_format, output)
+    export_part(result.bottom, "keyboard_bottom", file_format, output)
     if result.palm_rests:
         if len(result.palm_rests) == 1:
-            cq.exporters.export(result.palm_rests[0], f"palm_rest.stl")
+            export_part(result.palm_rests[0], "palm_rest", file_format, output)
         else:
             for index, palm_rest in enumerate(result.palm_rests):
-                cq.exporters.export(palm_rest, f"palm_rest_{index}.stl")
+                export_part(palm_rest, f"palm_rest_{index}", file_format, output)
+
+
+def export_case_to_stl(result: RenderCaseResult, output: OutputTarget = None):
+    export_case(result, "stl", output)
 
 
-def export_case_to_step(result: RenderCaseResult):
-    cq.exporters.export(result.top, "keyboard_top.step")
-    cq.exporters.export(result.bottom, "keyboard_bottom.step")
+def export_case_to_step(result: RenderCaseResult, output: OutputTarget = None):
+    export_case(result, "step", output)
 
 
 def move_top(top):
@@ -1,9 +1,12 @@
 import cadquery as cq
 
 from .config import Config
+from .exporting import OutputTarget, export_part
+from .profiling import profiled
 from .utils import grow_yz
 
 
+@profiled("connector")
 def render_connector(config: Config = Config()):
     conn_config = config.connector_config
     wp = cq.Workplane("XY")
@@ -37,6 +40,7 @@ def render_connector(config: Config = Config()):
     return connector
 
 
+@profiled("connector_cutout")
 def render_connector_cutout(config: Config = Config()):
     conn_config = config.connector_config
     wp = cq.Workplane("XY")
@@ -73,6 +77,7 @@ def render_connector_cutout(config: Config = Config()):
     return connector_cutout
 
 
+@profiled("case_connector_support")
 def render_case_connector_support(config: Config = Config()):
     connector_cutout = render_connector_cutout(config)
     conn_config = config.connector_config
@@ -102,9 +107,13 @@ def render_case_connector_support(config: Config = Config()):
     )
 
 
-def export_connector_to_stl(connector):
-    cq.exporters.export(connector, "connector.stl")
+def export_connector(connector, file_format: str = "stl", output: OutputTarget = None):
+    export_part(connector, "connector", file_format, output)
 
 
-def export_connector_to_step(connector):
-    cq.exporters.export(connector, "connector.step")
+def export_connector_to_stl(connector, output: OutputTarget = None):
+    export_connector(connector, "stl", output)
+
+
+def export_connector_to_step(connector, output: OutputTarget = None):
+    export_connector(connector, "step", output)
@@ -2,6 +2,8 @@ import cadquery as cq
 
 from .classes import Controller, RenderedSideHolder
 from .config import CaseConfig, Config, ControllerConfig
+from .exporting import OutputTarget, export_part
+from .profiling import profiled
 from .renderer_side_holder import render_side_case_hole_rail, render_side_mount_bracket
 from .utils import grow_yz
 
@@ -14,6 +16,7 @@ def render_controller_case_cutout_and_support(
     return render_side_case_hole_rail(controller, config, case_config)
 
 
+@profiled("controller_holder")
 def render_controller_holder(config: Config = Config()):
     c_config = config.controller_config
 
@@ -126,9 +129,15 @@ def render_controller_holder(config: Config = Config()):
     return holder
 
 
-def export_controller_holder_to_stl(controller_holder):
-    cq.exporters.export(controller_holder, "controller_holder.stl")
+def export_controller_holder(
+    controller_holder, file_format: str = "stl", output: OutputTarget = None
+):
+    export_part(controller_holder, "controller_holder", file_format, output)
 
 
-def export_controller_holder_to_step(controller_holder):
-    cq.exporters.export(controller_holder, "controller_holder.step")
+def export_controller_holder_to_stl(controller_holder, output: OutputTarget = None):
+    export_controller_holder(controller_holder, "stl", output)
+
+
+def export_controller_holder_to_step(controller_holder, output: OutputTarget = None):
+    export_controller_holder(controller_holder, "step", output)
@@ -72,21 +72,28 @@ def render_key(
         switch_hole = switch_hole.rotate((0, 0, 0), (0, 0, 1), 180)
     switch_hole = position(switch_hole, key)
 
-    # Debug: keycap outline in the air
-    keycap_width = key.keycap_width or config.keycap_width
-    keycap_depth = key.keycap_depth or config.keycap_depth
-    debug = (
-        base_wp.workplane(offset=5)
-        .rect(keycap_width, keycap_depth)
-        .rect(keycap_width - 1, keycap_depth - 1)
-        .extrude(1)
-    )
-
     return RenderedKey(
         case_column=case_column,
         case_clearance=case_clearance,
         switch_rim=switch_rim,
         keycap_clearance=keycap_clearance,
         switch_hole=switch_hole,
-        debug=debug,
+        # Rendered separately by render_key_debug(), only when the debug shapes are needed
+        debug=None,
+    )
+
+
+def render_key_debug(key: Key, config: MXKeyConfig):
+    """
+    Render the debug outline of a key's keycap, floating in the air above the key.
+    """
+    keycap_width = key.keycap_width or config.keycap_width
+    keycap_depth = key.keycap_depth or config.keycap_depth
+
+    return (
+        create_workplane(key)
+        .workplane(offset=5)
+        .rect(keycap_width, keycap_depth)
+        .rect(keycap_width - 1, keycap_depth - 1)
+        .extrude(1)
     )
@@ -7,9 +7,7 @@ from .config import CaseConfig, ScrewHoleConfig
 def render_screw_hole(
     screw_hole: ScrewHole, config: ScrewHoleConfig, case_config: CaseConfig
 ) -> RenderedScrewHole:
-    base_wp = cq.Workplane("XY").transformed(
-        offset=(screw_hole.x, screw_hole.y, -case_config.case_base_height)
-    )
+    base_wp = _get_base_workplane(screw_hole, case_config)
 
     rim = base_wp.circle(config.screw_rim_radius).extrude(
         screw_hole.z + case_config.case_base_height
@@ -48,12 +46,26 @@ def render_screw_hole(
         .extrude(case_config.clearance_height)
     )
 
-    # Debug: rim outline in the air
-    debug = (
-        base_wp.workplane(offset=case_config.case_base_height + 5)
+    # The debug outline is rendered separately by render_screw_hole_debug(), only when needed
+    return RenderedScrewHole(rim, hole, None)
+
+
+def _get_base_workplane(screw_hole: ScrewHole, case_config: CaseConfig):
+    return cq.Workplane("XY").transformed(
+        offset=(screw_hole.x, screw_hole.y, -case_config.case_base_height)
+    )
+
+
+def render_screw_hole_debug(
+    screw_hole: ScrewHole, config: ScrewHoleConfig, case_config: CaseConfig
+):
+    """
+    Render the debug outline of a screw hole's rim, floating in the air above the screw hole.
+    """
+    return (
+        _get_base_workplane(screw_hole, case_config)
+        .workplane(offset=case_config.case_base_height + 5)
         .circle(config.screw_rim_radius)
         .circle(config.screw_rim_radius - 0.5)
         .extrude(1)
     )
-
-    return RenderedScrewHole(rim, hole, debug)
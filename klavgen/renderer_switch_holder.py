@@ -4,6 +4,8 @@ import cadquery as cq
 
 from .classes import RenderedSwitchHolder
 from .config import CaseConfig, Config, MXSwitchHolderConfig, SwitchType
+from .exporting import OutputTarget, export_part
+from .profiling import profiled
 from .renderer_kailh_choc_socket import draw_choc_socket
 from .renderer_kailh_mx_socket import draw_mx_socket
 from .utils import grow_yz, grow_z, union_list
@@ -97,6 +99,7 @@ def render_choc_switch_holder(
     )
 
 
+@profiled("switch_holder")
 def _render_switch_holder(
     socket,
     cf: MXSwitchHolderConfig,
@@ -446,6 +449,7 @@ def _render_switch_holder(
     return RenderedSwitchHolder(holder, socket)
 
 
+@profiled("sweep_socket")
 def sweep_socket(socket, cf: MXSwitchHolderConfig):
     socket_cf = cf.kailh_socket_config
 
@@ -504,6 +508,7 @@ def sweep_socket(socket, cf: MXSwitchHolderConfig):
     return socket_swept
 
 
+@profiled("draw_bottom_angled_cutouts")
 def draw_bottom_angled_cutouts(cf: MXSwitchHolderConfig):
     socket_cf = cf.kailh_socket_config
 
@@ -642,6 +647,7 @@ def draw_angled_side_cutout(
     return angled_cutout
 
 
+@profiled("draw_top_lips")
 def draw_top_lips(cf: MXSwitchHolderConfig, case_config: CaseConfig):
     # Top side lips
 
@@ -716,6 +722,7 @@ def draw_top_lips(cf: MXSwitchHolderConfig, case_config: CaseConfig):
     return lips
 
 
+@profiled("render_col_wire_back_wrapper")
 def render_col_wire_back_wrapper(cf: MXSwitchHolderConfig):
     wp = cq.Workplane("XY")
 
@@ -813,6 +820,7 @@ def render_col_wire_back_wrapper(cf: MXSwitchHolderConfig):
     return head_extra_depth, cutouts
 
 
+@profiled("render_diode_holder_cutout")
 def render_diode_holder_cutout(cf):
     wp = cq.Workplane("XY")
     wp_xz = cq.Workplane("XZ")
@@ -972,9 +980,15 @@ def render_diode_holder_cutout(cf):
     return diode_holder_cutout
 
 
-def export_switch_holder_to_stl(result: RenderedSwitchHolder):
-    cq.exporters.export(result.switch_holder, "switch_holder.stl")
+def export_switch_holder(
+    result: RenderedSwitchHolder, file_format: str = "stl", output: OutputTarget = None
+):
+    export_part(result.switch_holder, "switch_holder", file_format, output)
+
+
+def export_switch_holder_to_stl(result: RenderedSwitchHolder, output: OutputTarget = None):
+    export_switch_holder(result, "stl", output)
 
 
-def export_switch_holder_to_step(result: RenderedSwitchHolder):
-    cq.exporters.export(result.switch_holder, "switch_holder.step")
+def export_switch_holder_to_step(result: RenderedSwitchHolder, output: OutputTarget = None):
+    export_switch_holder(result, "step", output)
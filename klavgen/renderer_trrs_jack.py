@@ -2,6 +2,8 @@ import cadquery as cq
 
 from .classes import RenderedSideHolder, TrrsJack
 from .config import CaseConfig, TrrsJackConfig
+from .exporting import OutputTarget, export_part
+from .profiling import profiled
 from .renderer_side_holder import render_side_case_hole_rail
 from .utils import grow_yz
 
@@ -14,6 +16,7 @@ def render_trrs_jack_case_cutout_and_support(
     return render_side_case_hole_rail(trrs_jack, config, case_config)
 
 
+@profiled("trrs_jack_holder")
 def render_trrs_jack_holder(config: TrrsJackConfig = TrrsJackConfig()):
     wp = cq.Workplane("XY")
 
@@ -172,9 +175,15 @@ def render_trrs_jack_holder(config: TrrsJackConfig = TrrsJackConfig()):
     return holder
 
 
-def export_trrs_jack_holder_to_stl(trrs_jack_holder):
-    cq.exporters.export(trrs_jack_holder, "trrs_jack_holder.stl")
+def export_trrs_jack_holder(
+    trrs_jack_holder, file_format: str = "stl", output: OutputTarget = None
+):
+    export_part(trrs_jack_holder, "trrs_jack_holder", file_format, output)
 
 
-def export_trrs_jack_holder_to_step(trrs_jack_holder):
-    cq.exporters.export(trrs_jack_holder, "trrs_jack_holder.step")
+def export_trrs_jack_holder_to_stl(trrs_jack_holder, output: OutputTarget = None):
+    export_trrs_jack_holder(trrs_jack_holder, "stl", output)
+
+
+def export_trrs_jack_holder_to_step(trrs_jack_holder, output: OutputTarget = None):
+    export_trrs_jack_holder(trrs_jack_holder, "step", output)
@@ -2,6 +2,8 @@ import cadquery as cq
 
 from .classes import LocationOrientation, USBCJack
 from .config import Config, SideHolderConfig, USBCJackConfig
+from .exporting import OutputTarget, export_part
+from .profiling import profiled
 from .renderer_side_holder import render_side_case_hole_rail, render_side_mount_bracket
 from .rendering import (
     RENDERERS,
@@ -16,18 +18,19 @@ from .utils import grow_yz, position
 def render_usbc_jack(usbc_jack: USBCJack, config: Config) -> RenderResult:
     result = render_side_case_hole_rail(usbc_jack, config.usbc_jack_config, config.case_config)
 
-    def render_in_place():
-        usbc_jack_holder = render_usbc_jack_holder(config, orient_for_printing=False)
-
-        usbc_jack_lr = LocationOrientation(
-            x=usbc_jack.x,
-            y=usbc_jack.y,
-            z=usbc_jack.z - config.case_config.case_base_height + config.case_config.case_thickness,
-            rotate=usbc_jack.rotate,
-            rotate_around=usbc_jack.rotate_around,
-        )
+    usbc_jack_lr = LocationOrientation(
+        x=usbc_jack.x,
+        y=usbc_jack.y,
+        z=usbc_jack.z - config.case_config.case_base_height + config.case_config.case_thickness,
+        rotate=usbc_jack.rotate,
+        rotate_around=usbc_jack.rotate_around,
+    )
 
-        return position(usbc_jack_holder, usbc_jack_lr)
+    def render_in_place_template():
+        return render_usbc_jack_holder(config, orient_for_printing=False)
+
+    def render_in_place():
+        return position(render_in_place_template(), usbc_jack_lr)
 
     return RenderResult(
         name=usbc_jack.name or "usbc_jack",
@@ -42,6 +45,8 @@ def render_usbc_jack(usbc_jack: USBCJack, config: Config) -> RenderResult:
                 name="usbc_jack_holder",
                 render_func=lambda: render_usbc_jack_holder(config, orient_for_printing=True),
                 render_in_place_func=render_in_place,
+                render_template_func=render_in_place_template,
+                location=usbc_jack_lr,
             )
         ],
     )
@@ -50,6 +55,7 @@ def render_usbc_jack(usbc_jack: USBCJack, config: Config) -> RenderResult:
 RENDERERS.set_renderer("usbc_jack", render_usbc_jack)
 
 
+@profiled("usbc_jack_holder")
 def render_usbc_jack_holder(config: Config = Config(), orient_for_printing=True):
     usbc_jack_config = config.usbc_jack_config
 
@@ -127,9 +133,15 @@ def render_usbc_jack_holder(config: Config = Config(), orient_for_printing=True)
     return holder
 
 
-def export_usbc_jack_holder_to_stl(usbc_jack_holder):
-    cq.exporters.export(usbc_jack_holder, "usbc_jack_holder.stl")
+def export_usbc_jack_holder(
+    usbc_jack_holder, file_format: str = "stl", output: OutputTarget = None
+):
+    export_part(usbc_jack_holder, "usbc_jack_holder", file_format, output)
+
+
+def export_usbc_jack_holder_to_stl(usbc_jack_holder, output: OutputTarget = None):
+    export_usbc_jack_holder(usbc_jack_holder, "stl", output)
 
 
-def export_usbc_jack_holder_to_step(usbc_jack_holder):
-    cq.exporters.export(usbc_jack_holder, "usbc_jack_holder.step")
+def export_usbc_jack_holder_to_step(usbc_jack_holder, output: OutputTarget = None):
+    export_usbc_jack_holder(usbc_jack_holder, "step", output)
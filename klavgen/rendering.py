@@ -2,9 +2,8 @@ from dataclasses import dataclass
 from enum import Enum
 from typing import Any, Callable, Dict, List, Optional
 
-import cadquery as cq
-
 from .config import Config
+from .exporting import OutputTarget, export_part
 
 
 class RenderingPipelineStage(Enum):
@@ -31,13 +30,20 @@ class SeparateComponentRender:
     name: str
     render_func: Callable
     render_in_place_func: Callable
+    # Optional alternative to render_in_place_func: the component rendered at the origin and the LocationOrientation
+    # to place it at, which allows exporters to share the shape between placements
+    render_template_func: Optional[Callable] = None
+    location: Optional[Any] = None
 
-    def render_and_export_to_stl(self):
+    def render_and_export(self, file_format: str = "stl", output: OutputTarget = None):
         render = self.render_func()
-        cq.exporters.export(render, f"{self.name}.stl")
+        export_part(render, self.name, file_format, output)
 
         return render
 
+    def render_and_export_to_stl(self, output: OutputTarget = None):
+        return self.render_and_export("stl", output)
+
 
 @dataclass
 class RenderResult:
@@ -0,0 +1,269 @@
+import io
+import json
+import os
+import pickle
+import zipfile
+from dataclasses import MISSING, fields
+from typing import Any, BinaryIO, Dict, List, Optional, Union
+
+import cadquery as cq
+from OCP.BRep import BRep_Builder
+from OCP.BRepTools import BRepTools
+from OCP.TopoDS import TopoDS_Shape
+from OCP.TopTools import TopTools_FormatVersion_CURRENT
+
+from .keyboard import RenderKeyboardResult
+from .renderer_case import RenderCaseResult
+from .utils import Lazy
+
+BUNDLE_FORMAT_VERSION = 1
+
+RESULT_TYPES = {
+    "RenderCaseResult": RenderCaseResult,
+    "RenderKeyboardResult": RenderKeyboardResult,
+}
+
+
+class _ShapePickler(pickle.Pickler):
+    """
+    Pickles field values, storing CadQuery objects as references to BREP entries written once per bundle.
+    """
+
+    def __init__(self, file, bundle_writer: "_BundleWriter"):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.bundle_writer = bundle_writer
+
+    def persistent_id(self, obj):
+        if isinstance(obj, cq.Shape):
+            return "shape", self.bundle_writer.add_shape(obj)
+
+        if isinstance(obj, cq.Workplane):
+            shapes = [o for o in obj.vals() if isinstance(o, cq.Shape)]
+            return "workplane", [self.bundle_writer.add_shape(shape) for shape in shapes]
+
+        return None
+
+
+class _BundleWriter:
+    def __init__(self, archive: zipfile.ZipFile):
+        self.archive = archive
+        # Entry name by id() of the shape, so shapes shared between fields are stored once
+        self.shape_entries: Dict[int, str] = {}
+        self._shapes = []
+
+    def add_shape(self, shape: cq.Shape) -> str:
+        if id(shape) not in self.shape_entries:
+            entry = f"shapes/{len(self.shape_entries)}.brep"
+
+            stream = io.BytesIO()
+            # Text BREP without triangulation: the binary format fails to read back some boolean results
+            BRepTools.Write_s(shape.wrapped, stream, False, False, TopTools_FormatVersion_CURRENT)
+            self.archive.writestr(entry, stream.getvalue())
+
+            self.shape_entries[id(shape)] = entry
+            # Keep the shape alive so its id() is not reused while writing
+            self._shapes.append(shape)
+
+        return self.shape_entries[id(shape)]
+
+    def write_result(self, result: Any, prefix: str = ""):
+        metadata = {
+            "format": BUNDLE_FORMAT_VERSION,
+            "type": type(result).__name__,
+            "fields": {},
+            "input_fingerprints": getattr(result, "input_fingerprints", None),
+        }
+
+        for field in fields(result):
+            # Read from __dict__, so LazyFields that weren't computed (e.g. RenderCaseResult.debug) are stored as
+            # their Lazy instead of being computed
+            value = (
+                result.__dict__[field.name]
+                if field.name in result.__dict__
+                else getattr(result, field.name)
+            )
+
+            # Compared by name, since klavgen's module reloading can leave more than one copy of the classes
+            if type(value).__name__ in RESULT_TYPES:
+                self.write_result(value, f"{prefix}{field.name}/")
+                metadata["fields"][field.name] = {"kind": "result"}
+                continue
+
+            stream = io.BytesIO()
+            try:
+                _ShapePickler(stream, self).dump(value)
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                # E.g. SeparateComponentRender holds lambdas
+                metadata["fields"][field.name] = {"kind": "skipped", "reason": str(e)}
+                continue
+
+            self.archive.writestr(f"{prefix}fields/{field.name}.pickle", stream.getvalue())
+            metadata["fields"][field.name] = {
+                "kind": "lazy" if isinstance(value, Lazy) else "value"
+            }
+
+        self.archive.writestr(f"{prefix}metadata.json", json.dumps(metadata, indent=2))
+
+
+def save_result(
+    result: Union[RenderCaseResult, RenderKeyboardResult],
+    file: Union[str, os.PathLike, BinaryIO],
+):
+    """
+    Save a RenderCaseResult or RenderKeyboardResult to a bundle: a ZIP with a BREP per shape (stored once even
+    if several fields share it), a pickle per field and a metadata.json with the input fingerprints. Fields that can't
+    be pickled (separate_components, which hold functions) are skipped and listed in the metadata. Lazy fields that
+    weren't computed yet (RenderCaseResult.debug) are saved uncomputed, and computed when loaded.
+
+    :param result: The result to save.
+    :param file: A path or a writable binary stream.
+    """
+    with zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        _BundleWriter(archive).write_result(result)
+
+
+class _ShapeUnpickler(pickle.Unpickler):
+    def __init__(self, file, bundle: "ResultBundle"):
+        super().__init__(file)
+        self.bundle = bundle
+
+    def persistent_load(self, pid):
+        kind, reference = pid
+
+        if kind == "shape":
+            return self.bundle.load_shape(reference)
+
+        if kind == "workplane":
+            return cq.Workplane("XY").newObject(
+                [self.bundle.load_shape(entry) for entry in reference]
+            )
+
+        raise pickle.UnpicklingError(f"Unknown persistent id {kind}")
+
+
+class ResultBundle:
+    """
+    A result bundle written by save_result(), read lazily: fields are only deserialized when accessed (e.g.
+    bundle.top or bundle.get("top")), and each shape is only read once. Use load() to get the full result object.
+
+    Loading runs pickle, so only open bundles from trusted sources.
+
+    :param file: A path or a readable, seekable binary stream.
+    """
+
+    def __init__(self, file: Union[str, os.PathLike, BinaryIO], prefix: str = "", _shared=None):
+        if _shared:
+            self.archive, self._shapes = _shared
+        else:
+            self.archive = zipfile.ZipFile(file, "r")
+            self._shapes: Dict[str, cq.Shape] = {}
+
+        self.prefix = prefix
+        self.metadata = json.loads(self.archive.read(f"{prefix}metadata.json"))
+
+        if self.metadata["format"] > BUNDLE_FORMAT_VERSION:
+            raise Exception(
+                f"Result bundle format {self.metadata['format']} is newer than the supported "
+                f"{BUNDLE_FORMAT_VERSION}"
+            )
+
+        self._values: Dict[str, Any] = {}
+
+    @property
+    def result_type(self):
+        return RESULT_TYPES[self.metadata["type"]]
+
+    @property
+    def input_fingerprints(self) -> Optional[Dict[str, str]]:
+        return self.metadata["input_fingerprints"]
+
+    def field_names(self) -> List[str]:
+        return list(self.metadata["fields"].keys())
+
+    def load_shape(self, entry: str) -> cq.Shape:
+        if entry not in self._shapes:
+            shape = TopoDS_Shape()
+            BRepTools.Read_s(shape, io.BytesIO(self.archive.read(entry)), BRep_Builder())
+            self._shapes[entry] = cq.Shape.cast(shape)
+
+        return self._shapes[entry]
+
+    def get(self, name: str) -> Any:
+        """
+        Load a single field. Skipped fields are returned as None, nested results as a ResultBundle, and lazy fields
+        are computed.
+        """
+        value = self._get_stored(name)
+        if isinstance(value, Lazy):
+            value = value.func()
+            self._values[name] = value
+
+        return value
+
+    def _get_stored(self, name: str) -> Any:
+        # The field as stored, with lazy fields still a Lazy
+        if name not in self._values:
+            kind = self.metadata["fields"][name]["kind"]
+
+            if kind == "result":
+                value = ResultBundle(
+                    None, f"{self.prefix}{name}/", _shared=(self.archive, self._shapes)
+                )
+            elif kind in ("value", "lazy"):
+                data = self.archive.read(f"{self.prefix}fields/{name}.pickle")
+                value = _ShapeUnpickler(io.BytesIO(data), self).load()
+            else:
+                value = None
+
+            self._values[name] = value
+
+        return self._values[name]
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_") or name not in self.metadata["fields"]:
+            raise AttributeError(name)
+
+        return self.get(name)
+
+    def load(self, names: Optional[List[str]] = None):
+        """
+        Build the result object, e.g. a RenderCaseResult.
+
+        :param names: Only load these fields and leave the rest at their defaults. Optional.
+        :return: The result object.
+        """
+        values = {}
+        for name in names or self.field_names():
+            # Lazy fields are passed on uncomputed, so they're only computed if the result's field is read
+            value = self._get_stored(name)
+            values[name] = value.load() if isinstance(value, ResultBundle) else value
+
+        # Fields without defaults (e.g. RenderKeyboardResult.top) are required, even when not loaded
+        for field in fields(self.result_type):
+            if field.name not in values and field.default is MISSING:
+                values[field.name] = None
+
+        return self.result_type(**values)
+
+    def close(self):
+        if not self.prefix:
+            self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def load_result(
+    file: Union[str, os.PathLike, BinaryIO], names: Optional[List[str]] = None
+) -> Union[RenderCaseResult, RenderKeyboardResult]:
+    """
+    Load a result saved with save_result(). Use ResultBundle directly to load fields lazily.
+
+    :param file: A path or a readable, seekable binary stream.
+    :param names: Only load these fields and leave the rest at their defaults. Optional.
+    """
+    with ResultBundle(file) as bundle:
+        return bundle.load(names)
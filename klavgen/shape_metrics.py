@@ -0,0 +1,211 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import cadquery as cq
+from OCP.BRep import BRep_Tool
+from OCP.BRepGProp import BRepGProp
+from OCP.GProp import GProp_GProps
+from OCP.ShapeAnalysis import ShapeAnalysis_ShapeTolerance
+from OCP.TopAbs import TopAbs_EDGE, TopAbs_FACE, TopAbs_SOLID, TopAbs_VERTEX
+from OCP.TopExp import TopExp
+from OCP.TopoDS import TopoDS
+from OCP.TopTools import TopTools_IndexedMapOfShape
+
+from .profiling import format_table
+
+
+@dataclass
+class ShapeMetrics:
+    solids: int
+    faces: int
+    edges: int
+    vertices: int
+    # The length of the shortest non-degenerate edge, None if there are no edges
+    smallest_edge: Optional[float]
+    # The smallest, average and largest tolerance of the vertices, edges and faces
+    min_tolerance: float
+    mean_tolerance: float
+    max_tolerance: float
+    # Complexity warnings, see check_metrics()
+    warnings: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ComplexityThresholds:
+    # Warn if a stage has more than this many times the faces of the stage it's made from
+    face_growth: float = 3.0
+    # Warn if the first case stage has more than this many faces per key
+    faces_per_key: float = 40.0
+    # Warn if a stage has an edge shorter than this (mm), typically a sliver from almost-coincident key tiles
+    smallest_edge: float = 0.01
+    # Warn if a stage has a tolerance larger than this (mm), which makes later booleans slow and unreliable
+    max_tolerance: float = 0.01
+
+
+# The RenderCaseResult field each stage is made from, to detect complexity jumps between stages
+PREVIOUS_STAGES = {
+    "top_before_fillet": "case_before_fillet",
+    "vertical_clearance_before_fillet": "top_before_fillet",
+    "case_after_fillet": "case_before_fillet",
+    "case_after_shell": "case_after_fillet",
+    "shell_cut": "case_after_fillet",
+    "top": "top_before_fillet",
+    "palm_rests_before_fillet": "palm_rests_before_case_clearance",
+    "palm_rests_after_side_fillet": "palm_rests_before_fillet",
+    "palm_rests_after_fillet": "palm_rests_after_side_fillet",
+    "palm_rests": "palm_rests_after_fillet",
+    "case_with_rests_before_fillet": "case_before_fillet",
+    "bottom_before_fillet": "case_with_rests_before_fillet",
+    "bottom": "bottom_before_fillet",
+}
+
+# The final parts get holes and cutouts added on purpose, so their face count is not compared to the stage before
+DETAILED_STAGES = {"top", "bottom", "palm_rests"}
+
+
+def _get_shapes(obj: Any) -> List[cq.Shape]:
+    if isinstance(obj, cq.Shape):
+        return [obj]
+
+    if isinstance(obj, cq.Workplane):
+        return [val for val in obj.vals() if isinstance(val, cq.Shape)]
+
+    if isinstance(obj, (list, tuple)):
+        return [shape for item in obj for shape in _get_shapes(item)]
+
+    return []
+
+
+def _map_shapes(shape, shape_type) -> TopTools_IndexedMapOfShape:
+    shape_map = TopTools_IndexedMapOfShape()
+    TopExp.MapShapes_s(shape, shape_type, shape_map)
+
+    return shape_map
+
+
+def get_shape_metrics(obj: Any) -> Optional[ShapeMetrics]:
+    """
+    Get the topology counts, smallest edge and tolerance summary of a Workplane, Shape or list of them.
+
+    :return: The ShapeMetrics, or None if obj holds no shapes.
+    """
+    shapes = _get_shapes(obj)
+    if not shapes:
+        return None
+
+    shape = shapes[0].wrapped if len(shapes) == 1 else cq.Compound.makeCompound(shapes).wrapped
+
+    edge_map = _map_shapes(shape, TopAbs_EDGE)
+    smallest_edge = None
+    props = GProp_GProps()
+    for index in range(1, edge_map.Extent() + 1):
+        edge = TopoDS.Edge_s(edge_map.FindKey(index))
+        if BRep_Tool.Degenerated_s(edge):
+            continue
+
+        BRepGProp.LinearProperties_s(edge, props)
+        length = props.Mass()
+        if smallest_edge is None or length < smallest_edge:
+            smallest_edge = length
+
+    tolerance = ShapeAnalysis_ShapeTolerance()
+
+    return ShapeMetrics(
+        solids=_map_shapes(shape, TopAbs_SOLID).Extent(),
+        faces=_map_shapes(shape, TopAbs_FACE).Extent(),
+        edges=edge_map.Extent(),
+        vertices=_map_shapes(shape, TopAbs_VERTEX).Extent(),
+        smallest_edge=smallest_edge,
+        min_tolerance=tolerance.Tolerance(shape, -1),
+        mean_tolerance=tolerance.Tolerance(shape, 0),
+        max_tolerance=tolerance.Tolerance(shape, 1),
+    )
+
+
+def check_metrics(
+    name: str,
+    metrics: ShapeMetrics,
+    all_metrics: Dict[str, ShapeMetrics],
+    key_count: int = 0,
+    thresholds: Optional[ComplexityThresholds] = None,
+) -> List[str]:
+    """
+    Check the metrics of a stage against thresholds and against the stage it's made from. Small edges and large
+    tolerances are only reported in the stage that introduces them, not in every stage made from it.
+
+    :param name: The stage (RenderCaseResult field) name.
+    :param metrics: The stage metrics.
+    :param all_metrics: The metrics of the stages so far, by name.
+    :param key_count: The number of keys, to check the face count of case_before_fillet. Optional.
+    :param thresholds: The thresholds. Optional.
+    :return: The warnings, also added to metrics.warnings.
+    """
+    thresholds = thresholds or ComplexityThresholds()
+    warnings = []
+
+    previous_name = PREVIOUS_STAGES.get(name)
+    previous = all_metrics.get(previous_name) if previous_name else None
+    if (
+        previous
+        and previous.faces
+        and name not in DETAILED_STAGES
+        and metrics.faces > previous.faces * thresholds.face_growth
+    ):
+        warnings.append(
+            f"{name} has {metrics.faces} faces, {metrics.faces / previous.faces:.1f}x the {previous.faces} of "
+            f"{previous_name}"
+        )
+
+    if (
+        name == "case_before_fillet"
+        and key_count
+        and metrics.faces > key_count * thresholds.faces_per_key
+    ):
+        warnings.append(
+            f"{name} has {metrics.faces} faces, {metrics.faces / key_count:.0f} per key, which usually means "
+            f"overlapping or almost-coincident key tiles"
+        )
+
+    if (
+        metrics.smallest_edge is not None
+        and metrics.smallest_edge < thresholds.smallest_edge
+        and (
+            not previous
+            or previous.smallest_edge is None
+            or metrics.smallest_edge < previous.smallest_edge
+        )
+    ):
+        warnings.append(
+            f"{name} has an edge of {metrics.smallest_edge:.2g} mm, likely a sliver from almost-coincident shapes"
+        )
+
+    if metrics.max_tolerance > thresholds.max_tolerance and (
+        not previous or metrics.max_tolerance > previous.max_tolerance
+    ):
+        warnings.append(f"{name} has a tolerance of {metrics.max_tolerance:.2g} mm")
+
+    metrics.warnings.extend(warnings)
+
+    return warnings
+
+
+def get_metrics_table(all_metrics: Dict[str, ShapeMetrics]) -> str:
+    """
+    Get a human-readable table with a row per stage.
+    """
+    header = ["Stage", "Solids", "Faces", "Edges", "Vertices", "Min edge", "Max tol", "Warnings"]
+    rows = [
+        [
+            name,
+            str(metrics.solids),
+            str(metrics.faces),
+            str(metrics.edges),
+            str(metrics.vertices),
+            "-" if metrics.smallest_edge is None else f"{metrics.smallest_edge:.3g}",
+            f"{metrics.max_tolerance:.2g}",
+            str(len(metrics.warnings)),
+        ]
+        for name, metrics in all_metrics.items()
+    ]
+
+    return format_table(header, rows)
@@ -0,0 +1,93 @@
+from typing import Any, Dict
+
+from .classes import Key, PalmRest, ScrewHole, Text
+from .config import CaseConfig, Config, SwitchType
+
+KEY_PITCH = 19.05
+
+
+def generate_layout(
+    key_count: int,
+    rows: int = 4,
+    row_stagger: float = 0.0,
+    thumb_keys: int = 0,
+    z_step: float = 0.0,
+    palm_rest: bool = False,
+    screw_holes: bool = False,
+    text: bool = False,
+    side_fillet: bool = False,
+    choc: bool = False,
+    standard_components: bool = False,
+) -> Dict[str, Any]:
+    """
+    Generate a parametric layout, e.g. for benchmarks or to calibrate the cost model (see cost_model.py).
+
+    :param key_count: The total number of keys, including thumb keys. The others are laid out in a grid of rows rows.
+    :param rows: The number of grid rows.
+    :param row_stagger: How far each row is shifted right of the one below, in key widths (e.g. 0.25 for a typical
+                        row-staggered board).
+    :param thumb_keys: The number of keys in a thumb cluster fanned out below the last column, each rotated 10 degrees
+                       more than the previous one.
+    :param z_step: The height difference between odd and even columns. Steps below 1 make the top fillet fail.
+    :param palm_rest: Whether to add a palm rest with a connector below the grid.
+    :param screw_holes: Whether to add two screw holes.
+    :param text: Whether to add a text to the top.
+    :param side_fillet: Whether to fillet the case sides.
+    :param choc: Whether to use Choc switches instead of MX.
+    :param standard_components: Whether to render the holders (render_standard_components).
+    :return: The render_case() keyword arguments.
+    """
+    grid_count = key_count - thumb_keys
+    columns = max(1, (grid_count + rows - 1) // rows)
+
+    keys = [
+        Key(
+            x=(index // rows + (index % rows) * row_stagger) * KEY_PITCH,
+            y=(index % rows) * KEY_PITCH,
+            z=(index // rows % 2) * z_step,
+        )
+        for index in range(grid_count)
+    ]
+
+    pivot = ((columns - 1) * KEY_PITCH, -KEY_PITCH)
+    keys += [
+        Key(
+            x=(columns - 1 + index) * KEY_PITCH,
+            y=-KEY_PITCH * 1.2,
+            rotate=-10 - 10 * index,
+            rotate_around=pivot,
+        )
+        for index in range(thumb_keys)
+    ]
+
+    case_config = CaseConfig(
+        switch_type=SwitchType.CHOC if choc else SwitchType.MX,
+        side_fillet=1 if side_fillet else None,
+    )
+
+    layout = {
+        "keys": keys,
+        "config": Config(case_config=case_config),
+        "render_standard_components": standard_components,
+    }
+
+    width = columns * KEY_PITCH
+    if palm_rest:
+        layout["palm_rests"] = [
+            PalmRest(
+                points=[(-9, -9), (width - 9, -9), (width - 9, -60), (-9, -60)],
+                height=case_config.case_base_height + 2,
+                connector_locations_x=[width / 2 - 9],
+            )
+        ]
+
+    if screw_holes:
+        layout["screw_holes"] = [
+            ScrewHole(x=KEY_PITCH / 2, y=KEY_PITCH / 2),
+            ScrewHole(x=width - KEY_PITCH * 1.5, y=KEY_PITCH * (rows - 1.5)),
+        ]
+
+    if text:
+        layout["texts"] = [Text(x=KEY_PITCH / 2, y=KEY_PITCH * 1.5, text="klavgen")]
+
+    return layout
@@ -1,5 +1,6 @@
 import functools
-from typing import Any, List
+import math
+from typing import Any, Callable, List
 
 import cadquery as cq
 
@@ -50,6 +51,42 @@ def create_workplane(lr: LocationOrientation):
     return wp
 
 
+def location_to_matrix(lr: LocationOrientation) -> List[List[float]]:
+    """
+    Get the affine transform applied by position() as a 3x4 matrix (rotation and translation columns)
+    :param lr: location/rotation
+    :return: list of 3 rows
+    """
+    rx = lr.rotate_around[0] if lr.rotate_around else lr.x
+    ry = lr.rotate_around[1] if lr.rotate_around else lr.y
+
+    angle = math.radians(lr.rotate or 0)
+    cos = math.cos(angle)
+    sin = math.sin(angle)
+
+    # Translate, then rotate around (rx, ry)
+    dx = lr.x - rx
+    dy = lr.y - ry
+
+    return [
+        [cos, -sin, 0.0, cos * dx - sin * dy + rx],
+        [sin, cos, 0.0, sin * dx + cos * dy + ry],
+        [0.0, 0.0, 1.0, lr.z],
+    ]
+
+
+def location_to_cq_location(lr: LocationOrientation) -> cq.Location:
+    """
+    Get the transform applied by position() as a cq.Location, e.g. to place assembly children
+    :param lr: location/rotation
+    :return: cq.Location
+    """
+    m = location_to_matrix(lr)
+
+    # cq.Location rotates around the origin first, then translates
+    return cq.Location(cq.Vector(m[0][3], m[1][3], m[2][3]), cq.Vector(0, 0, 1), lr.rotate or 0)
+
+
 grow_z = (True, True, False)
 
 grow_yz = (True, False, False)
@@ -64,3 +101,44 @@ def union_list(objects: List[Any]):
         return functools.reduce(_cq_union_reductor, objects)
     else:
         return None
+
+
+class Lazy:
+    """
+    A value stored in a LazyField that is only computed, by calling func, the first time the field is read.
+    """
+
+    def __init__(self, func: Callable[[], Any]):
+        self.func = func
+
+
+class LazyField:
+    """
+    A dataclass field descriptor that defaults to None and can be set to a Lazy value, which is computed on first
+    access and then stored in its place.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            # The dataclass default
+            return None
+
+        value = obj.__dict__.get(self.name)
+        if isinstance(value, Lazy):
+            value = value.func()
+            obj.__dict__[self.name] = value
+
+        return value
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.name] = value
+
+
+def is_computed(obj: Any, name: str) -> bool:
+    """
+    Whether a LazyField of an object holds a value, and not a Lazy that reading it would compute.
+    """
+    return not isinstance(obj.__dict__.get(name), Lazy)
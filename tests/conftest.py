@@ -0,0 +1,18 @@
+import pytest
+
+from klavgen import Key, render_case
+
+
+@pytest.fixture(scope="session")
+def case_options():
+    # The smallest layout that still has a shell, fillets and holders
+    return dict(
+        keys=[Key(x=0, y=0), Key(x=19, y=0)],
+        render_standard_components=True,
+        union_standard_components=False,
+    )
+
+
+@pytest.fixture(scope="session")
+def case_result(case_options):
+    return render_case(**case_options, profile=True)
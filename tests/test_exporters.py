@@ -0,0 +1,111 @@
+import io
+import json
+import struct
+import tarfile
+import zipfile
+from xml.etree import ElementTree
+
+import pytest
+
+from klavgen.exporter_3mf import export_case_to_3mf
+from klavgen.exporter_glb import export_case_to_glb
+from klavgen.exporting import MemoryOutput, TarOutput, ZipOutput, export_part
+from klavgen.mesh import export_mesh, mesh_from_shape, weld
+
+NAMESPACE = {"m": "http://schemas.microsoft.com/3dmanufacturing/core/2015/02"}
+
+
+def test_3mf_is_valid(case_result):
+    output = MemoryOutput()
+    export_case_to_3mf(case_result, "keyboard", output)
+
+    with zipfile.ZipFile(io.BytesIO(output.get_bytes("keyboard.3mf"))) as archive:
+        assert "[Content_Types].xml" in archive.namelist()
+        model = ElementTree.fromstring(archive.read("3D/3dmodel.model"))
+
+    objects = {}
+    for obj in model.iterfind("m:resources/m:object", NAMESPACE):
+        vertex_count = len(obj.findall("m:mesh/m:vertices/m:vertex", NAMESPACE))
+        triangles = obj.findall("m:mesh/m:triangles/m:triangle", NAMESPACE)
+        assert vertex_count and triangles
+        for triangle in triangles:
+            assert all(0 <= int(triangle.get(v)) < vertex_count for v in ["v1", "v2", "v3"])
+        objects[obj.get("id")] = obj.get("name")
+
+    items = model.findall("m:build/m:item", NAMESPACE)
+    for item in items:
+        assert item.get("objectid") in objects
+        assert len(item.get("transform").split()) == 12
+
+    # The case once, and each holder at every key
+    holder_count = sum(
+        len(placements.locations) for placements in case_result.standard_component_placements
+    )
+    assert "keyboard_top" in objects.values()
+    assert len(items) >= holder_count + 1
+
+
+def _read_glb(data: bytes):
+    magic, version, length = struct.unpack_from("<4sII", data)
+    assert (magic, version, length) == (b"glTF", 2, len(data))
+
+    json_length, json_type = struct.unpack_from("<I4s", data, 12)
+    assert json_type == b"JSON"
+    gltf = json.loads(data[20 : 20 + json_length])
+
+    binary_length, binary_type = struct.unpack_from("<I4s", data, 20 + json_length)
+    assert binary_type == b"BIN\x00"
+    assert 28 + json_length + binary_length == len(data)
+
+    return gltf, binary_length
+
+
+def test_glb_is_valid(case_result):
+    output = MemoryOutput()
+    export_case_to_glb(case_result, "preview", output)
+
+    gltf, binary_length = _read_glb(output.get_bytes("preview.glb"))
+
+    assert gltf["buffers"] == [{"byteLength": binary_length}]
+    for view in gltf["bufferViews"]:
+        assert view["byteOffset"] + view["byteLength"] <= binary_length
+    for accessor in gltf["accessors"]:
+        assert accessor["bufferView"] < len(gltf["bufferViews"])
+    for mesh in gltf["meshes"]:
+        for primitive in mesh["primitives"]:
+            assert primitive["indices"] < len(gltf["accessors"])
+            assert primitive["attributes"]["POSITION"] < len(gltf["accessors"])
+
+    node_names = {node.get("name") for node in gltf["nodes"]}
+    assert {"top", "bottom", "standard_components"} <= node_names
+    assert all(node.get("mesh", 0) < len(gltf["meshes"]) for node in gltf["nodes"])
+
+
+@pytest.mark.parametrize("output_class", [ZipOutput, TarOutput])
+def test_archive_manifest_has_fingerprints(case_result, output_class):
+    archive = io.BytesIO()
+    with output_class(archive) as output:
+        export_part(case_result.top, "top", "stl", output)
+        export_mesh(weld(mesh_from_shape(case_result.bottom)), "bottom", output)
+        export_case_to_3mf(case_result, "keyboard", output)
+        export_case_to_glb(case_result, "preview", output)
+
+    archive.seek(0)
+    if output_class is ZipOutput:
+        with zipfile.ZipFile(archive) as opened:
+            manifest = json.loads(opened.read("manifest.json"))
+    else:
+        with tarfile.open(fileobj=archive) as opened:
+            manifest = json.load(opened.extractfile("manifest.json"))
+
+    parts = manifest["parts"]
+    assert len(parts) == 4
+    assert all(part["fingerprint"] for part in parts)
+
+
+def test_archive_without_manifest_skips_fingerprints(case_result):
+    output = ZipOutput(io.BytesIO(), manifest_name=None)
+    export_part(case_result.top, "top", "stl", output)
+    output.close()
+
+    assert output.records[0].fingerprint is None
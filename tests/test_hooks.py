@@ -0,0 +1,120 @@
+import threading
+
+import cadquery as cq
+import pytest
+
+from klavgen.hooks import get_defining_class, install_hooks, is_hooked, remove_hooks
+from klavgen.operation_plan import HOOKS_KEY as PLANNING_HOOKS_KEY
+from klavgen.operation_plan import planning
+from klavgen.profiling import HOOKS_KEY as PROFILING_HOOKS_KEY
+from klavgen.profiling import profile_stage, profiling
+
+HOOKED_METHODS = [
+    (get_defining_class(cq.Workplane, "union"), "union"),
+    (get_defining_class(cq.Workplane, "cut"), "cut"),
+    (get_defining_class(cq.Shape, "_bool_op"), "_bool_op"),
+    (get_defining_class(cq.Solid, "fillet"), "fillet"),
+]
+
+
+def _get_methods():
+    return [owner.__dict__[name] for owner, name in HOOKED_METHODS]
+
+
+def _box_union():
+    return cq.Workplane().box(1, 1, 1).union(cq.Workplane().box(1, 1, 1).translate((0.5, 0, 0)))
+
+
+def test_planning_restores_methods_after_exception():
+    methods = _get_methods()
+
+    with pytest.raises(ValueError):
+        with planning():
+            _box_union()
+            raise ValueError()
+
+    assert _get_methods() == methods
+    assert not is_hooked(PLANNING_HOOKS_KEY)
+
+
+def test_profiling_restores_methods_after_exception():
+    methods = _get_methods()
+
+    with pytest.raises(ValueError):
+        with profiling():
+            _box_union()
+            raise ValueError()
+
+    assert _get_methods() == methods
+    assert not is_hooked(PROFILING_HOOKS_KEY)
+
+
+def test_failed_install_rolls_back():
+    methods = _get_methods()
+
+    def wrap(method):
+        return lambda *args, **kwargs: method(*args, **kwargs)
+
+    with pytest.raises(KeyError):
+        install_hooks("test", [(cq.Workplane, "union", wrap), (cq.Workplane, "missing", wrap)])
+
+    assert _get_methods() == methods
+    assert not is_hooked("test")
+
+
+def test_hooks_stack_and_unstack_in_any_order():
+    original = cq.Workplane.__dict__["union"]
+    calls = []
+
+    def wrap(label):
+        def wrap_method(method):
+            def wrapper(*args, **kwargs):
+                calls.append(label)
+                return method(*args, **kwargs)
+
+            return wrapper
+
+        return wrap_method
+
+    install_hooks("first", [(cq.Workplane, "union", wrap("first"))])
+    install_hooks("second", [(cq.Workplane, "union", wrap("second"))])
+    _box_union()
+    assert calls == ["second", "first"]
+
+    remove_hooks("first")
+    calls.clear()
+    _box_union()
+    assert calls == ["second"]
+
+    remove_hooks("second")
+    assert cq.Workplane.__dict__["union"] is original
+
+
+def test_profiling_while_another_thread_plans():
+    methods = _get_methods()
+    planning_started = threading.Event()
+    profiling_done = threading.Event()
+    plans = []
+
+    def plan():
+        with planning() as operations:
+            planning_started.set()
+            profiling_done.wait(60)
+            _box_union()
+            plans.append(operations)
+
+    thread = threading.Thread(target=plan)
+    thread.start()
+    planning_started.wait(60)
+
+    # Runs for real in this thread, while the planning hooks are installed
+    with profiling() as profile, profile_stage("union"):
+        result = _box_union()
+    profiling_done.set()
+    thread.join()
+
+    assert result.val().isValid() and len(result.solids().vals()) == 1
+    assert profile.get_stage("union").operation_counts == {"unions": 1}
+    assert plans[0].get_operation_counts()["union"] == 1
+    assert _get_methods() == methods
+    assert not is_hooked(PLANNING_HOOKS_KEY) and not is_hooked(PROFILING_HOOKS_KEY)
@@ -0,0 +1,69 @@
+import io
+
+import cadquery as cq
+import numpy as np
+
+from klavgen import Mesh, export_mesh, mesh_from_shape
+from klavgen.exporting import ExportOptions, MemoryOutput, export_to_bytes
+from klavgen.mesh import canonicalize, weld, write_mesh_stl
+
+
+def _shuffle(mesh: Mesh, seed: int = 0) -> Mesh:
+    """
+    Get the same surface with the vertices and triangles in a different order, and each triangle starting at a
+    different corner.
+    """
+    rng = np.random.default_rng(seed)
+    vertex_order = rng.permutation(len(mesh.vertices))
+    new_indices = np.empty_like(vertex_order)
+    new_indices[vertex_order] = np.arange(len(vertex_order))
+
+    triangles = new_indices[mesh.triangles][rng.permutation(len(mesh.triangles))]
+    triangles = np.roll(triangles, rng.integers(3), axis=1)
+
+    return Mesh(mesh.vertices[vertex_order], triangles)
+
+
+def _get_mesh(shape) -> Mesh:
+    return weld(mesh_from_shape(shape, ExportOptions()))
+
+
+def test_canonicalize_ignores_order():
+    mesh = _get_mesh(cq.Workplane().box(10, 20, 5).edges("|Z").fillet(2).faces(">Z").hole(3))
+
+    expected = canonicalize(mesh)
+    actual = canonicalize(_shuffle(mesh))
+
+    np.testing.assert_array_equal(actual.vertices, expected.vertices)
+    np.testing.assert_array_equal(actual.triangles, expected.triangles)
+
+
+def test_canonicalize_flips_ambiguous_diagonals():
+    vertices = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], dtype=float)
+    one_diagonal = Mesh(vertices, np.array([[0, 1, 2], [0, 2, 3]]))
+    other_diagonal = Mesh(vertices, np.array([[0, 1, 3], [1, 2, 3]]))
+
+    np.testing.assert_array_equal(
+        canonicalize(one_diagonal).triangles, canonicalize(other_diagonal).triangles
+    )
+
+
+def test_stl_is_deterministic(case_result):
+    assert export_to_bytes(case_result.top, "stl") == export_to_bytes(case_result.top, "stl")
+
+
+def test_mesh_stl_matches_shape_stl(case_result):
+    # What the mesh workers write (see export_mesh()) has to match exporting the shape
+    output = MemoryOutput()
+    export_mesh(_shuffle(_get_mesh(case_result.bottom)), "bottom", output)
+
+    assert output.get_bytes("bottom.stl") == export_to_bytes(case_result.bottom, "stl")
+
+
+def test_non_deterministic_stl_keeps_mesh():
+    mesh = _get_mesh(cq.Workplane().box(1, 1, 1))
+    stream = io.BytesIO()
+    options = ExportOptions(deterministic=False)
+
+    assert write_mesh_stl(mesh, stream, options) == len(mesh.triangles)
+    assert len(stream.getvalue()) == 84 + 50 * len(mesh.triangles)
@@ -0,0 +1,18 @@
+from klavgen import render_case
+from klavgen.hooks import is_hooked
+from klavgen.operation_plan import HOOKS_KEY
+
+
+def test_dry_run_matches_render(case_options, case_result):
+    plan = render_case(**case_options, dry_run=True)
+
+    planned = plan.get_operation_counts()
+    rendered = case_result.profile.get_stage("render_case").operation_counts
+    for operation in ["cut", "split", "fillet", "shell"]:
+        assert planned[operation] == rendered.get(f"{operation}s", 0), operation
+
+    # Profiling only counts Workplane operations, while the plan also lists the unions they run inside (e.g. when
+    # extruding into an existing solid)
+    assert planned["union"] >= rendered["unions"]
+    assert plan.estimated_seconds > 0
+    assert not is_hooked(HOOKS_KEY)
@@ -0,0 +1,56 @@
+import io
+
+import cadquery as cq
+
+from klavgen import RenderCaseResult, load_result, save_result
+from klavgen.exporting import fingerprint_shape
+from klavgen.result_bundle import ResultBundle
+from klavgen.utils import Lazy, is_computed
+
+
+def test_save_and_load_round_trip(case_result):
+    bundle = io.BytesIO()
+    save_result(case_result, bundle)
+    bundle.seek(0)
+
+    loaded = load_result(bundle)
+
+    assert isinstance(loaded, RenderCaseResult)
+    for name in ["top", "bottom", "case_after_shell"]:
+        assert fingerprint_shape(getattr(loaded, name)) == fingerprint_shape(
+            getattr(case_result, name)
+        )
+    assert loaded.input_fingerprints == case_result.input_fingerprints
+    assert [placements.locations for placements in loaded.standard_component_placements] == [
+        placements.locations for placements in case_result.standard_component_placements
+    ]
+
+
+def _render_debug():
+    return cq.Workplane().box(1, 2, 3)
+
+
+def test_lazy_fields_stay_lazy():
+    result = RenderCaseResult(top=cq.Workplane().box(4, 5, 6))
+    result.debug = Lazy(_render_debug)
+
+    bundle = io.BytesIO()
+    save_result(result, bundle)
+    bundle.seek(0)
+
+    with ResultBundle(bundle) as result_bundle:
+        loaded = result_bundle.load()
+        assert not is_computed(loaded, "debug")
+        assert fingerprint_shape(loaded.debug) == fingerprint_shape(_render_debug())
+        assert is_computed(loaded, "debug")
+
+
+def test_load_only_some_fields(case_result):
+    bundle = io.BytesIO()
+    save_result(case_result, bundle)
+    bundle.seek(0)
+
+    loaded = load_result(bundle, ["top"])
+
+    assert fingerprint_shape(loaded.top) == fingerprint_shape(case_result.top)
+    assert loaded.bottom is None